@@ -5,14 +5,31 @@ import brotli
 import time
 import sys
 import struct
+import threading
+import heapq
+import bisect
+import ipaddress
+import re
+import socket
+import ctypes
+from abc import ABC, abstractmethod
+from array import array
 import webbrowser
 from datetime import datetime
 from functools import lru_cache
+from operator import itemgetter
+from collections import namedtuple, deque, Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
 from websockets import serve
 from scapy.all import AsyncSniffer, Packet, Raw
-from scapy.layers.inet import TCP
+from scapy.layers.inet import IP, TCP
+from scapy.layers.inet6 import IPv6
 from aiohttp import web
 import aiohttp_cors
+try:
+    import numpy as np  # 선택 의존성 - 공격/자가 데미지 패킷 일괄 디코딩
+except ImportError:
+    np = None
 
 # 버전 정보
 __version__ = "1.2.6"
@@ -44,10 +61,36 @@ class SystemConstants:
     BUFFER_SIZE = 16384  # 16KB 버퍼
     TCP_WINDOW = 10000  # TCP 재정렬 허용 범위
     MAX_TCP_SEGMENTS = 500  # 최대 TCP 세그먼트 수
-    
+    MAX_RECORD_SIZE = 65536  # 게임 패킷 레코드 최대 길이 (초과 시 손상으로 보고 재동기화)
+    GAP_TIMEOUT = 1.0  # 빠진 세그먼트를 기다리는 최대 시간(초), 초과 시 구간을 건너뛰고 재동기화
+    STALE_JUMP_LIMIT = 8  # 윈도우 뒤쪽 패킷이 연속으로 이만큼 오면 새 스트림으로 보고 재동기화
+    MAX_FLOWS = 16  # 동시에 추적하는 TCP 연결 수 (초과 시 가장 오래 쓰지 않은 연결부터 제거)
+    FLOW_IDLE_TIMEOUT = 120  # 이 시간(초) 동안 패킷이 없는 연결은 제거
+    EVENT_RING_SLOTS = 32768  # 캡처 프로세스 -> 메인 프로세스 공유 메모리 링 크기 (이벤트 수)
+    EVENT_RING_DRAIN = 4096  # 메인 프로세스가 링에서 한 번에 꺼내는 최대 이벤트 수
+    NUMPY_BATCH_TYPES = (10308, 10719)  # NumPy 일괄 디코딩 대상 (공격, 자가 데미지)
+    NUMPY_BATCH_MIN = 32  # 한 버퍼에서 같은 타입 레코드가 이만큼 이상일 때만 일괄 디코딩
+    TIMELINE_RESOLUTIONS = (1, 5, 30)  # DPS 타임라인 버킷 크기(초) - 1초 버킷을 5초/30초로 롤업
+    TIMELINE_SLOTS = 360  # 해상도별 링 크기 (1초 6분, 5초 30분, 30초 3시간)
+    TIMELINE_PEAK_RES = 5  # 순간 최고 DPS 를 재는 버킷 크기(초)
+    DAMAGE_HIST_SUB_BITS = 4  # 데미지 히스토그램: 2의 거듭제곱 구간을 2^4 등분 (버킷 폭 ~6%)
+    ENCOUNTER_IDLE_GAP = 30  # 타격이 이 시간(초) 이상 없다가 다시 시작되면 새 전투
+    ENCOUNTER_KILL_GRACE = 3  # 최대 HP 타겟 처치 후 이 시간(초)이 지난 타격부터 새 전투 (막타/도트 여유)
+    ENCOUNTER_TARGET_SWITCH = 10  # 기존 주 타겟을 이 시간(초) 이상 안 때리는 중에 더 큰 HP 타겟이 나타나면 새 전투
+    ENCOUNTER_ARCHIVE_MAX = 50  # 보관하는 지난 전투 수
+    BUFF_LOG_FOLD = 65536  # 버프 구간 기록에 쌓인 타격이 이만큼이면 스냅샷 전이라도 집계에 반영
+    TARGET_TOP_K = 32  # 타겟별 상세 데이터를 유지하는 타겟 수 (설정 TargetTopK), 나머지는 "기타" 로 합침
+    OTHER_TARGET_ID = -1  # 상위 K 에서 밀려난 타겟을 합친 "기타" 타겟 ID
+    RANKING_TOP_N = 12  # 계산 모드별 순위 뷰에 담는 유저 수 (대시보드 표시 인원)
+    PENDING_MATCH_WINDOW = 1.0  # HP 변화/자가 데미지가 공격 패킷을 기다리는 시간(초), 지나면 버림
+    PENDING_MATCH_DEPTH = 16  # 타겟 / (유저, 타겟) 마다 대기하는 최대 이벤트 수 (넘으면 가장 오래된 것부터 버림)
+
     # 정리 주기
-    CLEANUP_INTERVAL = 300  # 5분마다 메모리 정리
-    DATA_RETENTION = 1800  # 30분 이상 된 데이터 삭제
+    CLEANUP_INTERVAL = 30  # 30초마다 메모리 정리 (보관 기간 + 메모리 예산 확인)
+    DATA_RETENTION = 1800  # 30분 이상 보이지 않은 유저 데이터 삭제
+    TARGET_RETENTION = 600  # 10분 이상 맞지 않은 타겟 데이터 삭제
+    MEMORY_BUDGET_MB = 256  # 분석기 데이터 메모리 예산 (설정 MemoryBudgetMB)
+    EVICT_FRACTION = 0.1  # 예산 초과 시 한 번에 지우는 (유저, 타겟, 스킬) 셀 비율
     STATUS_INTERVAL = 60  # 1분마다 상태 출력
     AUTO_SHUTDOWN_DELAY = 180  # 연결이 없을 때 180초 후 자동 종료 (재연결 여유 시간)
 
@@ -124,10 +167,12 @@ class SimpleLogger:
             except:
                 pass
                 
-    def count_error(self, error_type):
+    # 오류 횟수 집계 (10회마다 기록, detail 이 있으면 첫 번째 오류도 그 내용과 함께 기록)
+    def count_error(self, error_type, detail=None):
         self.error_count[error_type] = self.error_count.get(error_type, 0) + 1
-        if self.error_count[error_type] % 10 == 0:
-            self.log(f"{error_type} 오류 {self.error_count[error_type]}회 발생", "ERROR")
+        count = self.error_count[error_type]
+        if count % 10 == 0 or (detail is not None and count == 1):
+            self.log(f"{error_type} 오류 {count}회 발생" + (f": {detail}" if detail is not None else ""), "ERROR")
 
 # 로거는 나중에 초기화 (DEBUG 값이 설정된 후)
 logger = None
@@ -185,292 +230,1288 @@ FLAG_BITS = (
     (4, 'what48', 0x80),
 )
 
-# 플래그 바이트에서 각 비트를 추출하여 딕셔너리로 변환
-@lru_cache(maxsize=256)
-def extract_flags(flags: bytes) -> dict:
-    result = {}
-    for index, name, mask in FLAG_BITS:
-        result[name] = int((flags[index] & mask) != 0) if index < len(flags) else 0
-    return result
-
-# 공격 패킷 파싱 (타입 10308)
-def parse_attack(data):
-    if len(data) != SystemConstants.ATTACK_PACKET_SIZE:
-        return ""
-
-    pivot = 0
-
-    user_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    p1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    target_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    p2, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    key1, pivot = int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    key2, pivot = int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    flags, pivot =  data[pivot:pivot+7], pivot+7
-    c, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-
-    return {
-        "type": 1,
-        "hide": False,
-        "user_id": user_id,
-        "target_id": target_id,
-        "key1": key1,
-        "key2": key2,
-        "flags": extract_flags(flags),
-        "ppp": c,
-        #"etc": f"a:{key2}, c:{c}",
-    }
-
-# 스킬 사용 패킷 파싱 (타입 100041)
-def parse_action(data):
-    pivot = 0
-
-    user_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    p1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-
-    skill_name_len, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    skill_name, pivot =  data[pivot:pivot+skill_name_len], pivot+skill_name_len
-
-    skill_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    p2, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-
-    what1, pivot =  data[pivot:pivot+17], pivot+17
-    key1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-
-    return {
-        "type": 2,
-        "hide": False,
-        "user_id": user_id,
-        #"skill_id": skill_id,
-        #"what1": what1.hex(),
-        "skill_name": skill_name.replace(b'\x00', b'').decode('utf-8', errors='replace').strip(),
-        "key1": key1,
-    }
-
-# HP 변화 패킷 파싱 (타입 100178)
-def parse_hp_changed(data):
-    pivot = 0
-
-    target_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    a, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    
-    prev, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    b, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4    
-
-    current, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    c, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-  
-    return {
-        "type": 3,
-        "target_id": target_id,
-        "prev_hp": prev,
-        "current_hp": current,
-    }
+# 플래그 이름 -> 정수 비트마스크 (플래그 7바이트를 little endian 정수로 읽었을 때의 비트 위치)
+FLAG_MASKS = {name: mask << (8 * index) for index, name, mask in FLAG_BITS}
 
-# 자가 데미지 패킷 파싱 (타입 10719)
-def parse_self_damage(data):
-    if len(data) != SystemConstants.SKILL_PACKET_SIZE:
-        return ""
+CRIT_FLAG = FLAG_MASKS['crit_flag']
+POWER_FLAG = FLAG_MASKS['power_flag']
+FAST_FLAG = FLAG_MASKS['fast_flag']
+ADD_HIT_FLAG = FLAG_MASKS['add_hit_flag']
+DOT_FLAG4 = FLAG_MASKS['dot_flag4']
+# dot_flag / dot_flag2 / dot_flag3 묶음 (모두 켜지면 도트, 하나라도 켜지면 특수)
+DOT_FLAGS = FLAG_MASKS['dot_flag'] | FLAG_MASKS['dot_flag2'] | FLAG_MASKS['dot_flag3']
 
-    pivot = 0
-
-    user_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    e1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-
-    target_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    e2, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    
-    damage, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    e3, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    
-    siran, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    e4, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    
-    flags, pivot =  data[pivot:pivot+7], pivot+7
-
-    return {
-        "type": 4,
-        "hide": False,
-        "user_id": user_id,
-        "target_id": target_id,
-        "damage": damage,
-        "flags": extract_flags(flags),
-    }
-
-# 공격력 패킷 파싱 (타입 100085)
-def parse_atk(data):
-    if len(data) != 16:
-        return ""
-
-    pivot = 0
-
-    user_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    e1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-
-    atk, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    e2, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
+# 플래그 비트마스크를 이름별 딕셔너리로 변환 (패킷 로그/디버그 출력용)
+@lru_cache(maxsize=256)
+def extract_flags(flags: int) -> dict:
+    return {name: int((flags & mask) != 0) for name, mask in FLAG_MASKS.items()}
+
+# 패킷 스키마의 필드 타입 -> struct 포맷 (flags7 은 7바이트로 읽은 뒤 정수 비트마스크로 변환)
+SCHEMA_FORMATS = {
+    'u8': 'B',
+    'u16': 'H',
+    'u32': 'I',
+    'u64': 'Q',
+    'flags7': '7s',
+}
+
+U32 = struct.Struct('<I')
+
+# 길이 접두(u32) 문자열 디코딩
+def decode_schema_str(data) -> str:
+    return bytes(data).replace(b'\x00', b'').decode('utf-8', errors='replace').strip()
+
+# 디버그용 4바이트 단위 hex 덤프
+def hex_dump(data) -> str:
+    return " / ".join(bytes(data[i:i+4]).hex() for i in range(0, len(data), 4))
+
+# 이벤트 레코드를 딕셔너리로 변환 (패킷 로그 저장용, 플래그는 이름별로 풀어서 기록)
+def event_to_dict(event) -> dict:
+    result = event._asdict()
+    for name in event.flag_fields:
+        result[name] = extract_flags(result[name])
+    return result
 
-    return {
-        "type": 100085,
-        "hide": False,
-        "user_id": user_id,
-        "atk": atk,
-    }
+# 선언형 패킷 스키마
+# spec 은 "이름:타입" 토큰 목록 - '_' 로 시작하는 이름은 출력하지 않음 (배열 개수로 참조되면 읽기만 함)
+# 타입: u8/u16/u32/u64, flags7(플래그 7바이트 -> 정수 비트마스크), padN(N바이트 건너뜀),
+#       str(u32 길이 + 문자열), u32[필드](앞 필드 값만큼 반복), 뒤에 '?' 가 붙으면 데이터가 모자랄 때 0
+# 고정 길이 스키마는 struct.Struct.unpack_from 한 번으로, 가변 길이 스키마는 오프셋 계산 코드로 컴파일됨
+# 디코딩 결과는 스키마마다 만들어지는 namedtuple 이벤트 레코드 (type + 출력 필드)
+class PacketSchema:
+    def __init__(self, name: str, out_type: int, spec: str, size: int = None, dump: bool = False):
+        self.out_type = out_type
+        self.fields = [tuple(token.split(':', 1)) for token in spec.split()]
+        self.size = size
+        self.dump = dump
+        self.source = ""
+        self._decoders = {}
+
+        # 레코드 필드 기본값 - 소비자가 요청하지 않아 디코딩하지 않은 필드에 채워짐
+        self.defaults = {field: ('""' if kind == 'str' else '0') for field, kind in self.fields
+                         if not field.startswith('_')}
+        if dump:
+            self.defaults.update(length='0', hex='""')
+        self.record = namedtuple(name, ('type', *self.defaults))
+        self.record.flag_fields = tuple(field for field, kind in self.fields if kind == 'flags7')
+        self.decode = self.decoder()
+
+    # 출력 필드 이름 목록
+    @property
+    def outputs(self) -> tuple:
+        return tuple(name for name, _ in self.fields if not name.startswith('_'))
+
+    # 요청한 필드만 디코딩하는 함수 (outputs 가 None 이면 전체 필드 + 디버그 덤프)
+    def decoder(self, outputs: tuple = None):
+        key = None if outputs is None else tuple(sorted(set(outputs) & set(self.outputs)))
+        if key not in self._decoders:
+            self._decoders[key] = self.compile(key)
+        return self._decoders[key]
+
+    def compile(self, outputs: tuple = None):
+        full = outputs is None
+        wanted = set(self.outputs if full else outputs)
+
+        # 마지막으로 필요한 필드 뒤는 읽지 않음
+        last = max((i for i, (name, _) in enumerate(self.fields) if name in wanted), default=-1)
+        fields = self.fields[:last + 1]
+        needed = set(wanted)
+        for _, kind in fields:
+            if '[' in kind:
+                needed.add(kind[kind.index('[') + 1:-1])
+
+        env = {'struct': struct, '_U32': U32, '_str': decode_schema_str,
+               '_hex_dump': hex_dump, '_Record': self.record}
+        lines = ["def decode(data):"]
+        if self.size is not None:
+            lines.append(f"    if len(data) != {self.size}: return ''")
+
+        static = 0       # 현재 청크 시작까지의 고정 오프셋
+        dynamic = False  # 가변 필드를 지나 pivot 변수를 쓰는 중인지
+        chunk = []       # (이름 또는 None, 포맷) - 한 번에 unpack 할 연속 고정 필드
+
+        def pos(extra=0):
+            offset = static + extra
+            if not dynamic:
+                return str(offset)
+            return f"pivot + {offset}" if offset else "pivot"
+
+        def flush():
+            nonlocal static
+            if not chunk:
+                return
+            fmt = '<' + ''.join(f for _, f in chunk)
+            names = [n for n, _ in chunk if n is not None]
+            if names:
+                struct_name = f"_s{len(env)}"
+                env[struct_name] = struct.Struct(fmt)
+                lines.append(f"    {', '.join(names)}, = {struct_name}.unpack_from(data, {pos()})")
+            static += struct.calcsize(fmt)
+            chunk.clear()
+
+        def materialize():
+            nonlocal static, dynamic
+            flush()
+            if not dynamic:
+                lines.append(f"    pivot = {static}")
+            elif static:
+                lines.append(f"    pivot += {static}")
+            static, dynamic = 0, True
+
+        for name, kind in fields:
+            keep = name in needed
+            optional = kind.endswith('?')
+            kind = kind.rstrip('?')
+
+            if kind.startswith('pad'):
+                chunk.append((None, f"{int(kind[3:])}x"))
+            elif kind == 'str':
+                materialize()
+                lines.append("    _n = _U32.unpack_from(data, pivot)[0]")
+                if keep:
+                    lines.append(f"    {name} = _str(data[pivot + 4:pivot + 4 + _n])")
+                lines.append("    pivot += 4 + _n")
+            elif '[' in kind:
+                item, count = kind[:-1].split('[')
+                materialize()
+                fmt = SCHEMA_FORMATS[item]
+                if keep:
+                    lines.append(f"    {name} = list(struct.unpack_from('<%d{fmt}' % {count}, data, pivot))")
+                lines.append(f"    pivot += {struct.calcsize(fmt)} * {count}")
+            elif optional:
+                flush()
+                fmt = SCHEMA_FORMATS[kind]
+                width = struct.calcsize(fmt)
+                if keep:
+                    struct_name = f"_s{len(env)}"
+                    env[struct_name] = struct.Struct('<' + fmt)
+                    lines.append(f"    {name} = {struct_name}.unpack_from(data, {pos()})[0] "
+                                 f"if len(data) >= {pos(width)} else 0")
+                static += width
+            else:
+                fmt = SCHEMA_FORMATS[kind]
+                chunk.append((name if keep else None, fmt if keep else f"{struct.calcsize(fmt)}x"))
+        flush()
+
+        values = {name: name for name in wanted}
+        for name in self.record.flag_fields:
+            if name in wanted:
+                values[name] = f"int.from_bytes({name}, 'little')"
+        if full and self.dump:
+            values.update(length='len(data)', hex='_hex_dump(data)')
+        args = [str(self.out_type)] + [values.get(name, default) for name, default in self.defaults.items()]
+        lines.append(f"    return _Record({', '.join(args)})")
+
+        source = "\n".join(lines)
+        if full:
+            self.source = source
+        exec(compile(source, f"<schema {self.out_type}>", "exec"), env)
+        return env['decode']
+
+# 버프 시작/업데이트 패킷 공통 레이아웃 (stack2 개수만큼 u32 추가 필드)
+BUFF_SPEC = ("user_id:u32 _:u32 inst_key:u64 buff_key:u32 _flags:u32 "
+             "stack:u32 _stack2:u32 _adds:u32[_stack2] target_id:u32 _:u32")
+
+# 게임 패킷 타입 -> 스키마 (새 패킷은 한 줄 추가)
+PACKET_SCHEMAS = {
+    10308: PacketSchema("AttackEvent", 1, "user_id:u32 _:u32 target_id:u32 _:u32 key1:u32 key2:u32 flags:flags7 ppp:u32",
+                        size=SystemConstants.ATTACK_PACKET_SIZE),  # 공격
+    100041: PacketSchema("ActionEvent", 2, "user_id:u32 _:u32 skill_name:str _skill_id:u32 _:u32 _:pad17 key1:u32"),  # 스킬 사용
+    100178: PacketSchema("HpChangedEvent", 3, "target_id:u32 _:u32 prev_hp:u32 _:u32 current_hp:u32 _:u32"),  # 체력 변화
+    10719: PacketSchema("SelfDamageEvent", 4, "user_id:u32 _:u32 target_id:u32 _:u32 damage:u32 _:u32 _siran:u32 _:u32 flags:flags7",
+                        size=SystemConstants.SKILL_PACKET_SIZE),  # 자가 데미지
+    100085: PacketSchema("AtkEvent", 100085, "user_id:u32 _:u32 atk:u32 _:u32", size=16),  # 공격력
+    100046: PacketSchema("BuffStartEvent", 11, BUFF_SPEC, dump=True),  # 버프 시작
+    100049: PacketSchema("BuffUpdateEvent", 12, BUFF_SPEC, dump=True),  # 버프 업데이트
+    100047: PacketSchema("BuffEndEvent", 13, "user_id:u32 _:u32 inst_key:u64 flags:u32?", dump=True),  # 버프 종료
+}
+
+# 패킷 타입별 파싱 함수 매핑 (전체 필드)
+parse_dict = {data_type: schema.decode for data_type, schema in PACKET_SCHEMAS.items()}
+
+# 이벤트 타입 -> 공유 메모리 링 슬롯 배치 (레코드 클래스, 숫자 필드 위치, 문자열 필드 위치, 기본값)
+def build_event_slot_layouts() -> dict:
+    layouts = {}
+    for schema in PACKET_SCHEMAS.values():
+        kinds = dict(schema.fields)
+        fields = schema.record._fields
+        numeric = tuple(i for i, name in enumerate(fields)
+                        if i > 0 and name not in ('length', 'hex') and kinds.get(name) != 'str')
+        text = next((i for i, name in enumerate(fields) if kinds.get(name) == 'str'), None)
+        template = (0,) + tuple("" if value == '""' else 0 for value in schema.defaults.values())
+        layouts[schema.out_type] = (schema.record, numeric, text, template)
+    return layouts
+
+EVENT_SLOT_LAYOUTS = build_event_slot_layouts()
+
+# 소비자가 선언한 이벤트 타입별 필드만 디코딩하는 파싱 함수 매핑
+# consumed 에 없는 타입은 매핑에서 빠지므로 프레임 스캐너가 길이만큼 건너뜀
+def build_parse_dict(consumed: dict) -> dict:
+    result = {}
+    for data_type, schema in PACKET_SCHEMAS.items():
+        if schema.out_type in consumed:
+            result[data_type] = schema.decoder(consumed[schema.out_type])
+    return result
 
-# 버프 시작 패킷 파싱 (타입 100046)
-def parse_buff(data):
-    pivot = 0
+# NumPy 구조화 dtype 필드 포맷 (스키마 필드 타입 기준)
+NUMPY_FORMATS = {
+    'u8': 'u1',
+    'u16': '<u2',
+    'u32': '<u4',
+    'u64': '<u8',
+}
+
+# 고정 길이 스키마의 NumPy 일괄 디코더
+# 한 버퍼에서 잘라낸 같은 타입 레코드를 모아 구조화 dtype 으로 한 번에 디코딩하고, 열 단위로 레코드를 만듦
+# 플래그 7바이트는 u4/u2/u1 세 열로 읽어 벡터 연산으로 정수 비트마스크로 합침
+class NumpyBatchDecoder:
+    def __init__(self, schema: PacketSchema, outputs: tuple = None):
+        self.schema = schema
+        self.size = schema.size
+        self.wanted = set(schema.outputs if outputs is None else outputs)
+        names, formats, offsets = [], [], []
+        offset = 0
+        for name, kind in schema.fields:
+            if kind.startswith('pad'):
+                width = int(kind[3:])
+            elif kind == 'flags7':
+                width = 7
+                if name in self.wanted:
+                    names += [f"{name}_0", f"{name}_4", f"{name}_6"]
+                    formats += ['<u4', '<u2', 'u1']
+                    offsets += [offset, offset + 4, offset + 6]
+            else:
+                width = struct.calcsize(SCHEMA_FORMATS[kind])
+                if name in self.wanted:
+                    names.append(name)
+                    formats.append(NUMPY_FORMATS[kind])
+                    offsets.append(offset)
+            offset += width
+        self.dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': self.size})
+        self.defaults = EVENT_SLOT_LAYOUTS[schema.out_type][3][1:]
+
+    # 일괄 디코딩 가능한 스키마인지 (고정 길이 + 고정 폭 필드만)
+    @staticmethod
+    def supports(schema: PacketSchema) -> bool:
+        return schema.size is not None and all(
+            kind.startswith('pad') or kind in NUMPY_FORMATS or kind == 'flags7' for _, kind in schema.fields)
+
+    # contents: 길이가 self.size 인 레코드 내용 목록 -> 이벤트 레코드 목록 (순서 유지)
+    def decode(self, contents: list) -> list:
+        rows = np.frombuffer(b''.join(contents), dtype=self.dtype)
+        columns = [[self.schema.out_type] * len(rows)]
+        for name, default in zip(self.schema.record._fields[1:], self.defaults):
+            if name not in self.wanted:
+                columns.append([default] * len(rows))
+            elif name in self.schema.record.flag_fields:
+                flags = rows[f"{name}_0"].astype(np.uint64)
+                flags |= rows[f"{name}_4"].astype(np.uint64) << np.uint64(32)
+                flags |= rows[f"{name}_6"].astype(np.uint64) << np.uint64(48)
+                columns.append(flags.tolist())
+            else:
+                columns.append(rows[name].tolist())
+        return list(map(self.schema.record._make, zip(*columns)))
 
-    user_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    p1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
+# 일괄 디코딩 대상 패킷 타입 -> NumpyBatchDecoder (numpy 가 없으면 빈 매핑, consumed 가 None 이면 전체 필드)
+def build_batch_decoders(consumed: dict = None) -> dict:
+    if np is None:
+        return {}
+    result = {}
+    for data_type in SystemConstants.NUMPY_BATCH_TYPES:
+        schema = PACKET_SCHEMAS[data_type]
+        if not NumpyBatchDecoder.supports(schema):
+            continue
+        if consumed is None:
+            result[data_type] = NumpyBatchDecoder(schema)
+        elif schema.out_type in consumed:
+            result[data_type] = NumpyBatchDecoder(schema, consumed[schema.out_type])
+    return result
 
-    inst_key, pivot =  data[pivot:pivot+8].hex(), pivot+8
+# 패킷 분석 도구 함수들
 
-    key, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    flags, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
+# TCP 시퀀스 번호 관련 상수 및 함수
+SEQ_MOD = 2**32
 
-    stack1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    stack2, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
+# 게임 패킷 레코드 헤더 (4 타입, 4 길이, 1 인코딩)
+RECORD_HEADER = struct.Struct('<IIB')
+
+# 프레임 시작/끝 시그니처 (길이 0 레코드)
+FRAME_START = b'\x68\x27\x00\x00\x00\x00\x00\x00\x00'
+FRAME_END = b'\xe3\x27\x00\x00\x00\x00\x00\x00\x00'
+FRAME_END_TYPE = 0x27e3
+
+# 증분 프레임 스캐너 - 스트림 버퍼를 앞에서부터 소비하며 레코드를 잘라냄
+# 마지막 탐색 위치/프레임 진행 여부/다음 레코드에 필요한 바이트 수를 기억해 같은 바이트를 다시 훑지 않음
+class FrameScanner:
+    def __init__(self):
+        self.in_frame = False                # 시작 시그니처를 찾은 뒤 레코드를 읽는 중
+        self.need = RECORD_HEADER.size       # 다음 레코드를 자르는 데 필요한 바이트 수
+        self.after_gap = False               # 구간 손실 직후 시그니처 재탐색 중
+        self.gap_lost = False                # 이번 구간 손실로 프레임을 잃었는지 (진행 중이던 프레임 / 시작을 잃은 프레임의 나머지)
+        self.frames_lost = 0                 # 구간 손실로 잃어버린 프레임 수
+
+    # 구간 손실 후 재동기화 - 잃어버린 프레임은 다음 시작 시그니처를 찾을 때 한 번만 기록
+    # (진행 중이던 프레임과 구간 뒤에 이어지는 그 프레임의 나머지는 같은 프레임)
+    def resync(self) -> None:
+        self.gap_lost = self.gap_lost or self.in_frame
+        self.in_frame = False
+        self.need = RECORD_HEADER.size
+        self.after_gap = True
+
+    # 완성된 레코드를 (타입, 인코딩, 컨텐츠 memoryview, 호출 시점 버퍼 기준 레코드 끝 위치) 목록으로 반환하고 버퍼에서 소비
+    def split(self, buffer: "StreamBuffer") -> list:
+        records = []
+        available = len(buffer)
+        if available < self.need and self.in_frame:
+            return records
+
+        data = buffer.view()
+        header_size = RECORD_HEADER.size
+        pivot = 0
+        while True:
+            if not self.in_frame:
+                # 시작 시그니처 탐색 (이미 훑은 바이트는 소비했으므로 새 데이터만 검색)
+                start = buffer.find(FRAME_START, pivot)
+                if start < 0:
+                    # 시그니처가 경계에 걸쳐 있을 수 있으므로 마지막 몇 바이트만 남김
+                    skip = max(pivot, available - (len(FRAME_START) - 1))
+                    if skip > pivot and self.after_gap:
+                        self.gap_lost = True  # 시작을 잃어버린 프레임의 나머지
+                    pivot = skip
+                    break
+                if self.after_gap and (self.gap_lost or start > pivot):
+                    self.frames_lost += 1
+                self.after_gap = False
+                self.gap_lost = False
+                self.in_frame = True
+                pivot = start + len(FRAME_START)
+
+            if available - pivot < header_size:
+                self.need = header_size
+                break
+            data_type, length, encode_type = RECORD_HEADER.unpack_from(data, pivot)
+            if data_type == 0 or length > SystemConstants.MAX_RECORD_SIZE:
+                # 손상된 레코드 - 시그니처부터 다시 탐색
+                if DEBUG and logger:
+                    logger.log(f"손상된 레코드 헤더 (타입 {data_type}, 길이 {length}) - 재탐색", "DEBUG")
+                self.in_frame = False
+                pivot += 1
+                continue
+            total = header_size + length
+            if available - pivot < total:
+                self.need = total
+                break
+            if data_type == FRAME_END_TYPE and length == 0:
+                self.in_frame = False
+            else:
+                records.append((data_type, encode_type, data[pivot + header_size:pivot + total], pivot + total))
+            pivot += total
 
-    adds = []
-    for i in range(stack2):
-        add, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-        adds.append(add)
+        buffer.consume(pivot)
+        if not self.in_frame:
+            self.need = header_size
+        return records
 
-    target_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    p4, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
+def seq_distance(a, b):
+    return ((a - b + 2**31) % 2**32) - 2**31
 
-    chunks = [data[i:i+4] for i in range(0, len(data), 4)]
-    raw_hex_chunks = []
-    for chunk in chunks:
-        if len(chunk) > 0:
-            raw_hex_chunks.append(chunk.hex())
-    # 8바이트씩 끊어서 /로 구분
-    payload_hex = " / ".join(raw_hex_chunks)
-    
-    return {
-        "type": 11,
-        "hide": False,
-        "inst_key": inst_key,
-        "buff_key": key,
-        "user_id": user_id,
-        "target_id": target_id,
-        "stack": stack1,
-        "length": len(data),
-        "hex": payload_hex,
-    }
+# TCP 스트림 재조립 버퍼 (사전 할당 bytearray + 읽기/쓰기 인덱스)
+class StreamBuffer:
+    """세그먼트를 제자리에 이어 붙이고, 소비한 바이트는 읽기 인덱스만 옮겨서 해제"""
+    def __init__(self, capacity: int = SystemConstants.BUFFER_SIZE * 4):
+        self._data = bytearray(capacity)
+        self._start = 0  # 읽기 인덱스
+        self._end = 0    # 쓰기 인덱스
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    # 세그먼트 추가 (뒤쪽 공간이 부족할 때만 앞으로 당기거나 재할당)
+    def append(self, segment) -> None:
+        size = len(segment)
+        if self._end + size > len(self._data):
+            self._compact(size)
+        self._data[self._end:self._end + size] = segment
+        self._end += size
+
+    # 앞쪽 n바이트 소비 (복사 없음)
+    def consume(self, size: int) -> None:
+        self._start = min(self._start + size, self._end)
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def clear(self) -> None:
+        self._start = self._end = 0
+
+    # 읽지 않은 영역 안에서 시그니처 검색 (반환값은 읽기 인덱스 기준 상대 위치)
+    def find(self, sub: bytes, pos: int = 0) -> int:
+        index = self._data.find(sub, self._start + pos, self._end)
+        return index - self._start if index >= 0 else -1
+
+    # 읽지 않은 영역의 memoryview (슬라이스 복사 없음)
+    def view(self) -> memoryview:
+        return memoryview(self._data)[self._start:self._end]
+
+    def _compact(self, extra: int) -> None:
+        size = self._end - self._start
+        if size + extra <= len(self._data) and size <= self._start:
+            # 남은 데이터가 앞쪽 빈 공간에 겹치지 않고 들어가면 앞으로 이동
+            self._data[:size] = memoryview(self._data)[self._start:self._end]
+        else:
+            # 용량이 부족하면 더 큰 버퍼로 교체 (기존 memoryview는 이전 버퍼를 계속 참조)
+            data = bytearray(max(len(self._data) * 2, size + extra))
+            data[:size] = memoryview(self._data)[self._start:self._end]
+            self._data = data
+        self._start, self._end = 0, size
+
+# 순서가 어긋난 TCP 세그먼트 저장소 (랩어라운드를 풀어낸 스트림 위치 기준 구간 목록)
+# 시작 위치 내림차순으로 보관하여 다음에 이어질 세그먼트를 리스트 끝에서 O(1)로 꺼냄
+class SegmentStore:
+    def __init__(self):
+        self._keys: list = []      # -시작 위치 (오름차순 = 시작 위치 내림차순)
+        self._payloads: list = []  # 각 구간의 memoryview
+        self.duplicate_bytes = 0   # 재전송/중복으로 잘라낸 바이트 수
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._payloads.clear()
+
+    # 가장 앞선(가장 작은) 구간의 시작 위치
+    def first_position(self):
+        return -self._keys[-1] if self._keys else None
+
+    # 세그먼트 추가 - base 이전 바이트와 기존 구간과 겹치는 바이트는 잘라내고 빈 구간만 저장
+    def insert(self, position: int, payload, base: int) -> None:
+        start, end = position, position + len(payload)
+        if end <= base:
+            self.duplicate_bytes += len(payload)
+            return
+        if start < base:
+            start = base
+
+        keys = self._keys
+        index = bisect.bisect_left(keys, -start)
+        # 바로 앞 구간(시작 위치 <= start)과 겹치는 부분 제거
+        if index < len(keys):
+            prev_end = -keys[index] + len(self._payloads[index])
+            if prev_end >= end:
+                self.duplicate_bytes += len(payload)
+                return
+            start = max(start, prev_end)
+
+        # 뒤따르는 구간들 사이의 빈 공간만 조각으로 저장
+        pieces = []
+        next_index = index - 1
+        while next_index >= 0 and start < end:
+            next_start = -keys[next_index]
+            if next_start >= end:
+                break
+            if next_start > start:
+                pieces.append((start, next_start))
+            start = max(start, next_start + len(self._payloads[next_index]))
+            next_index -= 1
+        if start < end:
+            pieces.append((start, end))
+
+        stored = 0
+        for piece_start, piece_end in pieces:
+            at = bisect.bisect_left(keys, -piece_start)
+            keys.insert(at, -piece_start)
+            self._payloads.insert(at, payload[piece_start - position:piece_end - position])
+            stored += piece_end - piece_start
+        self.duplicate_bytes += len(payload) - stored
+
+    # position부터 연속된 구간을 buffer에 이어 붙이고 새 위치 반환 (꺼낸 구간 수 k에 대해 O(k))
+    def drain_into(self, position: int, buffer: "StreamBuffer") -> int:
+        keys, payloads = self._keys, self._payloads
+        while keys and -keys[-1] <= position:
+            start = -keys.pop()
+            payload = payloads.pop()
+            end = start + len(payload)
+            if end > position:
+                buffer.append(payload[position - start:])
+                position = end
+        return position
+
+    # position에서 가장 먼 구간부터 절반 제거 (메모리 압박 시)
+    def evict_farthest(self) -> int:
+        count = len(self._keys) // 2
+        del self._keys[:count]
+        del self._payloads[:count]
+        return count
+
+# TCP 연결 하나의 재조립 상태 (세그먼트 저장소, 시퀀스 커서, 스트림 버퍼)
+class TcpFlow:
+    def __init__(self, key: tuple, timestamp: float = 0.0):
+        self.key = key
+        self.segments = SegmentStore()
+        self.current_seq = None  # 다음에 기대하는 시퀀스 번호
+        self.stream_pos = 0      # current_seq에 대응하는 랩어라운드 없는 스트림 위치
+        self.buffer = StreamBuffer()
+        self.last_seen = timestamp
+        self.marks = deque()     # (버퍼에 이어 붙인 뒤의 스트림 위치, 그 바이트를 가져온 패킷의 캡처 시각)
+        
+        self.framer = FrameScanner()
+        
+        # 재동기화 상태
+        self.gap_since = None    # 빠진 구간이 생긴 시각 (패킷 타임스탬프)
+        self.stale_count = 0     # 연속으로 들어온 윈도우 뒤쪽 패킷 수
+        
+        # 구간 손실 통계
+        self.gap_count = 0
+        self.gap_bytes = 0
+
+    # 잃어버린 프레임 수 (다음 시작 시그니처 전이라 아직 기록 전인 프레임 포함)
+    @property
+    def frames_lost(self) -> int:
+        return self.framer.frames_lost + self.framer.gap_lost
+
+    # 현재 위치 기준 TCP 재정렬 허용 범위 안의 패킷인지 확인
+    def in_window(self, seq: int) -> bool:
+        return self.current_seq is None or abs(seq_distance(seq, self.current_seq)) <= SystemConstants.TCP_WINDOW
+
+    # 윈도우 밖 패킷이 새 위치로 건너뛸 근거인지 판단 (앞쪽이면 즉시, 뒤쪽이면 연속으로 반복될 때만)
+    def should_jump(self, seq: int) -> bool:
+        if seq_distance(seq, self.current_seq) > 0:
+            return True
+        self.stale_count += 1
+        return self.stale_count >= SystemConstants.STALE_JUMP_LIMIT
+
+    # 복구 불가능한 점프: 저장된 세그먼트를 버리고 seq부터 새로 재조립
+    def jump_to(self, seq: int) -> None:
+        self._record_gap(max(0, seq_distance(seq, self.current_seq)))
+        self.segments.clear()
+        self.current_seq = seq
+        self.stream_pos = 0
+        self.stale_count = 0
+
+    # 빠진 구간을 제한 시간 이상 기다렸거나 저장소가 넘칠 지경인지 확인
+    def gap_expired(self, timestamp: float) -> bool:
+        return self.gap_since is not None and (
+            timestamp - self.gap_since > SystemConstants.GAP_TIMEOUT
+            or len(self.segments) > SystemConstants.MAX_TCP_SEGMENTS)
+
+    # 빠진 구간을 건너뛰고 다음으로 저장된 세그먼트부터 재조립 계속
+    def skip_gap(self, timestamp: float) -> None:
+        target = self.segments.first_position()
+        if target is None:
+            self.gap_since = None
+            return
+        gap = target - self.stream_pos
+        self._record_gap(gap)
+        self.current_seq = (self.current_seq + gap) % SEQ_MOD
+        self.stream_pos = target
+        self._drain(timestamp)
+
+    # 구간 손실 기록 - 버퍼에 남은 미완성 프레임은 버리고 시그니처 재탐색 모드로 전환
+    def _record_gap(self, gap_bytes: int) -> None:
+        self.gap_count += 1
+        self.gap_bytes += gap_bytes
+        self.buffer.clear()
+        self.marks.clear()
+        self.framer.resync()
+        self.gap_since = None
+        if logger:
+            logger.log(f"TCP 구간 손실 {self.key}: {gap_bytes} bytes 건너뜀 (누적 {self.gap_count}회, 프레임 {self.frames_lost}개)", "INFO")
+
+    # 버퍼에서 완성된 레코드를 잘라 (레코드, 캡처 시각) 목록으로 반환
+    # 레코드의 캡처 시각 = 레코드 마지막 바이트를 버퍼에 채운 패킷의 타임스탬프
+    def split_records(self) -> list:
+        base = self.stream_pos - len(self.buffer)
+        records = self.framer.split(self.buffer)
+        marks = self.marks
+        result = []
+        for record in records:
+            end = base + record[3]
+            while len(marks) > 1 and marks[0][0] < end:
+                marks.popleft()
+            result.append((record, marks[0][1] if marks else self.last_seen))
+        # 소비한 바이트까지의 기록은 더 쓰지 않음
+        consumed = self.stream_pos - len(self.buffer)
+        while marks and marks[0][0] <= consumed:
+            marks.popleft()
+        return result
+
+    # TCP 세그먼트를 시퀀스 순서대로 버퍼에 재조립
+    def reassemble(self, seq: int, payload: memoryview, timestamp: float = 0.0) -> None:
+        # 디버그: TCP 패킷 수신 확인
+        if DEBUG and logger:
+            logger.log(f"TCP 패킷 수신 - SEQ: {seq}, 페이로드 크기: {len(payload)} bytes", "DEBUG")
+        
+        if self.current_seq is None:
+            self.current_seq = seq
+        self.stale_count = 0
+            
+        # TCP 세그먼트 수 제한
+        if len(self.segments) > SystemConstants.MAX_TCP_SEGMENTS:
+            # 현재 위치에서 가장 먼 세그먼트 절반 삭제
+            before = len(self.segments)
+            self.segments.evict_farthest()
+            if logger:
+                logger.log(f"TCP 세그먼트 정리: {before} -> {len(self.segments)}", "INFO")
+
+        distance = seq_distance(seq, self.current_seq)
+        self.segments.insert(self.stream_pos + distance, payload, self.stream_pos)
+        self._drain(timestamp)
+
+    # 재조립
+    def _drain(self, timestamp: float) -> None:
+        position = self.segments.drain_into(self.stream_pos, self.buffer)
+        if position > self.stream_pos:
+            self.marks.append((position, timestamp))
+        self.current_seq = (self.current_seq + position - self.stream_pos) % SEQ_MOD
+        self.stream_pos = position
+        # 아직 빠진 구간이 남아 있으면 대기 시작 시각 기록
+        if not len(self.segments):
+            self.gap_since = None
+        elif self.gap_since is None:
+            self.gap_since = timestamp
+
+# 연결 4-튜플별 재조립 상태 테이블 (LRU 순서 유지, 유휴 연결 제거)
+class FlowTable:
+    def __init__(self, max_flows: int = SystemConstants.MAX_FLOWS, idle_timeout: float = SystemConstants.FLOW_IDLE_TIMEOUT):
+        self.flows: "OrderedDict[tuple, TcpFlow]" = OrderedDict()
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.evicted_count = 0
+
+    def __len__(self) -> int:
+        return len(self.flows)
+
+    def __iter__(self):
+        return iter(self.flows.values())
+
+    # 연결 상태 가져오기 (없으면 생성), 가장 최근 사용으로 이동
+    def get(self, key: tuple, timestamp: float) -> TcpFlow:
+        flow = self.flows.get(key)
+        if flow is None:
+            self._evict(timestamp)
+            flow = self.flows[key] = TcpFlow(key, timestamp)
+            if logger:
+                logger.log(f"새 TCP 연결 추적: {key} (총 {len(self.flows)}개)", "DEBUG")
+        else:
+            self.flows.move_to_end(key)
+        flow.last_seen = timestamp
+        return flow
+
+    # 유휴 시간 초과 연결과 개수 제한을 넘는 연결을 가장 오래된 것부터 제거
+    def _evict(self, timestamp: float, limit: int = None) -> None:
+        limit = self.max_flows if limit is None else limit
+        while self.flows:
+            key, oldest = next(iter(self.flows.items()))
+            if len(self.flows) < limit and timestamp - oldest.last_seen <= self.idle_timeout:
+                break
+            del self.flows[key]
+            self.evicted_count += 1
+            if logger:
+                logger.log(f"TCP 연결 추적 해제: {key}", "DEBUG")
+
+    # 유휴 시간 초과 연결만 제거 (새 연결이 없어도 주기적으로 호출), 남은 연결 수 반환
+    def expire(self, timestamp: float) -> int:
+        self._evict(timestamp, limit=len(self.flows) + 1)
+        return len(self.flows)
+
+    def clear(self) -> None:
+        self.flows.clear()
+
+# IPv4/TCP 헤더 (최소 디코딩용)
+IPV4_HEADER = struct.Struct('!BxHxxxxxBxxII')  # 버전/IHL, 전체 길이, 프로토콜, 출발지, 목적지
+TCP_HEADER = struct.Struct('!HHIxxxxB')        # 출발 포트, 목적 포트, 시퀀스, 데이터 오프셋
+
+# IPv4 패킷에서 (flow, seq, payload) 추출 - flow는 (출발 IP, 출발 포트, 목적 IP, 목적 포트)
+def decode_ipv4_tcp(frame: memoryview, offset: int = 0):
+    if len(frame) < offset + 20:
+        return None
+    ver_ihl, total_len, proto, src_ip, dst_ip = IPV4_HEADER.unpack_from(frame, offset)
+    if ver_ihl >> 4 != 4 or proto != 6:
+        return None
+    tcp_offset = offset + (ver_ihl & 0x0f) * 4
+    if len(frame) < tcp_offset + 20:
+        return None
+    src_port, dst_port, seq, data_offset = TCP_HEADER.unpack_from(frame, tcp_offset)
+    payload_start = tcp_offset + (data_offset >> 4) * 4
+    payload_end = min(len(frame), offset + total_len) if total_len else len(frame)
+    return (src_ip, src_port, dst_ip, dst_port), seq, frame[payload_start:payload_end]
+
+# 점 표기 IPv4 주소를 정수로 변환 (flow 키를 백엔드 간에 통일)
+@lru_cache(maxsize=256)
+def ipv4_to_int(address: str) -> int:
+    return int.from_bytes(bytes(int(part) for part in address.split('.')), 'big')
 
-# 버프 업데이트 패킷 파싱 (타입 100049)
-def parse_buff_update(data):
+# IPv6 주소를 정수로 변환 (128비트)
+@lru_cache(maxsize=256)
+def ipv6_to_int(address: str) -> int:
+    return int(ipaddress.IPv6Address(address))
 
-    pivot = 0
+# "tcp and src port N" 형태의 필터에서 포트 추출 (다른 형태면 None)
+def parse_src_port_filter(filter_expr: str):
+    match = re.fullmatch(r"\s*tcp and src port (\d+)\s*", filter_expr)
+    return int(match.group(1)) if match else None
 
-    user_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    p1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
+# 캡처 백엔드 공통 인터페이스
+# 캡처 스레드에서 sink(timestamp, flow, seq, payload)를 패킷마다 호출
+class CaptureBackend(ABC):
+    name = ""
 
-    inst_key, pivot =  data[pivot:pivot+8].hex(), pivot+8
+    def __init__(self, filter_expr: str, iface, sink):
+        self.filter_expr = filter_expr
+        self.iface = iface
+        self.sink = sink
 
-    key, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    flags, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
+    @abstractmethod
+    def start(self) -> None: ...
 
-    stack1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    stack2, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
+    @abstractmethod
+    def stop(self) -> None: ...
 
-    adds = []
-    for i in range(stack2):
-        add, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-        adds.append(add)
+    def join(self) -> None:
+        pass
 
-    target_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    p4, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
+# scapy AsyncSniffer 백엔드 (Npcap/libpcap 사용, 모든 플랫폼 폴백, IPv4/IPv6)
+class ScapyCaptureBackend(CaptureBackend):
+    name = "scapy"
 
-    flags, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+8
+    def __init__(self, filter_expr: str, iface, sink):
+        super().__init__(filter_expr, iface, sink)
+        self.sniffer = AsyncSniffer(filter=filter_expr, prn=self._on_packet, iface=iface, store=False)
 
-    chunks = [data[i:i+4] for i in range(0, len(data), 4)]
-    raw_hex_chunks = []
-    for chunk in chunks:
-        if len(chunk) > 0:
-            raw_hex_chunks.append(chunk.hex())
-    payload_hex = " / ".join(raw_hex_chunks)
-    
-    return {
-        "type": 12,
-        "hide": False,
-        "inst_key": inst_key,
-        "buff_key": key,
-        "user_id": user_id,
-        "target_id": target_id,
-        "stack": stack1,
-        "length": len(data),
-        "hex": payload_hex,
+    def _on_packet(self, pkt: Packet) -> None:
+        if not pkt.haslayer(Raw) or not pkt.haslayer(TCP):
+            return
+        tcp = pkt[TCP]
+        if pkt.haslayer(IP):
+            ip = pkt[IP]
+            flow = (ipv4_to_int(ip.src), tcp.sport, ipv4_to_int(ip.dst), tcp.dport)
+        elif pkt.haslayer(IPv6):
+            ip = pkt[IPv6]
+            flow = (ipv6_to_int(ip.src), tcp.sport, ipv6_to_int(ip.dst), tcp.dport)
+        else:
+            return
+        self.sink(float(pkt.time), flow, tcp.seq, memoryview(bytes(pkt[Raw].load)))
+
+    def start(self) -> None:
+        self.sniffer.start()
+
+    def stop(self) -> None:
+        self.sniffer.stop()
+
+    def join(self) -> None:
+        self.sniffer.join()
+
+# 리눅스 AF_PACKET 원시 소켓 백엔드 (scapy 디섹션 없이 IP/TCP 헤더만 디코딩)
+# 커널 필터와 디코더가 IPv4 전용 - IPv6 로 접속하는 환경은 CaptureBackend 를 "scapy" 로 설정
+# 이더넷 헤더를 가정하므로 tun/VPN/PPP 처럼 링크 헤더가 다른 인터페이스가 있으면 생성 실패 (auto 는 scapy 로 폴백)
+class RawSocketCaptureBackend(CaptureBackend):
+    name = "rawsocket"
+    SO_ATTACH_FILTER = 26
+    ETH_P_ALL = 0x0003
+    ETH_HEADER_SIZE = 14
+    ETHERNET_HATYPES = (1, 772)  # ARPHRD_ETHER, ARPHRD_LOOPBACK (리눅스 루프백도 14바이트 이더넷 헤더)
+
+    def __init__(self, filter_expr: str, iface, sink):
+        super().__init__(filter_expr, iface, sink)
+        if not hasattr(socket, "AF_PACKET"):
+            raise OSError("AF_PACKET 미지원 플랫폼")
+        self.src_port = parse_src_port_filter(filter_expr)
+        if self.src_port is None:
+            raise ValueError(f"원시 소켓 백엔드에서 지원하지 않는 필터: {filter_expr}")
+        other = {name: hatype for name, hatype in RawSocketCaptureBackend.link_types(iface).items()
+                 if hatype not in self.ETHERNET_HATYPES}
+        if other:
+            raise OSError(f"이더넷이 아닌 링크 타입의 인터페이스: {other}")
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(self.ETH_P_ALL))
+        try:
+            if iface:
+                self.sock.bind((iface, 0))
+            self._attach_filter()
+            self.sock.settimeout(0.5)
+        except Exception:
+            self.sock.close()
+            raise
+        self.thread = None
+        self.running = False
+
+    # 인터페이스 이름 -> ARPHRD 링크 타입 (iface 가 없으면 켜져 있는 모든 인터페이스, 읽을 수 없으면 빈 매핑)
+    @staticmethod
+    def link_types(iface) -> dict:
+        names = [iface] if iface else [index_name[1] for index_name in socket.if_nameindex()]
+        result = {}
+        for name in names:
+            try:
+                if not iface:
+                    with open(f"/sys/class/net/{name}/operstate") as f:
+                        if f.read().strip() == "down":
+                            continue
+                with open(f"/sys/class/net/{name}/type") as f:
+                    result[name] = int(f.read())
+            except (OSError, ValueError):
+                continue
+        return result
+
+    # "tcp and src port N" (IPv4, 비단편)과 동일한 BPF 프로그램을 커널에 부착
+    def _attach_filter(self) -> None:
+        program = [
+            (0x28, 0, 0, 12),              # ldh [12]            ; EtherType
+            (0x15, 0, 8, 0x0800),          # jeq #IPv4
+            (0x30, 0, 0, 23),              # ldb [23]            ; IP 프로토콜
+            (0x15, 0, 6, 6),               # jeq #TCP
+            (0x28, 0, 0, 20),              # ldh [20]            ; 단편 오프셋
+            (0x45, 4, 0, 0x1fff),          # jset #0x1fff        ; 단편이면 거부
+            (0xb1, 0, 0, 14),              # ldxb 4*([14]&0xf)   ; IP 헤더 길이
+            (0x48, 0, 0, 14),              # ldh [x + 14]        ; TCP 출발 포트
+            (0x15, 0, 1, self.src_port),   # jeq #port
+            (0x06, 0, 0, 0x40000),         # ret #262144         ; 수락
+            (0x06, 0, 0, 0),               # ret #0              ; 거부
+        ]
+        insns = b"".join(struct.pack("HBBI", *insn) for insn in program)
+        self._filter_buf = ctypes.create_string_buffer(insns)
+        fprog = struct.pack("HL", len(program), ctypes.addressof(self._filter_buf))
+        self.sock.setsockopt(socket.SOL_SOCKET, self.SO_ATTACH_FILTER, fprog)
+
+    def _run(self) -> None:
+        sink = self.sink
+        src_port = self.src_port
+        outgoing = getattr(socket, "PACKET_OUTGOING", 4)
+        ethernet = self.ETHERNET_HATYPES
+        while self.running:
+            try:
+                frame, address = self.sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            # 이 호스트가 보낸 프레임의 사본은 제외 (루프백에서 중복 수신 방지)
+            # 생성 후 올라온 인터페이스의 링크 헤더가 이더넷이 아니면 헤더 위치를 알 수 없으므로 제외
+            if address[2] == outgoing or address[3] not in ethernet:
+                continue
+            decoded = decode_ipv4_tcp(memoryview(frame), self.ETH_HEADER_SIZE)
+            if decoded is None:
+                continue
+            flow, seq, payload = decoded
+            if flow[1] != src_port or not payload:
+                continue
+            sink(time.time(), flow, seq, payload)
+
+    def start(self) -> None:
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="RawSocketCapture", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+
+    def join(self) -> None:
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.sock.close()
+
+# pcap/pcapng 링크 타입별 IP 헤더 시작 위치
+LINKTYPE_HEADER_SIZE = {
+    0: 4,     # BSD 루프백
+    1: 14,    # 이더넷
+    12: 0,    # Raw IP (OpenBSD)
+    101: 0,   # Raw IP
+    113: 16,  # Linux cooked (SLL)
+    228: 0,   # IPv4
+    276: 20,  # Linux cooked v2 (SLL2)
+}
+
+# 링크 계층 헤더 크기 (이더넷 802.1Q VLAN 태그 포함, 지원하지 않는 링크 타입이면 None)
+def link_header_size(linktype: int, frame) -> int:
+    size = LINKTYPE_HEADER_SIZE.get(linktype)
+    if linktype == 1 and len(frame) >= 18 and frame[12] == 0x81 and frame[13] == 0x00:
+        size = 18
+    return size
+
+# pcap/pcapng 파일에서 (timestamp, linktype, frame memoryview)를 순서대로 읽기
+def iter_capture_file(path: str):
+    with open(path, 'rb') as f:
+        data = memoryview(f.read())
+    if len(data) < 24:
+        return
+    magic = data[:4].tobytes()
+
+    # pcap (마이크로초/나노초, 리틀/빅 엔디언)
+    pcap_magics = {
+        b'\xd4\xc3\xb2\xa1': ('<', 1e-6), b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+        b'\x4d\x3c\xb2\xa1': ('<', 1e-9), b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
     }
-
-# 버프 종료 패킷 파싱 (타입 100047)
-def parse_buff_end(data):
+    if magic in pcap_magics:
+        endian, ts_unit = pcap_magics[magic]
+        linktype = struct.unpack_from(endian + 'I', data, 20)[0] & 0x0fffffff
+        record = struct.Struct(endian + 'IIII')
+        pivot = 24
+        while pivot + record.size <= len(data):
+            ts_sec, ts_frac, incl_len, orig_len = record.unpack_from(data, pivot)
+            pivot += record.size
+            yield ts_sec + ts_frac * ts_unit, linktype, data[pivot:pivot + incl_len]
+            pivot += incl_len
+        return
+
+    # pcapng (섹션 헤더 블록마다 엔디언 확인)
+    if magic != b'\x0a\x0d\x0d\x0a':
+        raise ValueError(f"pcap/pcapng 파일이 아닙니다: {path}")
+    endian = '<'
+    interfaces = []  # [(linktype, 타임스탬프 단위)]
     pivot = 0
+    while pivot + 12 <= len(data):
+        if data[pivot:pivot + 4].tobytes() == b'\x0a\x0d\x0d\x0a':
+            endian = '<' if data[pivot + 8:pivot + 12].tobytes() == b'\x4d\x3c\x2b\x1a' else '>'
+            interfaces = []
+        block_type, block_len = struct.unpack_from(endian + 'II', data, pivot)
+        if block_len < 12:
+            break
+        body = data[pivot + 8:pivot + block_len - 4]
+
+        if block_type == 1:  # 인터페이스 설명 블록
+            linktype = struct.unpack_from(endian + 'H', body, 0)[0]
+            ts_unit = 1e-6
+            option = 8
+            while option + 4 <= len(body):
+                code, length = struct.unpack_from(endian + 'HH', body, option)
+                if code == 0:
+                    break
+                if code == 9 and length >= 1:  # if_tsresol
+                    resolution = body[option + 4]
+                    ts_unit = 2.0 ** -(resolution & 0x7f) if resolution & 0x80 else 10.0 ** -resolution
+                option += 4 + ((length + 3) & ~3)
+            interfaces.append((linktype, ts_unit))
+        elif block_type == 6:  # 확장 패킷 블록
+            iface_id, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(endian + 'IIIII', body, 0)
+            if iface_id < len(interfaces):
+                linktype, ts_unit = interfaces[iface_id]
+                yield ((ts_high << 32) | ts_low) * ts_unit, linktype, body[20:20 + cap_len]
+        elif block_type == 3 and interfaces:  # 단순 패킷 블록 (타임스탬프 없음)
+            orig_len = struct.unpack_from(endian + 'I', body, 0)[0]
+            linktype, ts_unit = interfaces[0]
+            yield 0.0, linktype, body[4:4 + min(orig_len, len(body) - 4)]
+
+        pivot += block_len
+
+# pcap/pcapng 재생 백엔드 (최대 속도 또는 캡처 타임스탬프 간격대로)
+class PcapReplayBackend(CaptureBackend):
+    name = "replay"
+
+    def __init__(self, filter_expr: str, iface, sink, path: str = "", realtime: bool = False):
+        super().__init__(filter_expr, iface, sink)
+        self.path = path
+        self.realtime = realtime
+        self.src_port = parse_src_port_filter(filter_expr)
+        self.frame_count = 0   # 파일에서 읽은 프레임 수
+        self.packet_count = 0  # 필터를 통과해 전달한 패킷 수
+        self.first_timestamp = None  # 전달한 첫/마지막 패킷의 캡처 시각
+        self.last_timestamp = None
+        self.thread = None
+        self.running = False
+
+    def _run(self) -> None:
+        sink = self.sink
+        src_port = self.src_port
+        started = time.perf_counter()
+        for timestamp, linktype, frame in iter_capture_file(self.path):
+            if not self.running:
+                break
+            self.frame_count += 1
+            offset = link_header_size(linktype, frame)
+            decoded = decode_ipv4_tcp(frame, offset) if offset is not None else None
+            if decoded is None:
+                continue
+            flow, seq, payload = decoded
+            if (src_port is not None and flow[1] != src_port) or not payload:
+                continue
+            if self.first_timestamp is None:
+                self.first_timestamp = timestamp
+            if self.realtime:
+                delay = (timestamp - self.first_timestamp) - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            self.last_timestamp = timestamp
+            self.packet_count += 1
+            sink(timestamp, flow, seq, payload)
+
+    def start(self) -> None:
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="PcapReplay", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+
+    def join(self) -> None:
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+CAPTURE_BACKENDS = {
+    ScapyCaptureBackend.name: ScapyCaptureBackend,
+    RawSocketCaptureBackend.name: RawSocketCaptureBackend,
+    PcapReplayBackend.name: PcapReplayBackend,
+}
+
+# 설정에 맞는 캡처 백엔드 생성 ("auto"는 원시 소켓을 먼저 시도하고 실패하면 scapy 사용)
+def create_capture_backend(name: str, filter_expr: str, iface, sink, **options) -> CaptureBackend:
+    if name in CAPTURE_BACKENDS:
+        return CAPTURE_BACKENDS[name](filter_expr, iface, sink, **options)
+    try:
+        return RawSocketCaptureBackend(filter_expr, iface, sink)
+    except Exception as e:
+        if logger:
+            logger.log(f"원시 소켓 캡처 사용 불가 ({e}) - scapy 캡처 사용", "DEBUG")
+        return ScapyCaptureBackend(filter_expr, iface, sink)
+
+# 압축(encode_type == 1) 레코드 해제 워커 풀
+# 작은 레코드는 스레드에 넘기는 비용이 더 크므로 이벤트 루프에서 바로 해제하고, 큰 레코드만 풀에서 처리
+# 동시 처리 한도를 넘으면 버리지 않고 이벤트 루프에서 바로 해제 (캡처 쪽으로 배압이 걸림)
+# 압축을 풀면 같은 타입의 레코드 내용 하나 (압축되지 않은 레코드와 같은 형식) - 고정 길이 타입은 길이가 다르면 버림
+# 결과 수거와 카운터 갱신은 이벤트 루프에서만 함
+class CompressedFrameDecoder:
+    def __init__(self, workers: int = 2, max_inflight: int = 256, inline_bytes: int = 1024):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="frame-decode")
+        self.max_inflight = max(1, max_inflight)
+        self.inline_bytes = inline_bytes
+        self.inflight = 0
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.decode_time = 0.0  # 워커에서 압축 해제 + 파싱에 쓴 시간 (초)
+
+    # 워커에서 실행: 압축 해제 후 레코드 타입의 파서로 디코딩 (파서가 빈 결과를 내면 길이 오류)
+    @staticmethod
+    def _decode(parse_func, data: bytes) -> tuple:
+        started = time.perf_counter()
+        payload = brotli.decompress(data)
+        entry = parse_func(payload)
+        if not entry:
+            raise ValueError(f"해제한 레코드 길이 {len(payload)}B 가 타입 형식과 맞지 않음")
+        return entry, time.perf_counter() - started
+
+    # 압축 레코드 해제 - 작은 레코드와 동시 처리 한도를 넘은 레코드는 파싱 결과, 나머지는 Future, 실패하면 None
+    # content 는 스트림 버퍼를 가리키므로 풀로 넘기기 전에 복사함
+    def decode(self, parse_func, content):
+        if len(content) >= self.inline_bytes and self.inflight < self.max_inflight:
+            self.inflight += 1
+            return self.pool.submit(CompressedFrameDecoder._decode, parse_func, bytes(content))
+        try:
+            entry, elapsed = CompressedFrameDecoder._decode(parse_func, content)
+        except Exception as e:
+            self._drop(e)
+            return None
+        self.frames_decoded += 1
+        self.decode_time += elapsed
+        return entry
+
+    # 완료된 작업의 결과 수거 (실패하면 None)
+    def collect(self, future: Future):
+        self.inflight -= 1
+        try:
+            entry, elapsed = future.result()
+        except Exception as e:
+            self._drop(e)
+            return None
+        self.frames_decoded += 1
+        self.decode_time += elapsed
+        return entry
+
+    # 해제/파싱 실패 기록
+    def _drop(self, error: Exception) -> None:
+        self.frames_dropped += 1
+        if logger:
+            logger.count_error("frame_decode", f"압축 레코드 해제 실패 - {type(error).__name__}: {error}")
+
+    # 전달 대기 중인 작업 폐기 (데이터 초기화 시)
+    def discard(self, items) -> None:
+        for _, item in items:
+            if isinstance(item, Future):
+                item.cancel()
+                self.inflight -= 1
+                self.frames_dropped += 1
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+# 공유 메모리 이벤트 링 (캡처 프로세스 -> 메인 프로세스, 생산자/소비자 각 1개)
+# 헤더: 쓰기 위치, 읽기 위치, 링이 가득 차 버린 이벤트 수 (각각 한쪽 프로세스만 갱신)
+# 슬롯: 이벤트 타입 + 캡처 시각(f64) + 숫자 필드 6개(u64) + 문자열 필드 1개(utf-8, 128바이트에서 잘림)
+class SharedEventRing:
+    HEADER = struct.Struct('<QQQ')
+    SLOT = struct.Struct('<Id6Q128s')
+    U64 = struct.Struct('<Q')
+
+    def __init__(self, slots: int = SystemConstants.EVENT_RING_SLOTS, name: str = None):
+        from multiprocessing import shared_memory
+        self.slots = slots
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner,
+                                              size=self.HEADER.size + slots * self.SLOT.size)
+        if self.owner:
+            self.HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def dropped(self) -> int:
+        return self.U64.unpack_from(self.shm.buf, 16)[0]
+
+    def __len__(self) -> int:
+        write, read, _ = self.HEADER.unpack_from(self.shm.buf, 0)
+        return write - read
+
+    # 생산자: 이벤트 레코드 하나 기록 (PacketStreamer 의 분석기 자리에 꽂아 쓰므로 이름이 update)
+    def update(self, entry, timestamp: float = 0.0) -> None:
+        buf = self.shm.buf
+        write, read, dropped = self.HEADER.unpack_from(buf, 0)
+        if write - read >= self.slots:
+            self.U64.pack_into(buf, 16, dropped + 1)
+            return
+        numeric, text = EVENT_SLOT_LAYOUTS[entry.type][1:3]
+        values = [entry[i] for i in numeric]
+        values += [0] * (6 - len(values))
+        name = entry[text].encode('utf-8')[:128] if text is not None else b''
+        self.SLOT.pack_into(buf, self.HEADER.size + (write % self.slots) * self.SLOT.size, entry.type, timestamp, *values, name)
+        self.U64.pack_into(buf, 0, write + 1)
+
+    # 소비자: 쌓인 이벤트를 최대 limit 개까지 (캡처 시각, 레코드) 로 복원
+    def drain(self, limit: int) -> list:
+        buf = self.shm.buf
+        write, read, _ = self.HEADER.unpack_from(buf, 0)
+        count = min(write - read, limit)
+        entries = []
+        for index in range(read, read + count):
+            event_type, timestamp, *values, name = self.SLOT.unpack_from(buf, self.HEADER.size + (index % self.slots) * self.SLOT.size)
+            record, numeric, text, template = EVENT_SLOT_LAYOUTS[event_type]
+            fields = list(template)
+            fields[0] = event_type
+            for position, value in zip(numeric, values):
+                fields[position] = value
+            if text is not None:
+                fields[text] = name.rstrip(b'\x00').decode('utf-8', errors='replace')
+            entries.append((timestamp, record._make(fields)))
+        if count:
+            self.U64.pack_into(buf, 8, read + count)
+        return entries
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+# 캡처 프로세스 본체 - 캡처/재조립/파싱까지 하고 이벤트를 링에 기록
+async def _capture_worker_loop(ring: SharedEventRing, stop_event, filter_expr: str, backend_name: str, backend_options: dict) -> None:
+    streamer = PacketStreamer(filter_expr, backend_name, analyzer=ring, **backend_options)
+    streamer.is_running = True
+    streamer.sniffer.start()
+    process_task = asyncio.create_task(streamer._process())
+    capture_done = asyncio.get_running_loop().run_in_executor(None, streamer.sniffer.join)
+    try:
+        last_expire = time.time()
+        while not stop_event.is_set() and not capture_done.done():
+            await asyncio.sleep(0.1)
+            if time.time() - last_expire >= SystemConstants.STATUS_INTERVAL:
+                last_expire = time.time()
+                streamer.flows.expire(last_expire)
+        if capture_done.done():
+            # 캡처가 끝났으면 (재생 파일 끝 등) 남은 배치까지 처리
+            streamer._flush_batch()
+            while (not streamer.queue.empty() or streamer._ordered) and not process_task.done():
+                await asyncio.sleep(0.001)
+    finally:
+        streamer.sniffer.stop()
+        process_task.cancel()
+        streamer.decoder.shutdown()
+
+# 캡처 프로세스 진입점 (spawn 으로 시작되므로 설정을 인자로 받아 전역 값을 다시 채움)
+def capture_worker_main(ring_name: str, slots: int, stop_event, config: dict) -> None:
+    global settings, DEBUG, IFACE, logger
+    settings = dict(config["settings"], CaptureProcess=False)
+    DEBUG = config["debug"]
+    IFACE = config["iface"]
+    logger = SimpleLogger(debug=DEBUG)
+    ring = SharedEventRing(slots, name=ring_name)
+    try:
+        asyncio.run(_capture_worker_loop(ring, stop_event, config["filter_expr"], config["backend_name"], config["backend_options"]))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+# 별도 프로세스에서 캡처/파싱을 돌리는 백엔드 (sink 대신 공유 메모리 링으로 이벤트 전달)
+class CaptureProcessBackend(CaptureBackend):
+    def __init__(self, filter_expr: str, iface, backend_name: str, **backend_options):
+        super().__init__(filter_expr, iface, None)
+        self.name = f"process({backend_name})"
+        self.backend_name = backend_name
+        self.backend_options = backend_options
+        self.ring = None
+        self.process = None
+        self.stop_event = None
+
+    def start(self) -> None:
+        import multiprocessing
+        context = multiprocessing.get_context("spawn")
+        self.ring = SharedEventRing()
+        self.stop_event = context.Event()
+        config = {
+            "settings": settings if 'settings' in globals() else {},
+            "debug": DEBUG,
+            "iface": self.iface,
+            "filter_expr": self.filter_expr,
+            "backend_name": self.backend_name,
+            "backend_options": self.backend_options,
+        }
+        self.process = context.Process(target=capture_worker_main, name="capture-worker", daemon=True,
+                                       args=(self.ring.name, self.ring.slots, self.stop_event, config))
+        self.process.start()
 
-    user_id, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-    p1, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-
-    inst_key, pivot =  data[pivot:pivot+8].hex(), pivot+8
-
-    flags, pivot =  int.from_bytes(data[pivot:pivot+4], byteorder='little'), pivot+4
-
-    chunks = [data[i:i+4] for i in range(0, len(data), 4)]
-    raw_hex_chunks = []
-    for chunk in chunks:
-        if len(chunk) > 0:
-            raw_hex_chunks.append(chunk.hex())
-    payload_hex = " / ".join(raw_hex_chunks)
-    
-    return {
-        "type": 13,
-        "hide": False,
-        "inst_key": inst_key,
-        "user_id": user_id,
-        "flags": flags,
-        "length": len(data),
-        "hex": payload_hex,
-    }
-
-# 패킷 타입별 파싱 함수 매핑
-parse_dict = {
-    10308: parse_attack,
-    100041: parse_action,      
-    100178: parse_hp_changed,  # 체력 변화, (4 대상, 4 패딩, 4 기존, 4 패딩, 4 현재, 4패딩)
-    10719: parse_self_damage,
-    100085: parse_atk,
-    100046: parse_buff,
-    100049: parse_buff_update,
-    100047: parse_buff_end
-    }
-
-# 패킷 분석 도구 함수들
+    def stop(self) -> None:
+        if self.stop_event is not None:
+            self.stop_event.set()
 
-# TCP 시퀀스 번호 관련 상수 및 함수
-SEQ_MOD = 2**32
+    def join(self) -> None:
+        if self.process is not None:
+            self.process.join()
+            self.process = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
 
-def seq_distance(a, b):
-    return ((a - b + 2**31) % 2**32) - 2**31
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
 
 # 네트워크 패킷을 캡처하고 처리하는 메인 클래스
 class PacketStreamer:
-    def __init__(self, filter_expr: str = "tcp and src port 16000"):  # 마비노기 서버 포트 16000
-        self.queue: asyncio.Queue[Packet] = asyncio.Queue()
+    # analyzer 를 주면 파싱 결과를 그쪽으로 전달 (캡처 프로세스에서는 공유 메모리 링)
+    def __init__(self, filter_expr: str = "tcp and src port 16000", backend_name: str = None, analyzer=None, **backend_options):  # 마비노기 서버 포트 16000
+        self.queue: asyncio.Queue[list[tuple]] = asyncio.Queue()
+        global settings
+        if backend_name is None:
+            backend_name = settings.get("CaptureBackend", "auto") if 'settings' in globals() else "auto"
+        capture_process = settings.get("CaptureProcess", False) if 'settings' in globals() else False
+        if capture_process and analyzer is None and backend_name != "replay":
+            # 캡처/재조립/파싱은 별도 프로세스에서, 이 프로세스는 링에서 이벤트만 받아 분석
+            self.sniffer = CaptureProcessBackend(filter_expr, IFACE, backend_name, **backend_options)
+        else:
+            self.sniffer = create_capture_backend(backend_name, filter_expr, IFACE, self._enqueue_packet, **backend_options)
         # 디버그: 필터 표현식 출력
         if logger:
-            logger.log(f"패킷 캡처 필터: {filter_expr}, 인터페이스: {IFACE}", "INFO")
-        self.sniffer = AsyncSniffer(filter=filter_expr, prn=self._enqueue_packet, iface=IFACE)
+            logger.log(f"패킷 캡처 필터: {filter_expr}, 인터페이스: {IFACE}, 백엔드: {self.sniffer.name}", "INFO")
         self.loop = asyncio.get_event_loop()
-        self.buffer:bytes = b''
-        self.tcp_segments = {}
-        self.current_seq = None
+        self.flows = FlowTable()
         # 패킷 로깅 옵션 확인
-        global settings
         packet_logging = settings.get("PacketLogging", False) if 'settings' in globals() else False
-        self.analyzer = CombatLogAnalyzer(packet_logging_enabled=packet_logging)
+        self.analyzer = analyzer if analyzer is not None else CombatLogAnalyzer(packet_logging_enabled=packet_logging)
         if packet_logging and logger:
             logger.log("패킷 로깅 활성화됨", "INFO")
+        # 디버그/패킷 로깅 중에는 모든 타입의 전체 필드와 덤프를, 평소에는 분석기가 읽는 필드만 디코딩
+        consumed = None if DEBUG or packet_logging else CombatLogAnalyzer.CONSUMED_FIELDS
+        self.parse_dict = parse_dict if consumed is None else build_parse_dict(consumed)
+        # numpy 가 있으면 공격/자가 데미지 레코드가 많이 쌓인 버퍼는 일괄 디코딩
+        numpy_batch = settings.get("NumpyBatchDecode", True) if 'settings' in globals() else True
+        self.batch_decoders = build_batch_decoders(consumed) if numpy_batch else {}
         self.is_running = False
         self.status_task = None
         self.cleanup_task = None
@@ -478,6 +1519,21 @@ class PacketStreamer:
         self.broadcast_task = None  # 데이터 브로드캐스트 태스크
         self.connected_websockets = set()  # 연결된 웹소켓 추적
         self.packet_count = 0  # 디버그: 패킷 카운터
+        self.parsed_count = 0  # 파싱된 게임 패킷 수
+        
+        # 캡처 스레드 -> 이벤트 루프 배치 전달 설정
+        self.batch_size = max(1, int(settings.get("CaptureBatchSize", 64) if 'settings' in globals() else 64))
+        self.batch_deadline = (settings.get("CaptureBatchDeadlineUs", 2000) if 'settings' in globals() else 2000) / 1_000_000
+        self._batch: list = []
+        self._batch_lock = threading.Lock()
+        self._batch_flush_handle = None
+
+        # 압축 레코드 해제 풀과 순서 보장용 전달 대기열 (파싱 결과 또는 해제 중인 Future)
+        self.decoder = CompressedFrameDecoder(
+            workers=int(settings.get("DecodeWorkers", 2) if 'settings' in globals() else 2),
+            max_inflight=int(settings.get("DecodeMaxInFlight", 256) if 'settings' in globals() else 256),
+            inline_bytes=int(settings.get("DecodeInlineBytes", 1024) if 'settings' in globals() else 1024))
+        self._ordered: deque = deque()
 
     # 상태 모니터링
     async def print_status(self):
@@ -486,12 +1542,32 @@ class PacketStreamer:
             try:
                 await asyncio.sleep(SystemConstants.STATUS_INTERVAL)  # 1분마다
                 user_count = len(self.analyzer._user_data)
-                segment_count = len(self.tcp_segments)
-                buffer_size = len(self.buffer)
+                self.flows.expire(time.time())  # 패킷이 끊긴 연결 정리 (새 연결이 없으면 get 에서 정리되지 않음)
+                segment_count = sum(len(flow.segments) for flow in self.flows)
+                buffer_size = sum(len(flow.buffer) for flow in self.flows)
+                gap_count = sum(flow.gap_count for flow in self.flows)
+                gap_bytes = sum(flow.gap_bytes for flow in self.flows)
+                frames_lost = sum(flow.frames_lost for flow in self.flows)
                 
                 # 상태 정보는 디버그 모드에서만 로그로 기록
                 if logger and logger.debug:
-                    logger.log(f"유저: {user_count} | TCP세그먼트: {segment_count} | 버퍼: {buffer_size}B", "DEBUG")
+                    logger.log(f"유저: {user_count} | TCP연결: {len(self.flows)} | TCP세그먼트: {segment_count} | 버퍼: {buffer_size}B", "DEBUG")
+                    report = self.analyzer.retention.last_report
+                    if report:
+                        logger.log(f"분석기 메모리(추정): {report['bytes'] / 1048576:.1f}MB / 예산 {report['budget'] / 1048576:.0f}MB | "
+                                   + " ".join(f"{name} {size / 1048576:.1f}MB" for name, size in report['sizes'].items()), "DEBUG")
+                    unmatched = self.analyzer._unmatched
+                    if unmatched[3] or unmatched[4]:
+                        logger.log(f"매칭 실패: HP 변화 {unmatched[3]}개 | 자가 데미지 {unmatched[4]}개", "DEBUG")
+                    if gap_count:
+                        logger.log(f"구간 손실: {gap_count}회 | {gap_bytes}B | 프레임 {frames_lost}개", "DEBUG")
+                    if isinstance(self.sniffer, CaptureProcessBackend) and self.sniffer.ring:
+                        ring = self.sniffer.ring
+                        logger.log(f"캡처 프로세스 링: 대기 {len(ring)}개 | 버림 {ring.dropped}개", "DEBUG")
+                    decoder = self.decoder
+                    if decoder.frames_decoded or decoder.frames_dropped:
+                        logger.log(f"압축 레코드: 해제 {decoder.frames_decoded}개 | 버림 {decoder.frames_dropped}개 | "
+                                   f"처리 중 {decoder.inflight}개 | 해제 시간 {decoder.decode_time * 1000:.0f}ms", "DEBUG")
                 
                 # 에러 통계가 있으면 출력
                 if logger and logger.error_count and logger.debug:
@@ -508,7 +1584,10 @@ class PacketStreamer:
             self.sniffer.start()
             self.status_task = asyncio.create_task(self.print_status())
             self.cleanup_task = asyncio.create_task(self.analyzer.cleanup_old_data())
-            self.process_task = asyncio.create_task(self._process())  # 패킷 처리 태스크
+            if isinstance(self.sniffer, CaptureProcessBackend):
+                self.process_task = asyncio.create_task(self._drain_worker())  # 캡처 프로세스 이벤트 수신 태스크
+            else:
+                self.process_task = asyncio.create_task(self._process())  # 패킷 처리 태스크
             self.broadcast_task = asyncio.create_task(self._process2())  # 브로드캐스트 태스크
             if logger:
                 logger.log("패킷 캡처 시작", "INFO")
@@ -551,28 +1630,28 @@ class PacketStreamer:
     
     # 데이터 초기화 (clear 명령 처리)
     def clear_data(self):
-        # CombatLogAnalyzer 초기화
-        self.analyzer._raw_data.clear()
-        self.analyzer._damage_by_user_by_target_by_skill = {0:{0:{"": CombatDetailData()}}}
-        self.analyzer._self_damage_by_user_by_target_by_skill = {0:{0:{"": CombatDetailData()}}}
-        self.analyzer._buff_uptime_by_user_by_target_by_skill = {0:{0:{"": {"": BuffUptimeData()}}}}
+        # 초기화 이전 패킷이 분석기로 들어가지 않도록 전달 대기열 비우기
+        self.decoder.discard(self._ordered)
+        self._ordered.clear()
+
+        # CombatLogAnalyzer 초기화 (현재 전투 집계 + 유저/버프 상태, 지난 전투 보관본은 유지)
+        self.analyzer._pending_hp.clear()
+        self.analyzer._pending_self.clear()
+        self.analyzer._reset_encounter()
         self.analyzer._buff_by_user_by_inst.clear()
-        self.analyzer._time_data = {}  # clear() 대신 새 딕셔너리 할당
-        self.analyzer._enemy_data = EnemyData()
+        self.analyzer._buff_log_by_user.clear()
+        self.analyzer._pending_buff_logs.clear()
         self.analyzer._user_tmp_data.clear()
         self.analyzer._user_data.clear()
+        self.analyzer._user_last_seen.clear()
         self.analyzer._self_damage_by_user.clear()
         self.analyzer._max_self_damage_by_user = SimpleDamageData()
-        self.analyzer._data_changed = True
-        self.analyzer._cached_json_data = None
-        self.analyzer._last_sent_data_hash = None  # 해시도 초기화
         self.analyzer._last_combat_time = time.time()
+        self.analyzer._last_event_time = None
         self.analyzer._is_user_data_updated = False  # 유저 데이터 플래그 초기화
         
         # PacketStreamer 버퍼 초기화
-        self.buffer = b''
-        self.tcp_segments.clear()
-        self.current_seq = None
+        self.flows.clear()
         
         if logger:
             logger.log("전투 데이터 초기화 완료", "INFO")
@@ -610,6 +1689,61 @@ class PacketStreamer:
                         }))
                     except Exception:
                         pass  # 전송 실패 무시
+                elif message == "encounters":
+                    # 지난 전투 목록
+                    try:
+                        await websocket.send(json.dumps({
+                            "type": "encounters",
+                            "data": self.analyzer.list_encounters()
+                        }))
+                    except Exception:
+                        pass  # 전송 실패 무시
+                elif message.startswith("encounter:"):
+                    # 지난 전투 스냅샷 (encounter:<id>)
+                    try:
+                        encounter_id = int(message.split(":", 1)[1])
+                        await websocket.send(json.dumps({
+                            "type": "encounter",
+                            "id": encounter_id,
+                            "data": self.analyzer.get_encounter(encounter_id)
+                        }))
+                    except Exception:
+                        pass  # 잘못된 id / 전송 실패 무시
+                elif message.startswith("ranking:"):
+                    # 계산 모드별 순위 뷰 (ranking:<mode> 또는 ranking:<mode>:single)
+                    try:
+                        _, mode, *rest = message.split(":")
+                        single = rest == ["single"]
+                        await websocket.send(json.dumps({
+                            "type": "ranking",
+                            "mode": mode,
+                            "single": single,
+                            "data": self.analyzer.get_ranking(mode, single)
+                        }))
+                    except Exception:
+                        pass  # 전송 실패 무시
+                elif message.startswith("detail:"):
+                    # 유저 한 명의 타겟/스킬별 상세 셀 (detail:<uid> 또는 detail:<uid>:single)
+                    try:
+                        _, uid, *rest = message.split(":")
+                        single = rest == ["single"]
+                        await websocket.send(json.dumps({
+                            "type": "detail",
+                            "uid": int(uid),
+                            "single": single,
+                            "data": self.analyzer.get_detail(int(uid), single)
+                        }))
+                    except Exception:
+                        pass  # 잘못된 id / 전송 실패 무시
+                elif message == "cube":
+                    # 전체 유저 x 타겟 x 스킬 셀 (저장용)
+                    try:
+                        await websocket.send(json.dumps({
+                            "type": "cube",
+                            "data": self.analyzer.get_damage_cube()
+                        }))
+                    except Exception:
+                        pass  # 전송 실패 무시
                 elif message == "ping":
                     # 클라이언트 heartbeat에 pong으로 응답
                     try:
@@ -625,152 +1759,215 @@ class PacketStreamer:
                 if logger:
                     logger.log(f"메시지 처리 오류: {e}", "ERROR")
 
-    def _enqueue_packet(self, pkt: Packet) -> None:
+    # 캡처 스레드: 패킷을 배치에 모으고, 배치가 시작될 때와 가득 찼을 때만 이벤트 루프를 깨움
+    def _enqueue_packet(self, timestamp: float, flow: tuple, seq: int, payload: memoryview) -> None:
         self.packet_count += 1
         # 디버그: 패킷 캡처 카운터
         if DEBUG and logger and self.packet_count % 100 == 0:
             logger.log(f"캡처된 패킷 수: {self.packet_count}", "DEBUG")
-        self.loop.call_soon_threadsafe(self.queue.put_nowait, pkt)
+        with self._batch_lock:
+            self._batch.append((timestamp, flow, seq, payload))
+            batch_len = len(self._batch)
+        if batch_len == self.batch_size:  # 배치 크기 1 이면 패킷마다 바로 전달
+            self.loop.call_soon_threadsafe(self._flush_batch)
+        elif batch_len == 1:
+            self.loop.call_soon_threadsafe(self._arm_batch_flush)
+
+    # 이벤트 루프: 배치 마감 타이머 설정
+    def _arm_batch_flush(self) -> None:
+        if self._batch_flush_handle is None:
+            self._batch_flush_handle = self.loop.call_later(self.batch_deadline, self._flush_batch)
+
+    # 이벤트 루프: 모인 배치를 큐에 한 번에 넣기
+    def _flush_batch(self) -> None:
+        if self._batch_flush_handle is not None:
+            self._batch_flush_handle.cancel()
+            self._batch_flush_handle = None
+        with self._batch_lock:
+            batch, self._batch = self._batch, []
+        if batch:
+            self.queue.put_nowait(batch)
 
     # 바이너리 데이터에서 게임 패킷 파싱
     
-    def _packet_parser(self, data: bytes) -> tuple[list,int]:
+    # 연결의 프레임 스캐너가 잘라낸 레코드를 타입별로 파싱
+    def _packet_parser(self, flow: TcpFlow) -> list:
         global DEBUG
         res = []
-        pivot = 0
-        buffer_size = len(data)
         
         # 디버그: 원시 데이터 확인
-        if DEBUG and logger and len(data) > 0:
-            logger.log(f"패킷 파싱 시작 - 데이터 크기: {buffer_size} bytes", "DEBUG")
+        if DEBUG and logger and len(flow.buffer) > 0:
+            logger.log(f"패킷 파싱 시작 - 데이터 크기: {len(flow.buffer)} bytes", "DEBUG")
             # 처음 100바이트만 출력
-            logger.log(f"원시 데이터 (처음 100바이트): {data[:min(100, buffer_size)].hex()}", "DEBUG")
-
-        while(pivot < len(data)):
-            
-            # 패킷 시작 부분 찾기 (마비노기 패킷 시그니처)
-            start_pivot = data.find(b'\x68\x27\x00\x00\x00\x00\x00\x00\x00', pivot)
-            if start_pivot == -1:
-                if DEBUG and logger and buffer_size > 0:
-                    logger.log(f"패킷 시그니처를 찾을 수 없음 (pivot: {pivot})", "DEBUG")
-                break
-            # 패킷 끝 부분 찾기
-            if data.find(b'\xe3\x27\x00\x00\x00\x00\x00\x00\x00', start_pivot + 9) == -1:
-                break
-            pivot = start_pivot + 9  # 패킷 시작 부분 이후로 이동
+            logger.log(f"원시 데이터 (처음 100바이트): {flow.buffer.view()[:100].hex()}", "DEBUG")
 
-            # 패킷이 완전한지 확인
-            while ( buffer_size > pivot + 9):
-
-                # 데이터 타입, 길이, 인코딩 타입 추출
-                data_type = int.from_bytes(data[pivot:pivot+4], byteorder='little')
-                length = int.from_bytes(data[pivot+4:pivot+8], byteorder='little')
-                encode_type = data[pivot+8]
-
-                if data_type == 0:
-                    break
-                
-                if buffer_size <= pivot + 9 + length:
-                    break
+        records = flow.split_records()
+        if self.batch_decoders and len(records) >= SystemConstants.NUMPY_BATCH_MIN:
+            batched = self._decode_batches(records)
+        else:
+            batched = [None] * len(records)
 
-               # 컨텐츠 추출
-                content = data[pivot+9:pivot+9+length]
-
-                try:
-                    if encode_type == 1:
-                        pass
-                    elif data_type in parse_dict:
-                        parse_func = parse_dict[data_type]
-                        content = parse_func(content)
-                        res.append(content)
-                        # 디버그: 파싱된 패킷 확인
-                        if DEBUG and logger and content:
-                            if content.get("type") == 4:  # 데미지 패킷
-                                logger.log(f"데미지 패킷 파싱: 유저ID={content.get('user_id')}, 데미지={content.get('damage')}", "DEBUG")
-                    else:
-                        # 알려지지 않은 패킷 타입
-                        if DEBUG:
-                            if logger:
-                                logger.log(f"알려지지 않은 패킷 타입: {data_type}, 크기: {len(content)}", "INFO")
-                            
-                except Exception as e:
-                    logger.count_error(f"packet_parse_{data_type}")
+        for ((data_type, encode_type, content, _), timestamp), entry in zip(records, batched):
+            if entry is not None:
+                res.append((timestamp, entry))
+                continue
+            try:
+                if encode_type == 1:
+                    # 압축 레코드 해제 (읽는 곳이 없는 타입은 해제하지 않음)
+                    if data_type in self.parse_dict:
+                        content = self.decoder.decode(self.parse_dict[data_type], content)
+                        if isinstance(content, Future):
+                            content.add_done_callback(self._wake_process)
+                            res.append((timestamp, content))
+                        elif content:
+                            res.append((timestamp, content))
+                elif data_type in self.parse_dict:
+                    parse_func = self.parse_dict[data_type]
+                    content = parse_func(content)
+                    # 길이가 맞지 않아 빈 결과가 나온 패킷은 분석기로 넘기지 않음
+                    if content:
+                        res.append((timestamp, content))
+                    # 디버그: 파싱된 패킷 확인
+                    if DEBUG and logger and content:
+                        if content.type == 4:  # 데미지 패킷
+                            logger.log(f"데미지 패킷 파싱: 유저ID={content.user_id}, 데미지={content.damage}", "DEBUG")
+                else:
+                    # 알려지지 않았거나 읽는 곳이 없는 패킷 타입 - 디코딩 없이 길이만큼 건너뜀
                     if DEBUG:
                         if logger:
-                            logger.log(f"패킷 파싱 오류 (타입 {data_type}): {e}", "ERROR")
-
-                pivot += 9 + length
+                            logger.log(f"알려지지 않은 패킷 타입: {data_type}, 크기: {len(content)}", "INFO")
+                        
+            except Exception as e:
+                logger.count_error(f"packet_parse_{data_type}")
+                if DEBUG:
+                    if logger:
+                        logger.log(f"패킷 파싱 오류 (타입 {data_type}): {e}", "ERROR")
 
-        return (res, pivot)
+        return res
     
-    # TCP 패킷을 수집하고 재조립하는 메인 프로세스
+    # 일괄 디코딩 대상 타입 레코드를 모아 NumPy 로 디코딩 (레코드 위치별 결과, 대상이 아니면 None)
+    def _decode_batches(self, records: list) -> list:
+        entries = [None] * len(records)
+        groups = {}
+        for index, ((data_type, encode_type, content, _), _) in enumerate(records):
+            decoder = self.batch_decoders.get(data_type)
+            if decoder is not None and encode_type == 0 and len(content) == decoder.size:
+                groups.setdefault(data_type, []).append(index)
+        for data_type, indexes in groups.items():
+            if len(indexes) < SystemConstants.NUMPY_BATCH_MIN:
+                continue
+            try:
+                decoded = self.batch_decoders[data_type].decode([records[index][0][2] for index in indexes])
+            except Exception as e:
+                # 실패하면 레코드별 파서로 처리
+                logger.count_error(f"packet_batch_{data_type}")
+                continue
+            for index, entry in zip(indexes, decoded):
+                entries[index] = entry
+        return entries
+
+    # 연결 버퍼에서 완성된 게임 패킷을 파싱해 parsed에 추가
+    def _drain_buffer(self, flow: TcpFlow, parsed: list) -> None:
+        parsed.extend(self._packet_parser(flow))
+
+    # 패킷 배치 하나를 재조립 -> 파싱 -> 분석까지 한 번에 처리 (디버그 모드 분석 오류 시 False)
+    def _process_batch(self, batch: list) -> bool:
+        parsed = []
+        touched = {}  # 이번 배치에서 데이터가 들어온 연결 (순서 유지)
+        for timestamp, key, seq, payload in batch:
+            flow = self.flows.get(key, timestamp)
+            if not flow.in_window(seq):
+                if not flow.should_jump(seq):
+                    continue
+                # 저장된 세그먼트가 있으면 빠진 구간부터 건너뛰어 윈도우를 따라잡음
+                while len(flow.segments) and not flow.in_window(seq):
+                    self._drain_buffer(flow, parsed)
+                    flow.skip_gap(timestamp)
+                if not flow.in_window(seq):
+                    # 복구 불가능한 점프: 이미 받은 완성 프레임은 먼저 파싱하고 새 위치로 재동기화
+                    self._drain_buffer(flow, parsed)
+                    flow.jump_to(seq)
+            flow.reassemble(seq, payload, timestamp)
+            if flow.gap_expired(timestamp):
+                # 빠진 구간을 더 기다리지 않고 건너뜀
+                self._drain_buffer(flow, parsed)
+                flow.skip_gap(timestamp)
+            touched[key] = flow
+            # 배치 도중 버퍼가 커지면 먼저 파싱해 두기
+            if len(flow.buffer) > SystemConstants.BUFFER_SIZE:
+                self._drain_buffer(flow, parsed)
+        for flow in touched.values():
+            self._drain_buffer(flow, parsed)
+
+        self._ordered.extend(parsed)
+        return self._dispatch_ready()
+
+    # 전달 대기열 ((캡처 시각, 레코드 또는 Future)) 앞에서부터 분석기로 전달 (압축 해제가 끝나지 않은 레코드에서 멈춰 순서 유지)
+    def _dispatch_ready(self) -> bool:
+        ordered = self._ordered
+        while ordered:
+            timestamp, entry = ordered[0]
+            if isinstance(entry, Future):
+                if not entry.done():
+                    break
+                ordered.popleft()
+                entry = self.decoder.collect(entry)
+                if not entry:
+                    continue
+            else:
+                ordered.popleft()
+            self.parsed_count += 1
+            try:
+                self.analyzer.update(entry, timestamp)
+            except Exception as e:
+                if logger:
+                    logger.log(f"데이터 분석 오류: {e}", "ERROR")
+                if DEBUG:
+                    return False
+                # 디버그 모드가 아니면 계속 실행
+        return True
+
+    # 압축 해제 완료 시 (워커 스레드) 빈 배치를 넣어 처리 루프가 대기열을 다시 확인하게 함
+    def _wake_process(self, future: Future) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, [])
+        except RuntimeError:
+            pass  # 이벤트 루프 종료됨
+
+    # TCP 패킷 배치를 수집하고 재조립하는 메인 프로세스
     async def _process(self) -> None:
         while True:
             try:
-                pkt: Packet = await self.queue.get()
+                batch: list = await self.queue.get()
             except asyncio.CancelledError as e:
                 if logger:
                     logger.log("패킷 처리 취소됨", "INFO")
                 break
 
-            if pkt.haslayer(Raw):
-                seq = pkt[TCP].seq
-                payload = bytes(pkt[Raw].load)
-                
-                # 디버그: TCP 패킷 수신 확인
-                if DEBUG and logger:
-                    logger.log(f"TCP 패킷 수신 - SEQ: {seq}, 페이로드 크기: {len(payload)} bytes", "DEBUG")
-                
-                if self.current_seq is None:
-                    self.current_seq = seq
+            if not self._process_batch(batch):
+                break
 
-                if abs(seq_distance(seq,self.current_seq)) > SystemConstants.TCP_WINDOW:
-                    self.tcp_segments.clear()
-                    self.current_seq = None
-                    self.buffer = b''
-                    continue
-                    
-                # TCP 세그먼트 수 제한
-                if len(self.tcp_segments) > SystemConstants.MAX_TCP_SEGMENTS:
-                    # 오래된 세그먼트 절반 삭제
-                    sorted_seqs = sorted(self.tcp_segments.keys())
-                    for seq in sorted_seqs[:len(sorted_seqs)//2]:
-                        del self.tcp_segments[seq]
+    # 캡처 프로세스가 공유 메모리 링에 기록한 이벤트를 분석기로 전달
+    async def _drain_worker(self) -> None:
+        backend: CaptureProcessBackend = self.sniffer
+        while True:
+            try:
+                entries = backend.ring.drain(SystemConstants.EVENT_RING_DRAIN)
+                if entries:
+                    self._ordered.extend(entries)
+                    if not self._dispatch_ready():
+                        break
+                    await asyncio.sleep(0)
+                elif not backend.is_alive():
                     if logger:
-                        logger.log(f"TCP 세그먼트 정리: {len(sorted_seqs)} -> {len(self.tcp_segments)}", "INFO")
-                    
-                if seq not in self.tcp_segments or self.tcp_segments[seq] != payload:
-                    self.tcp_segments[seq] = payload
-
-                if self.current_seq not in self.tcp_segments:
-                    pass
-                
-                # 재조립
-                while self.current_seq in self.tcp_segments:
-                    segment = self.tcp_segments.pop(self.current_seq)
-                    self.buffer += segment
-                    self.current_seq = (self.current_seq + len(segment)) % SEQ_MOD
-
-                if len(self.buffer) > SystemConstants.BUFFER_SIZE:
-                    # 버퍼가 너무 크면 절반 정리
-                    self.buffer = self.buffer[len(self.buffer)//2:]
-                    if DEBUG:
-                        if logger:
-                            logger.log(f"버퍼 정리: {SystemConstants.BUFFER_SIZE} bytes 초과", "INFO")
-
-                parsed, pivot = self._packet_parser(self.buffer)
-                self.buffer = self.buffer[pivot:]
-
-                if parsed:
-                    try:
-                        for entry in parsed:
-                            self.analyzer.update(entry)
-                    except Exception as e:
-                        if logger:
-                            logger.log(f"데이터 분석 오류: {e}", "ERROR")
-                        if DEBUG:
-                            break
-                        # 디버그 모드가 아니면 계속 실행
+                        logger.log("캡처 프로세스가 종료됨", "ERROR")
+                    break
+                else:
+                    await asyncio.sleep(0.005)
+            except asyncio.CancelledError as e:
+                if logger:
+                    logger.log("패킷 처리 취소됨", "INFO")
+                break
 
     # 분석된 데이터를 주기적으로 WebSocket으로 전송
     async def _process2(self) -> None:
@@ -813,10 +2010,28 @@ class PacketStreamer:
 import time
 from dataclasses import dataclass, field, asdict, is_dataclass
 from collections import defaultdict
-from typing import Dict, Any, DefaultDict
-
-# 데미지 통계 데이터 클래스
-@dataclass
+from typing import Dict, Any, DefaultDict, Optional
+
+# 데미지 -> 로그 버킷 번호 (작은 값은 그대로, 이후는 지수 + 상위 비트)
+def damage_bucket(damage: int) -> int:
+    sub_bits = SystemConstants.DAMAGE_HIST_SUB_BITS
+    exp = damage.bit_length() - 1 - sub_bits
+    if exp <= 0:
+        return damage
+    return (exp << sub_bits) + (damage >> exp)
+
+# 버킷 번호 -> [하한, 상한)
+def damage_bucket_bounds(index: int) -> tuple:
+    sub_bits = SystemConstants.DAMAGE_HIST_SUB_BITS
+    if index < 2 << sub_bits:
+        return index, index + 1
+    exp = (index >> sub_bits) - 1
+    mantissa = index - (exp << sub_bits)
+    return mantissa << exp, (mantissa + 1) << exp
+
+# 데미지 통계 데이터 클래스 (슬롯 카운터 레코드)
+# 평균/분산은 정수 합/제곱합으로, 분위수는 로그 버킷 히스토그램으로 계산 - 셀 메모리는 버킷 수로 제한되고 merge() 로 합칠 수 있음
+@dataclass(slots=True)
 class DamageData:
     total_damage: int = 0
     total_count: int = 0
@@ -826,68 +2041,105 @@ class DamageData:
     fast_count: int = 0
     max_damage: int = 0
     min_damage: int = 0
-    
-    # 슬라이딩 윈도우 DPS를 위한 히스토리
-    damage_history: list = field(default_factory=list)  # [(damage, timestamp), ...]
-    sliding_window_dps: float = 0.0
-    
-    # 평균 공증/피증 계산을 위한 데이터
-    base_damage_list: list = field(default_factory=list)
-    actual_damage_list: list = field(default_factory=list)
-    
-    def add_damage_record(self, damage: int, timestamp: float, is_base: bool = False):
-        """데미지 기록 추가 및 오래된 기록 정리"""
-        self.damage_history.append((damage, timestamp))
-        
-        # 30분 이상 된 기록 제거
-        cutoff_time = timestamp - 1800
-        self.damage_history = [(d, t) for d, t in self.damage_history if t > cutoff_time]
-        
-        # base/actual 데미지 기록
-        if is_base:
-            self.base_damage_list.append(damage)
-            if len(self.base_damage_list) > 1000:  # 최대 1000개만 유지
-                self.base_damage_list = self.base_damage_list[-1000:]
-        else:
-            self.actual_damage_list.append(damage)
-            if len(self.actual_damage_list) > 1000:
-                self.actual_damage_list = self.actual_damage_list[-1000:]
-    
-    def calculate_sliding_dps(self, window_seconds: int = 5) -> float:
-        """슬라이딩 윈도우 DPS 계산 (기본 5초)"""
-        if not self.damage_history:
+    sum_sq: int = 0  # 데미지 제곱합
+    buckets: Dict[int, int] = field(default_factory=dict)  # 로그 버킷 -> 타격 수
+    summary: tuple = field(default=(0, 0, 0, 0, 0), compare=False, repr=False)  # (타격 수, std, p50, p90, p99) 캐시
+
+    # 타격 1회 누적 (crit/addhit/power/fast 는 0 또는 1, bucket 은 damage_bucket(damage))
+    def add(self, damage: int, crit: int, addhit: int, power: int, fast: int, bucket: int) -> None:
+        self.total_damage  += damage
+        self.total_count   += 1
+        self.crit_count    += crit
+        self.addhit_count  += addhit
+        self.power_count   += power
+        self.fast_count    += fast
+        self.sum_sq        += damage * damage
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        if damage > self.max_damage:
+            self.max_damage = damage
+        if self.min_damage <= 0 or damage < self.min_damage:
+            self.min_damage = damage
+
+    # 다른 통계 합치기 (타겟/구간 합산)
+    def merge(self, other: "DamageData") -> None:
+        self.total_damage  += other.total_damage
+        self.total_count   += other.total_count
+        self.crit_count    += other.crit_count
+        self.addhit_count  += other.addhit_count
+        self.power_count   += other.power_count
+        self.fast_count    += other.fast_count
+        self.sum_sq        += other.sum_sq
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.max_damage = max(self.max_damage, other.max_damage)
+        if other.min_damage > 0 and (self.min_damage <= 0 or other.min_damage < self.min_damage):
+            self.min_damage = other.min_damage
+
+    # 표준편차 (정수 연산으로 분산을 구한 뒤 제곱근)
+    def stddev(self) -> float:
+        n = self.total_count
+        if n < 2:
             return 0.0
-        
-        current_time = time.time()
-        cutoff_time = current_time - window_seconds
-        recent_damages = [d for d, t in self.damage_history if t >= cutoff_time]
-        
-        if not recent_damages:
-            return 0.0
-            
-        total_damage = sum(recent_damages)
-        return total_damage / window_seconds
-    
-    def calculate_avg_multiplier(self) -> float:
-        """평균 공증 계산"""
-        if not self.base_damage_list or not self.actual_damage_list:
-            return 100.0
-        
-        avg_base = sum(self.base_damage_list) / len(self.base_damage_list)
-        avg_actual = sum(self.actual_damage_list) / len(self.actual_damage_list)
-        
-        if avg_base == 0:
-            return 100.0
-            
-        return (avg_actual / avg_base) * 100
+        return ((n * self.sum_sq - self.total_damage * self.total_damage) / (n * n)) ** 0.5
+
+    # 분위수 (버킷 중앙값, 최소/최대로 보정) - qs 는 오름차순
+    def percentiles(self, *qs: float) -> list:
+        values = []
+        if self.total_count == 0:
+            return [0] * len(qs)
+        pending = iter(qs)
+        q = next(pending)
+        seen = 0
+        for bucket, count in sorted(self.buckets.items()):
+            seen += count
+            while seen >= q * self.total_count:
+                low, high = damage_bucket_bounds(bucket)
+                values.append(min(max((low + high - 1) // 2, self.min_damage), self.max_damage))
+                q = next(pending, None)
+                if q is None:
+                    return values
+        return values + [self.max_damage] * (len(qs) - len(values))
+
+    def to_dict(self) -> dict:
+        if self.summary[0] != self.total_count:
+            self.summary = (self.total_count, round(self.stddev()), *self.percentiles(0.5, 0.9, 0.99))
+        _, std, p50, p90, p99 = self.summary
+        return {
+            "total_damage": self.total_damage,
+            "total_count": self.total_count,
+            "crit_count": self.crit_count,
+            "addhit_count": self.addhit_count,
+            "power_count": self.power_count,
+            "fast_count": self.fast_count,
+            "max_damage": self.max_damage,
+            "min_damage": self.min_damage,
+            "std": std,
+            "p50": p50,
+            "p90": p90,
+            "p99": p99,
+        }
 
 # 버프 영향 데이터 클래스
-@dataclass
+@dataclass(slots=True)
 class BuffImpactData:
     total_count: int = 0
     total_atk: float = 0
     total_dmg: float = 0
 
+    # 버프 값이 이미 퍼센트이므로 그대로 누적 (나중에 평균 계산)
+    def add(self, atk: float, dmg: float) -> None:
+        self.total_count += 1
+        self.total_atk   += atk
+        self.total_dmg   += dmg
+
+    def merge(self, other: "BuffImpactData") -> None:
+        self.total_count += other.total_count
+        self.total_atk   += other.total_atk
+        self.total_dmg   += other.total_dmg
+
+    def to_dict(self) -> dict:
+        return {"total_count": self.total_count, "total_atk": self.total_atk, "total_dmg": self.total_dmg}
+
 # 힐 데이터 클래스
 @dataclass
 class HealData:
@@ -897,7 +2149,7 @@ class HealData:
     max_heal: int = 0
 
 # 전투 상세 데이터 클래스 (모든 데미지 타입 포함)
-@dataclass
+@dataclass(slots=True)
 class CombatDetailData:
     all: DamageData = field(default_factory=DamageData)
     normal: DamageData = field(default_factory=DamageData)
@@ -905,6 +2157,352 @@ class CombatDetailData:
     special: DamageData = field(default_factory=DamageData)
     buff: BuffImpactData = field(default_factory=BuffImpactData)
 
+    def merge(self, other: "CombatDetailData") -> None:
+        self.all.merge(other.all)
+        self.normal.merge(other.normal)
+        self.dot.merge(other.dot)
+        self.special.merge(other.special)
+        self.buff.merge(other.buff)
+
+    def to_dict(self) -> dict:
+        return {
+            "all": self.all.to_dict(),
+            "normal": self.normal.to_dict(),
+            "dot": self.dot.to_dict(),
+            "special": self.special.to_dict(),
+            "buff": self.buff.to_dict(),
+        }
+
+# 데미지 집계 저장소
+# (유저, 타겟, 스킬) 을 정수 id 로 인터닝하고 셀을 한 단계 딕셔너리에 보관 (id 0 = 유저 0 / 타겟 0 / 스킬 "" 롤업)
+# 타격 하나가 갱신하는 셀 5개 (타겟 전체, 유저 전체, 유저-타겟, 유저-스킬, 유저-타겟-스킬) 는 묶어서 캐시
+class DamageStore:
+    ID_BITS = 21
+
+    def __init__(self):
+        self._ids = ({0: 0}, {0: 0}, {"": 0})  # 유저 / 타겟 / 스킬 -> id
+        self._values = ([0], [0], [""])       # id -> 유저 / 타겟 / 스킬
+        self.cells: Dict[int, CombatDetailData] = {}
+        self._hit_cells: Dict[tuple, tuple] = {}
+        self.touched: Dict[tuple, float] = {}  # (유저, 타겟, 스킬) -> 마지막 타격 시각
+        self.by_target: Dict[int, set] = {}    # 타겟 -> touched 의 (유저, 스킬) - 타겟 단위 정리를 그 타겟 셀 수만큼만
+        self.cell(0, 0, "")  # 빈 상태에서도 {0: {0: {"": ...}}} 모양 유지
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def _intern(self, axis: int, value) -> int:
+        ids = self._ids[axis]
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(self._values[axis])
+            self._values[axis].append(sys.intern(value) if axis == 2 else value)
+        return index
+
+    def _key(self, uid: int, tid: int, skill: str) -> int:
+        bits = DamageStore.ID_BITS
+        return (self._intern(0, uid) << (2 * bits)) | (self._intern(1, tid) << bits) | self._intern(2, skill)
+
+    # 셀 가져오기 (없으면 생성)
+    def cell(self, uid: int, tid: int, skill: str) -> CombatDetailData:
+        key = self._key(uid, tid, skill)
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = CombatDetailData()
+        return cell
+
+    # 셀 조회 (없으면 None)
+    def get(self, uid: int, tid: int, skill: str) -> CombatDetailData:
+        ids = self._ids
+        if uid not in ids[0] or tid not in ids[1] or skill not in ids[2]:
+            return None
+        return self.cells.get(self._key(uid, tid, skill))
+
+    # 타격 하나가 갱신하는 셀 묶음 (타겟 전체, 유저 전체, 유저-타겟, 유저-스킬, 유저-타겟-스킬)
+    def hit_cells(self, uid: int, tid: int, skill: str, now: float = 0.0) -> tuple:
+        group = self._hit_cells.get((uid, tid, skill))
+        if group is None:
+            group = self._hit_cells[(uid, tid, skill)] = (
+                self.cell(0, tid, ""), self.cell(uid, 0, ""), self.cell(uid, tid, ""),
+                self.cell(uid, 0, skill), self.cell(uid, tid, skill))
+            self.by_target.setdefault(tid, set()).add((uid, skill))
+        self.touched[(uid, tid, skill)] = now
+        return group
+
+    # 셀 키 -> (유저, 타겟, 스킬)
+    def unpack(self, key: int) -> tuple:
+        bits = DamageStore.ID_BITS
+        mask = (1 << bits) - 1
+        return (self._values[0][key >> (2 * bits)], self._values[1][(key >> bits) & mask], self._values[2][key & mask])
+
+    # 데이터가 있는 유저 목록
+    def users(self) -> list:
+        bits = 2 * DamageStore.ID_BITS
+        return [self._values[0][index] for index in sorted({key >> bits for key in self.cells})]
+
+    # 유저의 모든 셀 (롤업 포함)
+    def user_cells(self, uid: int):
+        uid_index = self._ids[0].get(uid)
+        if uid_index is None:
+            return
+        bits = 2 * DamageStore.ID_BITS
+        for key, cell in self.cells.items():
+            if key >> bits == uid_index:
+                yield cell
+
+    # 유저 데이터 삭제 (여러 유저를 한 번에 - 구조마다 한 번만 훑음), 지운 셀 수 반환
+    def discard_users(self, uids: set) -> int:
+        indexes = {self._ids[0][uid] for uid in uids if uid in self._ids[0]}
+        if not indexes:
+            return 0
+        bits = 2 * DamageStore.ID_BITS
+        before = len(self.cells)
+        self.cells = {key: cell for key, cell in self.cells.items() if key >> bits not in indexes}
+        self._hit_cells = {k: v for k, v in self._hit_cells.items() if k[0] not in uids}
+        self.touched = {k: v for k, v in self.touched.items() if k[0] not in uids}
+        for tid, members in list(self.by_target.items()):
+            members.difference_update([member for member in members if member[0] in uids])
+            if not members:
+                del self.by_target[tid]
+        return before - len(self.cells)
+
+    # (유저, 타겟, 스킬) 셀 제거 - 남은 스킬 셀이 없는 유저-타겟 / 타겟 합계 셀도 함께 제거
+    # 유저 전체 / 유저-스킬 합계 셀은 유지하므로 유저 총합은 그대로, 반환값은 지운 셀 수
+    def evict(self, groups) -> int:
+        before = len(self.cells)
+        pairs = {}
+        for group in groups:
+            uid, tid, skill = group
+            self.touched.pop(group, None)
+            self._hit_cells.pop(group, None)
+            members = self.by_target.get(tid)
+            if members is not None:
+                members.discard((uid, skill))
+            if tid and skill:
+                self.cells.pop(self._key(uid, tid, skill), None)
+            pairs.setdefault(tid, set()).add(uid)
+        for tid, uids in pairs.items():
+            members = self.by_target.get(tid)
+            if not tid:
+                continue
+            if not members:
+                self.by_target.pop(tid, None)
+                self.cells.pop(self._key(0, tid, ""), None)
+            for uid in uids - {uid for uid, _ in members or ()}:
+                self.cells.pop(self._key(uid, tid, ""), None)
+        return before - len(self.cells)
+
+    # 타겟의 (유저, 타겟, 스킬) 묶음
+    def target_groups(self, tid: int) -> list:
+        return [(uid, tid, skill) for uid, skill in self.by_target.get(tid, ())]
+
+    # 타겟 데이터 제거 (여러 타겟을 한 번에)
+    def discard_targets(self, tids: set) -> int:
+        return self.evict([group for tid in tids for group in self.target_groups(tid)])
+
+    # 타겟의 유저별 합계 셀을 다른 타겟 (기타) 에 합친 뒤 타겟 셀 제거 - 스킬별 셀은 합치지 않음
+    # 합친 타겟은 (유저, 기타, "") 를 묶음으로 마지막 타격 시각을 기록 (오래된 셀 정리 대상)
+    def fold_target(self, tid: int, into: int) -> None:
+        groups = self.target_groups(tid)
+        for uid in {0} | {uid for uid, _, _ in groups}:
+            cell = self.get(uid, tid, "")
+            if cell is not None:
+                self.cell(uid, into, "").merge(cell)
+        for group in groups:
+            other = (group[0], into, "")
+            self.touched[other] = max(self.touched.get(other, 0.0), self.touched[group])
+            self.by_target.setdefault(into, set()).add((group[0], ""))
+        self.evict(groups)
+
+    # 등록된 유저 / 타겟 / 스킬 id 수
+    def interned(self) -> int:
+        return sum(len(values) for values in self._values)
+
+    # 셀에서 더 이상 쓰지 않는 id 회수 - 절반 이상이 죽은 id 일 때만 남은 id 로 다시 매기고 셀 키를 바꿈
+    # _hit_cells / touched 는 원래 값과 셀 객체를 들고 있으므로 그대로 유효, 반환값은 회수한 id 수
+    def compact(self) -> int:
+        bits = DamageStore.ID_BITS
+        mask = (1 << bits) - 1
+        live = ({0}, {0}, {0})
+        for key in self.cells:
+            live[0].add(key >> (2 * bits))
+            live[1].add((key >> bits) & mask)
+            live[2].add(key & mask)
+        dead = self.interned() - sum(len(indexes) for indexes in live)
+        if dead * 2 < self.interned():
+            return 0
+        remap = []
+        for axis, indexes in enumerate(live):
+            old = self._values[axis]
+            values = [old[index] for index in sorted(indexes)]
+            self._values[axis][:] = values
+            self._ids[axis].clear()
+            self._ids[axis].update((value, index) for index, value in enumerate(values))
+            remap.append({index: new for new, index in enumerate(sorted(indexes))})
+        self.cells = {(remap[0][key >> (2 * bits)] << (2 * bits)) | (remap[1][(key >> bits) & mask] << bits)
+                      | remap[2][key & mask]: cell for key, cell in self.cells.items()}
+        return dead
+
+    # 유저 -> 타겟 -> 스킬 중첩 보기 (셀 객체 공유)
+    def nested(self) -> dict:
+        result = {}
+        for key, cell in self.cells.items():
+            uid, tid, skill = self.unpack(key)
+            result.setdefault(uid, {}).setdefault(tid, {})[skill] = cell
+        return result
+
+    # 클라이언트 전송용 중첩 딕셔너리 (키는 문자열)
+    # 셀 전체를 유저 -> 타겟 -> 스킬 JSON 으로 (uid 를 주면 그 유저의 셀만)
+    def to_json_dict(self, uid: int = None) -> dict:
+        result = {}
+        items = self.cells.items()
+        if uid is not None:
+            uid_index = self._ids[0].get(uid)
+            if uid_index is None:
+                return result
+            bits = 2 * DamageStore.ID_BITS
+            items = [(key, cell) for key, cell in items if key >> bits == uid_index]
+        for key, cell in items:
+            uid, tid, skill = self.unpack(key)
+            result.setdefault(str(uid), {}).setdefault(str(tid), {})[skill] = cell.to_dict()
+        return result
+
+# DPS 타임라인 시리즈 (유저-타겟 하나)
+# 해상도별 링에 버킷 끝 시점의 누적 데미지를 보관 -> 구간 데미지/이동 DPS 를 뺄셈 한 번으로 계산
+# 타격은 누적값만 올리고, 초가 바뀔 때 지난 버킷을 각 해상도 링에 기록 (롤업)
+class DpsSeries:
+    __slots__ = ("total", "first", "head", "peak", "rings")
+
+    def __init__(self, second: int):
+        self.total = 0        # 누적 데미지
+        self.first = second   # 첫 타격 시각(초)
+        self.head = second    # 마지막 타격 시각(초) - 이 시각이 속한 버킷은 아직 열려 있음
+        self.peak = 0         # 닫힌 TIMELINE_PEAK_RES 버킷 중 최대 데미지
+        self.rings = tuple(array('q') for _ in SystemConstants.TIMELINE_RESOLUTIONS)
+
+    # 타격 누적
+    def add(self, second: int, damage: int) -> None:
+        if second > self.head:
+            self._advance(second)
+        self.total += damage
+
+    # 열린 버킷들을 닫고 빈 구간을 현재 누적값으로 채움 (링 크기 이상은 건너뜀)
+    def _advance(self, second: int) -> None:
+        slots = SystemConstants.TIMELINE_SLOTS
+        total = self.total
+        for level, res in enumerate(SystemConstants.TIMELINE_RESOLUTIONS):
+            old = self.head // res
+            new = second // res
+            if new == old:
+                continue
+            if res == SystemConstants.TIMELINE_PEAK_RES:
+                self.peak = max(self.peak, total - self.cumulative(level, old - 1))
+            ring = self.rings[level]
+            base = self.first // res
+            for bucket in range(max(old, new - slots), new):
+                index = (bucket - base) % slots
+                if index < len(ring):
+                    ring[index] = total
+                else:
+                    ring.extend([total] * (index + 1 - len(ring)))
+        self.head = second
+
+    # 버킷 끝 시점의 누적 데미지 (링 범위를 벗어나면 None)
+    def cumulative(self, level: int, bucket: int):
+        res = SystemConstants.TIMELINE_RESOLUTIONS[level]
+        head = self.head // res
+        if bucket >= head:
+            return self.total
+        base = self.first // res
+        if bucket < base:
+            return 0
+        if bucket <= head - SystemConstants.TIMELINE_SLOTS:
+            return None
+        return self.rings[level][(bucket - base) % SystemConstants.TIMELINE_SLOTS]
+
+    # 최근 window 초 이동 DPS (window 는 1초 링 크기 미만)
+    def rolling_dps(self, second: int, window: int) -> float:
+        since = self.cumulative(0, second - window)
+        return (self.total - since) / window if since is not None else 0.0
+
+    # 순간 최고 DPS (열린 버킷 포함)
+    def peak_dps(self) -> float:
+        res = SystemConstants.TIMELINE_PEAK_RES
+        level = SystemConstants.TIMELINE_RESOLUTIONS.index(res)
+        current = self.total - self.cumulative(level, self.head // res - 1)
+        return max(self.peak, current) / res
+
+    # [start, end] 버킷별 DPS
+    def points(self, level: int, start: int, end: int) -> list:
+        res = SystemConstants.TIMELINE_RESOLUTIONS[level]
+        values = [self.cumulative(level, bucket) for bucket in range(start - 1, end + 1)]
+        return [(b - a) // res for a, b in zip(values, values[1:])]
+
+# DPS 타임라인 저장소 (타겟 -> 유저 -> 시리즈, 타겟 0 = 전체)
+class DpsTimeline:
+    def __init__(self):
+        self.by_target: Dict[int, Dict[int, DpsSeries]] = {}
+        self._hit_series: Dict[tuple, tuple] = {}
+
+    # 타격 누적 (유저-타겟, 유저-전체)
+    def add(self, uid: int, tid: int, damage: int, now: float) -> None:
+        group = self._hit_series.get((uid, tid))
+        second = int(now)
+        if group is None:
+            group = self._hit_series[(uid, tid)] = tuple(
+                self.by_target.setdefault(t, {}).setdefault(uid, DpsSeries(second)) for t in {tid, 0})
+        for series in group:
+            series.add(second, damage)
+
+    # 유저 데이터 삭제 (여러 유저를 한 번에)
+    def discard_users(self, uids: set) -> None:
+        for tid, users in self.by_target.items():
+            for uid in uids & users.keys():
+                del users[uid]
+                self._hit_series.pop((uid, tid), None)
+
+    # 타겟 데이터 삭제 (여러 타겟을 한 번에) - 타겟의 유저 시리즈만 훑음
+    def discard_targets(self, tids: set) -> None:
+        for tid in tids:
+            users = self.by_target.pop(tid, None) if tid else None
+            for uid in users or ():
+                self._hit_series.pop((uid, tid), None)
+
+    # 시리즈 수, 링 슬롯 수
+    def size(self) -> tuple:
+        series = [s for users in self.by_target.values() for s in users.values()]
+        return len(series), sum(len(ring) for s in series for ring in s.rings)
+
+    # 타겟별 차트 데이터 - 전투 길이에 맞는 가장 촘촘한 해상도로 모든 유저를 같은 구간에 정렬
+    def view(self, tids, now: float) -> dict:
+        slots = SystemConstants.TIMELINE_SLOTS
+        second = int(now)
+        result = {}
+        for tid in tids:
+            users = self.by_target.get(tid)
+            if not users:
+                continue
+            first = min(series.first for series in users.values())
+            resolutions = SystemConstants.TIMELINE_RESOLUTIONS
+            level = next((i for i, res in enumerate(resolutions) if second - first < (slots - 1) * res), len(resolutions) - 1)
+            res = resolutions[level]
+            end = second // res
+            start = max(first // res, end - slots + 2)
+            result[str(tid)] = {
+                "res": res,
+                "start": start * res,
+                "users": {
+                    str(uid): {
+                        "points": series.points(level, start, end),
+                        "dps5": round(series.rolling_dps(second, 5)),
+                        "dps30": round(series.rolling_dps(second, 30)),
+                        "peak": round(series.peak_dps()),
+                    }
+                    for uid, series in users.items()
+                },
+            }
+        return result
+
 # 버프 지속시간 데이터 클래스
 @dataclass
 class BuffUptimeData:
@@ -913,6 +2511,83 @@ class BuffUptimeData:
     total_stack: int = 0  # 버프 스택 누적 값
     total_count: int = 0  # 버프 활성 횟수 (타격 횟수)
 
+    def merge(self, other: "BuffUptimeData") -> None:
+        self.type = other.type
+        self.max_stack = max(self.max_stack, other.max_stack)
+        self.total_stack += other.total_stack
+        self.total_count += other.total_count
+
+# 유저별 버프 구간 기록
+# 타격은 (타겟, 스킬) id 만 쌓고, 버프 변화는 "몇 번째 타격부터 스택 s" 경계로 기록
+# 스냅샷을 만들 때 경계 사이 타격을 (타겟, 스킬) 별로 세어 그 구간의 활성 버프에 한 번에 반영
+class BuffIntervalLog:
+    def __init__(self):
+        self.hit_keys = array('I')  # 아직 반영하지 않은 일반 타격의 (타겟, 스킬) id
+        self.changes = []           # (타격 위치, 버프 이름, 스택, 타입) - 스택 0 = 종료
+        self.active = {}            # 마지막 반영 시점의 활성 버프 -> (스택, 타입)
+        self._ids: Dict[tuple, int] = {}
+        self._keys: list = []
+
+    # 일반 타격 기록 (활성 버프도 대기 중인 변화도 없으면 기록할 필요 없음), 대기 타격 수 반환
+    def hit(self, tid: int, skill: str) -> int:
+        if self.active or self.changes:
+            key = self._ids.get((tid, skill))
+            if key is None:
+                key = self._ids[(tid, skill)] = len(self._keys)
+                self._keys.append((tid, skill))
+            self.hit_keys.append(key)
+        return len(self.hit_keys)
+
+    # 버프 상태 변화 기록 (이후 타격부터 적용)
+    def change(self, buff_name: str, stack: int, buff_type: int) -> None:
+        self.changes.append((len(self.hit_keys), buff_name, stack, buff_type))
+
+    # 쌓인 타격을 버프 가동률 컨테이너에 반영, 반영한 타격이 있으면 True
+    # targets 가 주어지면 그 안에 없는 (상위 K 에서 밀려난) 타겟의 타격은 "기타" 타겟 합계에 반영
+    def fold(self, container: "BuffUptimeContainer", uid: int, targets=None) -> bool:
+        hit_keys = self.hit_keys
+        active = self.active
+        applied = False
+        pos = 0
+        for at, buff_name, stack, buff_type in self.changes + [(len(hit_keys), None, 0, 0)]:
+            if at > pos and active:
+                self._apply(container, uid, Counter(hit_keys[pos:at]), targets)
+                applied = True
+            pos = at
+            if buff_name is None:
+                break
+            if stack > 0:
+                active[buff_name] = (stack, buff_type)
+            else:
+                active.pop(buff_name, None)
+        del hit_keys[:]
+        self.changes.clear()
+        self._ids.clear()  # 대기 타격이 없으니 (타겟, 스킬) id 도 새로 매김 - 지나간 타겟이 쌓이지 않음
+        self._keys.clear()
+        return applied
+
+    # (타겟, 스킬) 별 타격 수를 활성 버프마다 4개 셀 (전체, 타겟, 스킬, 타겟-스킬) 에 누적
+    def _apply(self, container: "BuffUptimeContainer", uid: int, counts: Counter, targets) -> None:
+        user = container.setdefault(uid, {})
+        for key, count in counts.items():
+            tid, skill = self._keys[key]
+            if targets is not None and tid not in targets:
+                # "기타" 타겟은 스킬별 셀 없이 합계만
+                groups = (user.setdefault(0, {}).setdefault("", {}), user.setdefault(SystemConstants.OTHER_TARGET_ID, {}).setdefault("", {}),
+                          user.setdefault(0, {}).setdefault(skill, {}))
+            else:
+                groups = (user.setdefault(0, {}).setdefault("", {}), user.setdefault(tid, {}).setdefault("", {}),
+                          user.setdefault(0, {}).setdefault(skill, {}), user.setdefault(tid, {}).setdefault(skill, {}))
+            for cells in groups:
+                for buff_name, (stack, buff_type) in self.active.items():
+                    c = cells.get(buff_name)
+                    if c is None:
+                        c = cells[buff_name] = BuffUptimeData()
+                    c.max_stack = max(c.max_stack, stack)
+                    c.total_stack += stack * count
+                    c.total_count += count
+                    c.type = buff_type
+
 # 간단한 데미지 데이터 클래스
 @dataclass
 class SimpleDamageData:
@@ -928,6 +2603,46 @@ class EnemyData:
     most_attacked_tid: int = 0
     last_attacked_tid: int = 0
 
+# 상세 데이터를 유지할 타겟 선정 (가중 Space-Saving 스케치)
+# 타겟별 (추정 누적 데미지, 오차) 를 최대 capacity 개만 유지
+# 새 타겟은 고정되지 않은 최소 항목을 밀어내고 그 값 + 가중치로 들어옴 -> 추정값은 실제 이상, 실제 - 추정 <= 오차
+class TargetSketch:
+    def __init__(self, capacity: int = SystemConstants.TARGET_TOP_K):
+        self.capacity = max(6, capacity)  # 고정 타겟 (전체, 최대 HP, 딜 집중, 마지막, 딜 집중 후보) 보다 커야 함
+        self.counts: Dict[int, int] = {}
+        self.errors: Dict[int, int] = {}
+
+    def __contains__(self, tid: int) -> bool:
+        return tid in self.counts
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    # 타겟 가중치 누적, 밀려난 타겟 반환 (없으면 None) - pinned 는 밀어내지 않음
+    def offer(self, tid: int, weight: int, pinned) -> Optional[int]:
+        counts = self.counts
+        if tid in counts:
+            counts[tid] += weight
+            return None
+        evicted = None
+        floor = 0
+        if len(counts) >= self.capacity:
+            evicted = min((t for t in counts if t not in pinned), key=counts.__getitem__)
+            floor = counts.pop(evicted)
+            del self.errors[evicted]
+        counts[tid] = floor + weight
+        self.errors[tid] = floor
+        return evicted
+
+    # 타겟 제거 (보관 기간 만료 등)
+    def discard(self, tid: int) -> None:
+        self.counts.pop(tid, None)
+        self.errors.pop(tid, None)
+
+    def clear(self) -> None:
+        self.counts.clear()
+        self.errors.clear()
+
 # 유저 정보 데이터 클래스
 @dataclass
 class UserData:
@@ -950,9 +2665,8 @@ class UserTmpData:
     buff: Dict[str, BuffInstData] = field(default_factory=dict[str,BuffInstData])
 
 # 타입 정의 (유저ID -> 타겟ID -> 스킬명 -> 데이터)
-DamageContainer = Dict[int, Dict[int, Dict[str, CombatDetailData]]]
 BuffUptimeContainer = Dict[int, Dict[int, Dict[str, Dict[str, BuffUptimeData]]]]
-BuffInstContainer = Dict[int, Dict[str, BuffInstData]]
+BuffInstContainer = Dict[int, Dict[int, BuffInstData]]
 UserTmpDataContainer = DefaultDict[int, UserTmpData]
 
 # 도트 데미지 플래그와 한국어 이름 매핑
@@ -968,6 +2682,28 @@ dotFlag2Name = [
     ["dump_flag123", "무속성"]
 ]
 
+# 도트/특수 판별과 속성 라벨에 쓰이는 플래그 비트
+HIT_CLASS_MASK = DOT_FLAGS | DOT_FLAG4 | sum(FLAG_MASKS.get(flag, 0) for flag, _ in dotFlag2Name)
+
+# 관련 플래그 조합마다 (도트 여부, 특수 여부, 속성 스킬 라벨) 을 미리 계산
+# 라벨은 intern 되어 모든 컨테이너 키가 같은 문자열을 공유함
+def build_hit_classes() -> dict:
+    bits = [1 << i for i in range(HIT_CLASS_MASK.bit_length()) if HIT_CLASS_MASK >> i & 1]
+    table = {}
+    for combo in range(1 << len(bits)):
+        flags = sum(bit for i, bit in enumerate(bits) if combo >> i & 1)
+        is_dot = (flags & DOT_FLAGS) == DOT_FLAGS or (flags & DOT_FLAG4) != 0
+        is_special = (flags & DOT_FLAGS) != 0
+        keyparts = ["(도트)" if is_dot else "(특수)"]
+        keyparts += [label for flag, label in dotFlag2Name if flags & FLAG_MASKS.get(flag, 0)]
+        if len(keyparts) == 1:
+            keyparts.append("무속성")
+        table[flags] = (is_dot, is_special, sys.intern(" ".join(keyparts)))
+    return table
+
+# 플래그 & HIT_CLASS_MASK -> (is_dot, is_special, label)
+HIT_CLASSES = build_hit_classes()
+
 # 패킷 로거 클래스
 class PacketLogger:
     def __init__(self, enabled=False):
@@ -986,7 +2722,7 @@ class PacketLogger:
         log_entry = {
             "timestamp": time.time(),
             "type": packet_type,
-            "raw_data": raw_data,
+            "raw_data": event_to_dict(raw_data),
             "processed": processed_data
         }
         
@@ -1051,23 +2787,316 @@ class PacketLogger:
                 logger.log(f"패킷 로그 저장 실패: {e}", "ERROR")
 
 # 전투 로그를 분석하고 통계를 생성하는 메인 분석 클래스
+# 데이터클래스/딕셔너리를 JSON 용 딕셔너리로 (키는 문자열)
+def recursive_asdict(obj):
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return {k: recursive_asdict(v) for k, v in asdict(obj).items()}
+    elif isinstance(obj, dict):
+        return {str(k): recursive_asdict(v) for k, v in obj.items()}
+    else:
+        return obj
+
+# 지난 전투 보관본 (끝난 시점의 스냅샷을 압축해 둔 변경 불가 레코드)
+@dataclass(frozen=True)
+class EncounterArchive:
+    id: int
+    start: float
+    end: float
+    reason: str        # "kill" / "idle" / "target"
+    boss_tid: int
+    total_damage: int
+    users: int
+    payload: bytes     # brotli 압축된 스냅샷 JSON
+
+    # 목록용 요약
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "start": self.start,
+            "end": self.end,
+            "duration": max(0.0, self.end - self.start),
+            "reason": self.reason,
+            "boss_tid": self.boss_tid,
+            "total_damage": self.total_damage,
+            "users": self.users,
+            "size": len(self.payload),
+        }
+
+    # 스냅샷 복원
+    def load(self) -> dict:
+        return json.loads(brotli.decompress(self.payload))
+
+# 계산 모드별 순위 뷰 (대시보드 calcSortedItems 와 같은 규칙)
+# 모드 타겟의 유저-타겟 합계 셀에서 데미지가 있고 직업을 아는 유저만, 총 데미지 내림차순 상위 N 명
+# 유저별 행 (총 데미지, 크리티컬/추가타 %, 평균 공격력/데미지 버프) 은 마지막 스냅샷 이후 타격이 있었던 유저만 다시 계산
+class RankingBoard:
+    MODES = ("all", "highest_hp", "most_attacked", "last_attacked")
+    SOURCES = ("damage", "damage2")
+
+    def __init__(self, top_n: int = SystemConstants.RANKING_TOP_N):
+        self.top_n = top_n
+        self.dirty: Dict[str, set] = {source: set() for source in RankingBoard.SOURCES}
+        self.rows: Dict[str, Dict[int, Dict[int, tuple]]] = {source: {} for source in RankingBoard.SOURCES}  # 소스 -> 타겟 -> 유저 -> 행
+
+    # 유저 타격 기록 (다음 뷰 계산 때 행 갱신)
+    def touch(self, source: str, uid: int) -> None:
+        self.dirty[source].add(uid)
+
+    # 셀이 지워졌을 때 (유저/타겟 정리) 모든 행 다시 계산
+    def invalidate(self) -> None:
+        for rows in self.rows.values():
+            rows.clear()
+
+    # 유저-타겟 합계 셀 -> (총 데미지, 크리티컬 %, 추가타 %, 평균 공격력 버프, 평균 데미지 버프)
+    @staticmethod
+    def _row(cell: CombatDetailData) -> tuple:
+        normal, special, buff = cell.normal, cell.special, cell.buff
+        hits = normal.total_count + special.total_count
+        crit = normal.crit_count + special.crit_count
+        addhit = normal.addhit_count + special.addhit_count
+        return (
+            cell.all.total_damage,
+            round(crit / hits * 100, 2) if crit else 0,
+            round(addhit / (hits - addhit) * 100, 2) if addhit and hits > addhit else 0,
+            round(buff.total_atk / buff.total_count, 1) if buff.total_count else 0,
+            round(buff.total_dmg / buff.total_count, 1) if buff.total_count else 0,
+        )
+
+    # 보고 있는 타겟들의 행 갱신 (처음 보는 타겟은 전체 유저, 나머지는 타격이 있었던 유저만)
+    def _refresh(self, source: str, store: DamageStore, tids: set) -> None:
+        cached = self.rows[source]
+        dirty = self.dirty[source]
+        for tid in [tid for tid in cached if tid not in tids]:
+            del cached[tid]
+        for tid in tids:
+            rows = cached.get(tid)
+            uids = dirty
+            if rows is None:
+                rows = cached[tid] = {}
+                uids = store.users()
+            for uid in uids:
+                cell = store.get(uid, tid, "") if uid else None
+                if cell is None or cell.all.total_damage <= 0:
+                    rows.pop(uid, None)
+                else:
+                    rows[uid] = RankingBoard._row(cell)
+        dirty.clear()
+
+    # 계산 모드 -> 타겟
+    @staticmethod
+    def _mode_tids(enemy: EnemyData) -> dict:
+        return dict(zip(RankingBoard.MODES, (0, enemy.max_hp_tid, enemy.most_attacked_tid, enemy.last_attacked_tid)))
+
+    # 직업을 아는 유저 중 데미지 상위 N 명의 (유저, 행)
+    def _ranked(self, rows: dict, user_data: dict) -> list:
+        known = [(uid, row) for uid, row in rows.items() if uid in user_data and user_data[uid].job]
+        return heapq.nlargest(self.top_n, known, key=lambda item: item[1][0])
+
+    # 한 타겟의 순위 뷰 (점유율은 상위 N 명 합계 기준, DPS 는 타겟 타격 시간 기준)
+    def _view(self, rows: dict, tid: int, time_data: dict, user_data: dict) -> dict:
+        ranked = self._ranked(rows, user_data)
+        td = time_data.get(tid)
+        runtime = td["end"] - td["start"] if td else 0
+        total = sum(row[0] for _, row in ranked)
+        return {
+            "tid": tid,
+            "runtime": runtime,
+            "total": total,
+            "rows": [{
+                "id": uid,
+                "job": user_data[uid].job,
+                "total": row[0],
+                "share": 1 if len(ranked) == 1 else round(row[0] / total, 4) if total > 0 else 0,
+                "dps": int(row[0] / runtime) if runtime > 0 else 0,
+                "crit": row[1],
+                "addhit": row[2],
+                "atk_buff": row[3],
+                "dmg_buff": row[4],
+            } for uid, row in ranked],
+        }
+
+    # 소스 (damage / damage2) x 보고 있는 타겟별 순위 뷰 (스냅샷마다 전송 - 셀 전체 대신 상위 N 명 행만)
+    def tops(self, stores: dict, enemy: EnemyData, time_data: dict, user_data: dict) -> dict:
+        tids = set(RankingBoard._mode_tids(enemy).values())
+        result = {}
+        for source, store in stores.items():
+            self._refresh(source, store, tids)
+            rows = self.rows[source]
+            result[source] = {tid: self._view(rows[tid], tid, time_data, user_data) for tid in tids}
+        return result
+
+    # 계산 모드 하나의 순위 뷰 (요청 시에만 계산), 모르는 모드는 None
+    def view(self, source: str, store: DamageStore, enemy: EnemyData, mode: str, time_data: dict, user_data: dict) -> Optional[dict]:
+        tids = RankingBoard._mode_tids(enemy)
+        if mode not in tids:
+            return None
+        self._refresh(source, store, set(tids.values()))
+        return self._view(self.rows[source][tids[mode]], tids[mode], time_data, user_data)
+
+# 분석기 메모리 관리자
+# 유저/타겟별 보관 기간을 지난 데이터를 지우고, 추정 메모리가 예산을 넘으면 가장 오래 안 맞은 (유저, 타겟, 스킬) 셀부터 제거
+# 크기는 구조별 항목 수 x 항목당 추정 바이트 (tracemalloc 로 잰 대략값) 로 계산
+class RetentionManager:
+    ITEM_BYTES = {
+        "damage_cell": 1700,     # CombatDetailData (DamageData 4개 + 히스토그램) + 키
+        "hit_group": 400,        # (유저, 타겟, 스킬) 셀 묶음 캐시 + 마지막 타격 시각
+        "buff_cell": 250,        # BuffUptimeData + 키
+        "buff_inst": 300,        # BuffInstData + 키
+        "timeline_series": 400,  # DpsSeries (링 슬롯은 8바이트씩 따로)
+        "target": 350,           # 타겟별 타격 시간
+        "target_total": 150,     # 타겟별 누적 자가 데미지
+        "user": 300,             # 유저별 임시/직업/자가 데미지/버프 기록 항목
+        "interned_id": 120,      # 셀 키용 유저/타겟/스킬 id (딕셔너리 항목 + 목록 슬롯)
+        "buff_pending": 100,     # 반영 대기 중인 버프 변화 / (타겟, 스킬) id (타격 자체는 4바이트씩 따로)
+        "series_group": 150,     # (유저, 타겟) 시리즈 묶음 캐시
+        "pending_queue": 800,    # HP 변화 / 자가 데미지 매칭 대기열 (deque) + 키
+        "pending_event": 80,     # 매칭 대기 이벤트 (시각, 데미지)
+    }
+
+    def __init__(self, analyzer: "CombatLogAnalyzer", budget_mb: float = SystemConstants.MEMORY_BUDGET_MB):
+        self.analyzer = analyzer
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.last_report: dict = {}
+
+    # 구조별 추정 메모리 (bytes)
+    def measure(self) -> dict:
+        a = self.analyzer
+        item = RetentionManager.ITEM_BYTES
+        stores = (a._damage_by_user_by_target_by_skill, a._self_damage_by_user_by_target_by_skill)
+        timelines = (a._dps_timeline, a._self_dps_timeline)
+        series = slots = 0
+        for timeline in timelines:
+            count, ring_slots = timeline.size()
+            series += count
+            slots += ring_slots
+        logs = a._buff_log_by_user.values()
+        buff_cells = sum(len(buffs) for targets in a._buff_uptime_by_user_by_target_by_skill.values()
+                         for skills in targets.values() for buffs in skills.values())
+        users = (len(a._user_tmp_data) + len(a._user_data) + len(a._self_damage_by_user)
+                 + len(a._buff_log_by_user) + len(a._user_last_seen))
+        return {
+            "damage": sum(len(store.cells) for store in stores) * item["damage_cell"]
+                      + sum(len(store.touched) for store in stores) * item["hit_group"]
+                      + sum(store.interned() for store in stores) * item["interned_id"],
+            "buff": buff_cells * item["buff_cell"]
+                    + sum(len(insts) for insts in a._buff_by_user_by_inst.values()) * item["buff_inst"]
+                    + sum(len(log.changes) + len(log._keys) for log in logs) * item["buff_pending"]
+                    + sum(len(log.hit_keys) for log in logs) * 4,
+            "timeline": series * item["timeline_series"] + slots * 8
+                        + sum(len(timeline._hit_series) for timeline in timelines) * item["series_group"],
+            "targets": len(a._time_data) * item["target"] + len(a._self_damage_by_target) * item["target_total"],
+            "users": users * item["user"],
+            "pending": sum(len(pending) * item["pending_queue"] + sum(map(len, pending.values())) * item["pending_event"]
+                           for pending in (a._pending_hp, a._pending_self)),
+            "archives": sum(len(archive.payload) for archive in a._encounters),
+        }
+
+    # 보관 기간 정리 후 예산 초과분 제거, 제거 내역 반환
+    def run(self, now: float) -> dict:
+        a = self.analyzer
+        report = {"users": 0, "targets": 0, "cells": 0, "archives": 0, "ids": 0}
+        a._expire_pending(now)
+
+        # 보관 기간이 지난 유저 (본인 제외)
+        self_id = a._max_self_damage_by_user.id
+        uids = {uid for uid, seen in a._user_last_seen.items()
+                if uid != self_id and now - seen > SystemConstants.DATA_RETENTION}
+        if uids:
+            a._discard_users(uids)
+            report["users"] = len(uids)
+
+        # 보관 기간이 지난 타겟
+        tids = {tid for tid, td in a._time_data.items()
+                if tid and now - td.get("end", 0) > SystemConstants.TARGET_RETENTION}
+        tids.update(tid for tid, (_, seen) in a._self_damage_by_target.items()
+                    if tid not in a._time_data and now - seen > SystemConstants.TARGET_RETENTION)
+        if tids:
+            report["cells"] += a._discard_targets(tids)
+            report["targets"] = len(tids)
+
+        # 지운 셀이 쓰던 id 회수
+        for store in (a._damage_by_user_by_target_by_skill, a._self_damage_by_user_by_target_by_skill):
+            report["ids"] += store.compact()
+
+        # 메모리 예산 - 오래 안 맞은 셀부터, 그래도 넘으면 오래된 보관 전투부터
+        sizes = self.measure()
+        before = total = sum(sizes.values())
+        while total > self.budget and (a._damage_by_user_by_target_by_skill.touched or a._self_damage_by_user_by_target_by_skill.touched):
+            report["cells"] += a._evict_cold_cells(SystemConstants.EVICT_FRACTION)
+            sizes = self.measure()
+            total = sum(sizes.values())
+        while total > self.budget and a._encounters:
+            a._encounters.popleft()
+            report["archives"] += 1
+            sizes = self.measure()
+            total = sum(sizes.values())
+
+        report.update(bytes_before=before, bytes=total, budget=self.budget, sizes=sizes)
+        self.last_report = report
+        if report["users"] or report["targets"] or report["cells"] or report["archives"]:
+            a._data_changed = True
+            if logger:
+                logger.log(f"메모리 정리: 유저 {report['users']}명, 타겟 {report['targets']}개, 셀 {report['cells']}개, "
+                           f"보관 전투 {report['archives']}개 삭제 ({before / 1048576:.1f}MB -> {total / 1048576:.1f}MB, "
+                           f"예산 {self.budget / 1048576:.0f}MB)", "INFO")
+        return report
+
 class CombatLogAnalyzer:
+    # update() 가 읽는 이벤트 타입별 필드 - 여기에 없는 타입/필드는 디코딩하지 않음
+    CONSUMED_FIELDS = {
+        1: ("user_id", "target_id", "key1", "key2", "flags"),
+        2: ("user_id", "skill_name", "key1"),
+        3: ("target_id", "prev_hp", "current_hp"),
+        4: ("user_id", "target_id", "damage"),
+        11: ("user_id", "target_id", "inst_key", "buff_key", "stack"),
+        12: ("user_id", "target_id", "inst_key", "buff_key", "stack"),
+        13: ("user_id", "inst_key"),
+    }
+
     def __init__(self, packet_logging_enabled=False):
-        self._raw_data: Dict[int, Any] = {}
+        # 공격 패킷 (타입 1) 과 짝을 기다리는 이벤트 (시각, 데미지) - 도착 순서대로 쌓고 최근 것부터 매칭
+        self._pending_hp: Dict[int, deque] = {}      # 타겟 -> HP 변화 (타입 3)
+        self._pending_self: Dict[tuple, deque] = {}  # (유저, 타겟) -> 자가 데미지 (타입 4)
+        self._unmatched: Dict[int, int] = {3: 0, 4: 0}  # 짝을 못 찾고 버려진 이벤트 수 (타입별)
         
         # 패킷 로거 초기화
         self.packet_logger = PacketLogger(enabled=packet_logging_enabled)
 
         # 메인 데이터베이스
-        self._damage_by_user_by_target_by_skill: DamageContainer = {0:{0:{"": CombatDetailData()}}}
-        self._self_damage_by_user_by_target_by_skill: DamageContainer = {0:{0:{"": CombatDetailData()}}}
+        self._damage_by_user_by_target_by_skill: DamageStore = DamageStore()
+        self._self_damage_by_user_by_target_by_skill: DamageStore = DamageStore()
         self._buff_uptime_by_user_by_target_by_skill: BuffUptimeContainer = {0:{0:{"": {"": BuffUptimeData()}}}}
+        self._dps_timeline: DpsTimeline = DpsTimeline()
+        self._self_dps_timeline: DpsTimeline = DpsTimeline()
 
         # 임시 데이터
         self._buff_by_user_by_inst: BuffInstContainer = {}
+        self._buff_log_by_user: Dict[int, BuffIntervalLog] = {}
+        self._pending_buff_logs: set = set()  # 반영 대기 중인 구간 기록이 있는 유저
+
+        # 스냅샷용 파생 값 (갱신 경로에서 유지)
+        self._combat_start: float = 0.0
+        self._combat_end: float = 0.0
+        self._buff_stats_by_user: Dict[int, dict] = {}
+        self._buff_stats_dirty: set = {0}  # 버프 통계를 다시 계산할 유저
+        self._ranking: RankingBoard = RankingBoard()  # 계산 모드별 순위 뷰
+
+        # 전투 구간 분리 및 지난 전투 보관
+        self._encounter_split: bool = settings.get('EncounterSplit', True) if 'settings' in globals() else True
+        self._kill_time: float = 0.0  # 주 타겟 처치 시각 (0 = 아직)
+        self._encounter_id: int = 0
+        self._encounters: deque = deque(maxlen=SystemConstants.ENCOUNTER_ARCHIVE_MAX)
+
+        # 메모리 관리 (유저별 마지막 활동 시각 기준 보관 기간 + 메모리 예산)
+        self._user_last_seen: Dict[int, float] = {}
+        budget_mb = settings.get('MemoryBudgetMB', SystemConstants.MEMORY_BUDGET_MB) if 'settings' in globals() else SystemConstants.MEMORY_BUDGET_MB
+        self.retention = RetentionManager(self, budget_mb)
 
         self._time_data: Dict[int, Any] = {}
         self._enemy_data: EnemyData = EnemyData()
+        self._self_damage_by_target: Dict[int, tuple] = {}  # 타겟 -> (누적 자가 데미지, 마지막 타격 시각), "기타" 로 합치지 않음
+        top_k = settings.get('TargetTopK', SystemConstants.TARGET_TOP_K) if 'settings' in globals() else SystemConstants.TARGET_TOP_K
+        self._target_sketch: TargetSketch = TargetSketch(top_k)  # 상세 데이터를 유지하는 타겟
         self._user_tmp_data: UserTmpDataContainer = defaultdict(UserTmpData)
 
         self._is_user_data_updated: bool = False
@@ -1080,7 +3109,8 @@ class CombatLogAnalyzer:
         self._last_sent_data_hash = None  # 마지막 전송 데이터 해시
         self._data_changed = True  # 데이터 변경 플래그
         self._cached_json_data = None  # JSON 캐시
-        self._last_combat_time = time.time()  # 마지막 전투 시간
+        self._last_combat_time = time.time()  # 마지막 전투 시간 (벽시계 - 화면 갱신 여부 판단용)
+        self._last_event_time = None  # 마지막 이벤트의 패킷 캡처 시각
 
         # 스킬 및 버프 데이터 파일 로드
         import sys
@@ -1109,40 +3139,246 @@ class CombatLogAnalyzer:
             for key, item in self._buff_name_2_detail.items():
                 self._buff_code_2_name[str(item.get("code",""))] = key
 
+    # 현재 전투 집계 초기화 (유저 직업, 활성 버프, 자가 데미지 기준 유저는 다음 전투로 이어짐)
+    def _reset_encounter(self) -> None:
+        self._damage_by_user_by_target_by_skill = DamageStore()
+        self._self_damage_by_user_by_target_by_skill = DamageStore()
+        self._buff_uptime_by_user_by_target_by_skill = {0:{0:{"": {"": BuffUptimeData()}}}}
+        self._dps_timeline = DpsTimeline()
+        self._self_dps_timeline = DpsTimeline()
+        self._time_data = {}
+        self._enemy_data = EnemyData()
+        self._self_damage_by_target = {}
+        self._target_sketch.clear()
+        self._combat_start = 0.0
+        self._combat_end = 0.0
+        self._kill_time = 0.0
+        self._buff_stats_by_user = {}
+        self._buff_stats_dirty = {0}
+        self._ranking = RankingBoard()
+        self._data_changed = True
+        self._cached_json_data = None
+        self._last_sent_data_hash = None
+
+    # 현재 전투를 보관본으로 고정하고 집계 초기화
+    def _archive_encounter(self, reason: str) -> None:
+        damage = self._damage_by_user_by_target_by_skill
+        self._fold_buff_logs()  # 초기화 전에 대기 중인 타격을 이번 전투에 반영
+        if len(damage) > 1:  # 기본 셀만 있으면 보관할 내용 없음
+            self._encounter_id += 1
+            snapshot = self._build_snapshot(self._combat_end, full=True)
+            snapshot["user"] = recursive_asdict(self._user_data)
+            users = damage.users()
+            archive = EncounterArchive(
+                id=self._encounter_id,
+                start=self._combat_start,
+                end=self._combat_end,
+                reason=reason,
+                boss_tid=self._enemy_data.max_hp_tid,
+                total_damage=sum(damage.get(uid, 0, "").all.total_damage for uid in users if uid),
+                users=sum(1 for uid in users if uid),
+                payload=brotli.compress(json.dumps(snapshot).encode(), quality=5),
+            )
+            self._encounters.append(archive)
+            if logger:
+                logger.log(f"전투 #{archive.id} 보관 ({reason}, {archive.end - archive.start:.0f}초, {archive.users}명, {len(archive.payload):,} bytes)", "INFO")
+        self._reset_encounter()
+
+    # 전투 구간 경계 확인 - 새 타격/HP 패킷이 들어올 때만 확인하므로 끝난 전투는 다음 전투가 시작될 때까지 화면에 유지
+    def _check_encounter(self, now: float, hp_entry=None) -> None:
+        if not self._encounter_split or self._combat_end == 0:
+            return
+        reason = None
+        if now - self._combat_end >= SystemConstants.ENCOUNTER_IDLE_GAP:
+            reason = "idle"
+        elif self._kill_time and now - self._kill_time >= SystemConstants.ENCOUNTER_KILL_GRACE:
+            reason = "kill"
+        elif hp_entry is not None and hp_entry.prev_hp > self._enemy_data.max_hp:
+            main = self._time_data.get(self._enemy_data.max_hp_tid)
+            if main is not None and now - main["end"] >= SystemConstants.ENCOUNTER_TARGET_SWITCH:
+                reason = "target"
+        if reason:
+            self._archive_encounter(reason)
+
+    # 지난 전투 목록 (최근 순)
+    def list_encounters(self) -> list:
+        return [archive.summary() for archive in reversed(self._encounters)]
+
+    # 지난 전투 스냅샷 (없으면 None)
+    def get_encounter(self, encounter_id: int):
+        for archive in self._encounters:
+            if archive.id == encounter_id:
+                return archive.load()
+        return None
+
+    # 분석기 시계 - 마지막 이벤트의 캡처 시각에서 그 뒤로 흐른 시간만큼 진행 (이벤트 전에는 현재 시각)
+    # 실시간 캡처에서는 현재 시각과 같고, 재생에서는 파일의 타임스탬프를 따라가므로 보관 기간/타임라인 구간이 처리 시간에 끌려가지 않음
+    def clock(self) -> float:
+        wall = time.time()
+        if self._last_event_time is None:
+            return wall
+        return self._last_event_time + max(0.0, wall - self._last_combat_time)
+
     # 오래된 데이터 정리
     async def cleanup_old_data(self):
-        """30분 이상 된 데이터를 자동으로 정리"""
+        """보관 기간이 지난 유저/타겟 데이터를 정리하고 메모리 예산을 유지"""
         while True:
             try:
-                await asyncio.sleep(SystemConstants.CLEANUP_INTERVAL)  # 5분마다
-                current_time = time.time()
-                cleaned_count = 0
-                
-                # 시간 데이터 정리
-                for uid in list(self._time_data.keys()):
-                    if uid in self._time_data:
-                        end_time = self._time_data[uid].get('end', 0)
-                        if current_time - end_time > SystemConstants.DATA_RETENTION:
-                            # 관련 데이터 모두 삭제
-                            del self._time_data[uid]
-                            if uid in self._damage_by_user_by_target_by_skill:
-                                del self._damage_by_user_by_target_by_skill[uid]
-                            if uid in self._self_damage_by_user_by_target_by_skill:
-                                del self._self_damage_by_user_by_target_by_skill[uid]
-                            if uid in self._buff_uptime_by_user_by_target_by_skill:
-                                del self._buff_uptime_by_user_by_target_by_skill[uid]
-                            if uid in self._user_data:
-                                del self._user_data[uid]
-                            cleaned_count += 1
-                
-                if cleaned_count > 0:
-                    if logger:
-                        logger.log(f"메모리 정리: {cleaned_count}명의 오래된 데이터 삭제", "INFO")
-                    
+                await asyncio.sleep(SystemConstants.CLEANUP_INTERVAL)
+                self.retention.run(self.clock())
             except Exception as e:
                 if logger:
                     logger.log(f"메모리 정리 오류: {e}", "ERROR")
-    
+
+    # 유저 데이터 모두 삭제 (여러 유저를 한 번에 - 셀/시리즈 구조는 한 번씩만 훑음)
+    def _discard_users(self, uids: set) -> None:
+        self._damage_by_user_by_target_by_skill.discard_users(uids)
+        self._self_damage_by_user_by_target_by_skill.discard_users(uids)
+        self._dps_timeline.discard_users(uids)
+        self._self_dps_timeline.discard_users(uids)
+        self._pending_buff_logs -= uids
+        self._buff_stats_dirty -= uids
+        for uid in uids:
+            self._buff_uptime_by_user_by_target_by_skill.pop(uid, None)
+            self._buff_log_by_user.pop(uid, None)
+            self._buff_stats_by_user.pop(uid, None)
+            self._buff_by_user_by_inst.pop(uid, None)
+            self._user_tmp_data.pop(uid, None)
+            self._self_damage_by_user.pop(uid, None)
+            self._user_data.pop(uid, None)
+            self._user_last_seen.pop(uid, None)
+        self._ranking.invalidate()
+        self._is_user_data_updated = True
+
+    # 타겟 데이터 모두 삭제 (여러 타겟을 한 번에), 지운 데미지 셀 수 반환
+    def _discard_targets(self, tids: set) -> int:
+        for tid in tids:
+            self._time_data.pop(tid, None)
+            self._self_damage_by_target.pop(tid, None)
+            self._target_sketch.discard(tid)
+        self._ranking.invalidate()
+        self._dps_timeline.discard_targets(tids)
+        self._self_dps_timeline.discard_targets(tids)
+        for uid_data in self._buff_uptime_by_user_by_target_by_skill.values():
+            for tid in tids & uid_data.keys():
+                del uid_data[tid]
+        return (self._damage_by_user_by_target_by_skill.discard_targets(tids)
+                + self._self_damage_by_user_by_target_by_skill.discard_targets(tids))
+
+    # 타겟을 상세 추적 대상으로 등록/가중치 누적 - 밀려난 타겟은 "기타" 로 합침
+    # 스케치 가중치는 파티 전체 HP 데미지라서, 로컬 유저만 집중해서 치는 타겟은 "딜 집중" 으로 고정되기 전에 밀려날 수 있음
+    # -> 합치지 않고 이어지는 타겟별 자가 데미지 누적값이 가장 큰 비고정 타겟 (다음 "딜 집중" 후보) 도 밀어내지 않음
+    def _track_target(self, tid: int, weight: int) -> None:
+        enemy = self._enemy_data
+        sketch = self._target_sketch
+        pinned = (0, enemy.max_hp_tid, enemy.most_attacked_tid, enemy.last_attacked_tid)
+        if tid not in sketch and len(sketch) >= sketch.capacity:
+            totals = self._self_damage_by_target
+            contender = max((t for t in sketch.counts if t in totals and t not in pinned),
+                            key=lambda t: totals[t][0], default=None)
+            if contender is not None:
+                pinned += (contender,)
+        evicted = sketch.offer(tid, weight, pinned)
+        if evicted is not None:
+            self._fold_target(evicted)
+
+    # 타겟 상세 데이터를 "기타" 타겟에 합침 (유저별 데미지/버프 가동률 합계, 타격 시간) - 스킬별 셀과 타임라인은 버림
+    # 아직 반영 안 된 버프 구간 타격은 반영 시점에 "기타" 로 들어감 (BuffIntervalLog.fold)
+    def _fold_target(self, tid: int) -> None:
+        other = SystemConstants.OTHER_TARGET_ID
+        self._damage_by_user_by_target_by_skill.fold_target(tid, other)
+        self._self_damage_by_user_by_target_by_skill.fold_target(tid, other)
+        for uid_data in self._buff_uptime_by_user_by_target_by_skill.values():
+            skills = uid_data.pop(tid, None)
+            if not skills:
+                continue
+            cells = uid_data.setdefault(other, {}).setdefault("", {})
+            for buff_name, data in skills.get("", {}).items():
+                cells.setdefault(buff_name, BuffUptimeData()).merge(data)
+        td = self._time_data.pop(tid, None)
+        if td is not None:
+            into = self._time_data.setdefault(other, {"start": td["start"], "end": td["end"]})
+            into["start"] = min(into["start"], td["start"])
+            into["end"] = max(into["end"], td["end"])
+        self._dps_timeline.discard_targets({tid})
+        self._self_dps_timeline.discard_targets({tid})
+
+    # 마지막 타격이 오래된 (유저, 타겟, 스킬) 셀부터 fraction 비율만큼 삭제, 지운 셀 수 반환
+    def _evict_cold_cells(self, fraction: float) -> int:
+        evicted = 0
+        buff = self._buff_uptime_by_user_by_target_by_skill
+        for store in (self._damage_by_user_by_target_by_skill, self._self_damage_by_user_by_target_by_skill):
+            count = max(1, int(len(store.touched) * fraction)) if store.touched else 0
+            groups = [group for group, _ in heapq.nsmallest(count, store.touched.items(), key=itemgetter(1))]
+            evicted += store.evict(groups)
+            for uid, tid, skill in groups:
+                if tid and skill:
+                    buff.get(uid, {}).get(tid, {}).pop(skill, None)
+        self._ranking.invalidate()
+        return evicted
+
+    # 보고 있는 타겟별 순위 뷰 (source -> 타겟 -> 뷰)
+    def _rankings(self) -> dict:
+        return self._ranking.tops(
+            {"damage": self._damage_by_user_by_target_by_skill, "damage2": self._self_damage_by_user_by_target_by_skill},
+            self._enemy_data, self._time_data, self._user_data)
+
+    # 계산 모드 하나의 순위 뷰 (합계/점유율/DPS/크리/추가타/버프 행, single = 자가 데미지 기준)
+    def get_ranking(self, mode: str, single: bool = False) -> dict:
+        if single:
+            return self._ranking.view("damage2", self._self_damage_by_user_by_target_by_skill,
+                                      self._enemy_data, mode, self._time_data, self._user_data)
+        return self._ranking.view("damage", self._damage_by_user_by_target_by_skill,
+                                  self._enemy_data, mode, self._time_data, self._user_data)
+
+    # 유저 한 명의 타겟/스킬별 셀 (상세 창, 요청 시에만 계산), single = 자가 데미지 기준
+    def get_detail(self, uid: int, single: bool = False) -> dict:
+        store = self._self_damage_by_user_by_target_by_skill if single else self._damage_by_user_by_target_by_skill
+        return store.to_json_dict(uid)
+
+    # 전체 유저 x 타겟 x 스킬 셀 (저장/보관용, 요청 시에만 계산)
+    def get_damage_cube(self) -> dict:
+        return {
+            "damage": self._damage_by_user_by_target_by_skill.to_json_dict(),
+            "damage2": self._self_damage_by_user_by_target_by_skill.to_json_dict(),
+        }
+
+    # 현재 전투 스냅샷 (전송/보관 공통 형식) - 주기 전송에는 셀 전체 대신 보고 있는 타겟의 순위 행만, full 이면 셀 전체 포함
+    def _build_snapshot(self, now: float, full: bool = False) -> dict:
+        # 전투 시간 계산
+        combat_duration = self._calculate_combat_duration()
+        
+        # 버프 구간 기록을 가동률 컨테이너에 반영 후 계산 (타격 횟수 기반)
+        self._fold_buff_logs()
+        buff_stats = self._calculate_buff_stats()
+
+        # DPS 타임라인 (전체 + 대시보드가 고를 수 있는 타겟만)
+        enemy = self._enemy_data
+        timeline_tids = dict.fromkeys((0, enemy.max_hp_tid, enemy.most_attacked_tid, enemy.last_attacked_tid))
+        
+        snapshot = {
+            "self_id": self._max_self_damage_by_user.id,
+            "enemy": {
+                "max_hp_tid": self._enemy_data.max_hp_tid,
+                "most_attacked_tid": self._enemy_data.most_attacked_tid,
+                "last_attacked_tid": self._enemy_data.last_attacked_tid,
+            },
+            "buff":recursive_asdict(self._buff_uptime_by_user_by_target_by_skill),
+            "hit_time":recursive_asdict(self._time_data),
+            "ranking": self._rankings(),
+            "timeline": {
+                "damage": self._dps_timeline.view(timeline_tids, now),
+                "damage2": self._self_dps_timeline.view(timeline_tids, now),
+            },
+            "stats": {
+                "combat_duration": combat_duration,
+                "buff_uptime": buff_stats
+            }
+        }
+        if full:
+            snapshot.update(self.get_damage_cube())
+        return snapshot
+
     # WebSocket으로 분석된 데이터 전송 (성능 최적화)
     async def send_data(self, websocket):
         # 데이터 변경이 없으면 전송 건너뛰기
@@ -1154,37 +3390,7 @@ class CombatLogAnalyzer:
         
         # 캐싱된 JSON 데이터가 없거나 전투 중일 때만 새로 생성
         if is_combat_active or self._cached_json_data is None:
-            # 필요한 경우에만 recursive_asdict 수행
-            def recursive_asdict(obj):
-                if is_dataclass(obj) and not isinstance(obj, type):
-                    return {k: recursive_asdict(v) for k, v in asdict(obj).items()}
-                elif isinstance(obj, dict):
-                    return {str(k): recursive_asdict(v) for k, v in obj.items()}
-                else:
-                    return obj
-            
-            # 전투 시간 계산
-            combat_duration = self._calculate_combat_duration()
-            
-            # 버프 가동률 계산 (타격 횟수 기반)
-            buff_stats = self._calculate_buff_stats()
-            
-            data = {
-                "self_id": self._max_self_damage_by_user.id,
-                "enemy": {
-                    "max_hp_tid": self._enemy_data.max_hp_tid,
-                    "most_attacked_tid": self._enemy_data.most_attacked_tid,
-                    "last_attacked_tid": self._enemy_data.last_attacked_tid,
-                },
-                "damage":recursive_asdict(self._damage_by_user_by_target_by_skill),
-                "damage2":recursive_asdict(self._self_damage_by_user_by_target_by_skill),
-                "buff":recursive_asdict(self._buff_uptime_by_user_by_target_by_skill),
-                "hit_time":recursive_asdict(self._time_data),
-                "stats": {
-                    "combat_duration": combat_duration,
-                    "buff_uptime": buff_stats
-                }
-            }
+            data = self._build_snapshot(self.clock())
             
             if self._is_user_data_updated:
                 self._is_user_data_updated = False
@@ -1211,10 +3417,10 @@ class CombatLogAnalyzer:
             data_to_send = self._cached_json_data if self._cached_json_data is not None else {
                 "self_id": 0,
                 "enemy": {"max_hp_tid": 0, "max_hp": 0, "last_attacked_tid": 0},
-                "damage": {0: {0: {"": {}}}},
-                "damage2": {0: {0: {"": {}}}},
                 "buff": {0: {0: {"": {"": {}}}}},
                 "hit_time": {},
+                "ranking": {},
+                "timeline": {"damage": {}, "damage2": {}},
                 "stats": {
                     "combat_duration": 0,
                     "buff_uptime": {}
@@ -1229,9 +3435,10 @@ class CombatLogAnalyzer:
             if logger:
                 logger.log(f"데이터 전송 오류: {e}", "ERROR")
 
-    # 새로운 패킷 데이터로 통계 업데이트
-    def update(self, entry):
-        type = entry["type"]
+    # 새로운 패킷 데이터로 통계 업데이트 - now 는 패킷 캡처 시각 (없으면 현재 시각)
+    # 매칭 대기 시간/전투 시간/타임라인이 처리 지연이 아닌 캡처 시각 기준이 되도록 재조립 단계의 타임스탬프를 씀
+    def update(self, entry, now: float = None):
+        type = entry.type
         
         # 패킷 로깅
         self.packet_logger.log_packet(type, entry)
@@ -1239,89 +3446,107 @@ class CombatLogAnalyzer:
         # 데이터 변경 표시 및 전투 시간 업데이트
         self._data_changed = True
         self._last_combat_time = time.time()
+        if now is None:
+            now = self._last_combat_time
+        self._last_event_time = now
 
         if(type == 1):  # 공격 패킷
-            uid = entry.get("user_id", 0)
-            tid = entry.get("target_id", 0)
-            flags = entry.get("flags", {})
-
-            CombatLogAnalyzer._update_hit_time(self._time_data, 0)
-            CombatLogAnalyzer._update_hit_time(self._time_data, tid)
+            uid = entry.user_id
+            tid = entry.target_id
+            flags = entry.flags
+            is_dot, _, element_label = HIT_CLASSES[flags & HIT_CLASS_MASK]
+            self._check_encounter(now)
+            self._user_last_seen[uid] = now
+            self._track_target(tid, 0)
+
+            CombatLogAnalyzer._update_hit_time(self._time_data, 0, now)
+            CombatLogAnalyzer._update_hit_time(self._time_data, tid, now)
+            if self._combat_start == 0:
+                self._combat_start = now
+            self._combat_end = now
 
             skill = CombatLogAnalyzer._get_skill_key(
                 self._skill_code_2_name,
-                entry.get("key1", "0"),
-                entry.get("key2", "0"),
-                CombatLogAnalyzer._is_dot(flags),
-                flags
+                entry.key1,
+                entry.key2,
+                element_label
             )
             utdata = self._user_tmp_data.setdefault(uid, UserTmpData())
             is_updated = False
             
+            # 대기 중인 자가 데미지 (타입 4, 같은 유저/타겟) 와 HP 변화 (타입 3, 같은 타겟) 에서 짝 찾기
+            # HP 변화에는 유저가 없으므로 자가 데미지와 값이 같은 HP 변화를 우선
+            self_damage = self._take_pending(self._pending_self, (uid, tid), now, 4)
+            damage = self._take_pending(self._pending_hp, tid, now, 3, self_damage)
+
             # HP 변화 패킷과 매칭 (타입 3)
-            if self._raw_data.get(3) is not None:
-                tid3 = self._raw_data[3].get("target_id",0)
-                # 타겟 ID가 일치하고 시간차가 적을 때만 매칭
-                if tid3 == tid:
-                    damage = self._raw_data[3].get("prev_hp", 0) - self._raw_data[3].get("current_hp", 0)
-                    if damage > 0:  # 데미지가 양수일 때만
-                        CombatLogAnalyzer._update_combat(self._damage_by_user_by_target_by_skill, 
-                                                         uid, tid, damage, flags, skill, utdata)
-                        is_updated = True
-                        # 데미지 계산 로깅
-                        self.packet_logger.log_damage_calculation(uid, tid, damage, "type1+3", skill)
-                        self._raw_data[3] = None  # 사용한 패킷은 초기화
+            if damage:
+                self._target_sketch.offer(tid, damage, ())  # 이미 등록된 타겟 - 가중치만 누적
+                CombatLogAnalyzer._update_combat(self._damage_by_user_by_target_by_skill, 
+                                                 uid, tid, damage, flags, skill, utdata, now)
+                self._dps_timeline.add(uid, tid, damage, now)
+                self._buff_stats_dirty.add(uid)
+                self._ranking.touch("damage", uid)
+                is_updated = True
+                # 데미지 계산 로깅
+                self.packet_logger.log_damage_calculation(uid, tid, damage, "type1+3", skill)
 
             # 자가 데미지 패킷과 매칭 (타입 4)
-            if self._raw_data.get(4) is not None:
-                tid4 = self._raw_data[4].get("target_id",0)
-                uid4 = self._raw_data[4].get("user_id", 0)
-                # 유저 ID와 타겟 ID가 일치할 때만
-                if tid4 == tid and uid4 == uid:
-                    damage = self._raw_data[4].get("damage", 0)
-                    if damage > 0:  # 데미지가 양수일 때만
-                        CombatLogAnalyzer._update_combat(self._self_damage_by_user_by_target_by_skill, 
-                                                         uid, tid, damage, flags, skill, utdata)
-                        # 데미지 계산 로깅
-                        self.packet_logger.log_damage_calculation(uid, tid, damage, "type1+4", skill)
-                        CombatLogAnalyzer._update_enemy_data(self._enemy_data, tid, 0, self._self_damage_by_user_by_target_by_skill[0][tid][""].all.total_damage)
-                        is_updated = True
-                        self._raw_data[4] = None  # 사용한 패킷은 초기화
-
-            # 타격 시 버프 가동률 업데이트 (참고 미터기 방식)
-            if CombatLogAnalyzer._is_dot(flags) == False and is_updated:
-                # 현재 활성화된 버프를 카운트
-                CombatLogAnalyzer._update_buff_uptime(
-                    self._buff_uptime_by_user_by_target_by_skill, 
-                    uid, tid, skill, 
-                    self._user_tmp_data[uid]
-                )
+            if self_damage:
+                damage = self_damage
+                CombatLogAnalyzer._update_combat(self._self_damage_by_user_by_target_by_skill, 
+                                                 uid, tid, damage, flags, skill, utdata, now)
+                self._self_dps_timeline.add(uid, tid, damage, now)
+                self._ranking.touch("damage2", uid)
+                # 데미지 계산 로깅
+                self.packet_logger.log_damage_calculation(uid, tid, damage, "type1+4", skill)
+                # 가장 많이 공격한 타겟은 "기타" 로 합쳐져도 이어지는 타겟별 누적값으로 판단
+                total = self._self_damage_by_target.get(tid, (0, 0.0))[0] + damage
+                self._self_damage_by_target[tid] = (total, now)
+                CombatLogAnalyzer._update_enemy_data(self._enemy_data, tid, 0, total)
+                is_updated = True
+
+            # 타격 시 버프 가동률 업데이트 (참고 미터기 방식) - 타격만 기록하고 버프별 집계는 스냅샷 때
+            if is_dot == False and is_updated:
+                buff_log = self._buff_log_by_user.get(uid)
+                if buff_log is not None:
+                    self._pending_buff_logs.add(uid)
+                    if buff_log.hit(tid, skill) >= SystemConstants.BUFF_LOG_FOLD:
+                        self._fold_buff_log(uid)
 
         elif type == 2:  # 스킬 사용 패킷
-            uid = entry.get("user_id", 0)
-            key1:str = str(entry.get("key1", "0"))
-            key2:str = str(entry.get("key2", "0"))
-            skill_name:str = entry.get("skill_name", "")
+            uid = entry.user_id
+            key1:str = str(entry.key1)
+            skill_name:str = entry.skill_name
             if key1 not in self._skill_code_2_name and skill_name not in self._skill_unhandled_rawnames:
                 self._skill_code_2_name[key1] = self._skill_rawname_2_name.get(skill_name, skill_name)
             
             self._is_user_data_updated |= CombatLogAnalyzer._update_user_job(self._user_data.setdefault(uid, UserData()), skill_name)
+            self._user_last_seen[uid] = now
 
         elif type == 3:  # HP 변화 패킷
-            self._raw_data[3] = entry
-            hp = entry.get("prev_hp", 0)
-            tid = entry.get("target_id", 0)
+            self._check_encounter(now, entry)
+            hp = entry.prev_hp
+            tid = entry.target_id
+            if hp > entry.current_hp:  # 데미지가 양수일 때만 매칭 대기
+                self._put_pending(self._pending_hp, tid, now, hp - entry.current_hp, 3)
             CombatLogAnalyzer._update_enemy_data(self._enemy_data, tid, hp, 0)
+            # 주 타겟 (최대 HP) 처치
+            if entry.current_hp == 0 and tid == self._enemy_data.max_hp_tid and self._combat_end:
+                self._kill_time = now
             
         elif type == 4:  # 자가 데미지 패킷
-            uid = entry["user_id"]
-            damage = entry["damage"]            
+            uid = entry.user_id
+            damage = entry.damage
             if damage > SystemConstants.MAX_DAMAGE_THRESHOLD: 
                 if logger:
                     logger.log(f"비정상 데미지 감지: {damage}", "INFO")
                 return
     
-            self._raw_data[4] = entry
+            tid = entry.target_id
+            self._user_last_seen[uid] = now
+            if damage > 0:  # 데미지가 양수일 때만 매칭 대기
+                self._put_pending(self._pending_self, (uid, tid), now, damage, 4)
 
             self_damage = self._self_damage_by_user.setdefault(uid, SimpleDamageData())
             self_damage.total_damage += damage
@@ -1330,19 +3555,19 @@ class CombatLogAnalyzer:
                 self._max_self_damage_by_user.total_damage = self_damage.total_damage
             
             # Type 4 독립 처리 로깅
-            tid = entry.get("target_id", 0)
             if tid:
                 self.packet_logger.log_damage_calculation(uid, tid, damage, "type4", "")
 
         elif type == 11 or type == 12:  # 버프 시작/업데이트 패킷
-            buff_key = str(entry.get("buff_key",0))
+            buff_key = str(entry.buff_key)
             if buff_key not in self._buff_unhandled_code:
-                inst_key = entry.get("inst_key", "")
-                stack = entry.get("stack", 0)
-                uid = entry.get("user_id", 0)
-                tid = entry.get("target_id", 0)
+                inst_key = entry.inst_key
+                stack = entry.stack
+                uid = entry.user_id
+                tid = entry.target_id
                 buff_name = self._buff_code_2_name.get(buff_key, buff_key)
                 if DEBUG == True or buff_name != buff_key:
+                    self._user_last_seen[uid] = now
                     # 버프 상태 업데이트
                     CombatLogAnalyzer._update_user_buff(
                         self._buff_by_user_by_inst, 
@@ -1354,13 +3579,15 @@ class CombatLogAnalyzer:
                         stack, 
                         self._buff_name_2_detail.get(buff_name)
                     )
+                    self._log_buff_change(uid, buff_name)
         elif type == 13:  # 버프 종료 패킷
-            inst_key = entry.get("inst_key", "")
-            uid = entry.get("user_id", 0)
+            inst_key = entry.inst_key
+            uid = entry.user_id
             if uid in self._buff_by_user_by_inst and inst_key in self._buff_by_user_by_inst[uid]:
                 data = self._buff_by_user_by_inst[uid][inst_key]
                 buff_name = data.buff_name
                 tid = data.tid
+                self._user_last_seen[uid] = now
                 
                 # 버프 상태 업데이트
                 CombatLogAnalyzer._update_user_buff(
@@ -1373,72 +3600,89 @@ class CombatLogAnalyzer:
                     0, 
                     self._buff_name_2_detail.get(buff_name)
                 )
+                self._log_buff_change(uid, buff_name)
         pass
     
-    # 전투 시간 계산
+    # 매칭 대기열에 이벤트 추가 (꽉 차면 가장 오래된 이벤트를 버림)
+    def _put_pending(self, pending: dict, key, now: float, damage: int, type: int) -> None:
+        queue = pending.get(key)
+        if queue is None:
+            queue = pending[key] = deque(maxlen=SystemConstants.PENDING_MATCH_DEPTH)
+        elif len(queue) == queue.maxlen:
+            self._unmatched[type] += 1
+        queue.append((now, damage))
+
+    # 매칭 대기열에서 이벤트 하나의 데미지 꺼내기 (없으면 0), 대기 시간이 지난 이벤트는 먼저 버림
+    # hint (같은 타격의 자가 데미지) 와 데미지가 같은 이벤트가 있으면 그것, 없으면 가장 최근 이벤트
+    # 공격 패킷은 바로 앞의 자기 이벤트와 짝 - 짝 없이 남은 이벤트가 뒤 타격들을 밀어내지 않음
+    def _take_pending(self, pending: dict, key, now: float, type: int, hint: int = 0) -> int:
+        queue = pending.get(key)
+        if queue is None:
+            return 0
+        while queue and now - queue[0][0] > SystemConstants.PENDING_MATCH_WINDOW:
+            queue.popleft()
+            self._unmatched[type] += 1
+        damage = 0
+        if queue:
+            index = -1
+            if hint and len(queue) > 1:
+                for i in range(len(queue) - 1, -1, -1):
+                    if queue[i][1] == hint:
+                        index = i
+                        break
+            damage = queue[index][1]
+            del queue[index]
+        if not queue:
+            del pending[key]
+        return damage
+
+    # 대기 시간이 지난 매칭 대기 이벤트 정리 (공격 패킷이 오지 않은 타겟/유저)
+    def _expire_pending(self, now: float) -> None:
+        for type, pending in ((3, self._pending_hp), (4, self._pending_self)):
+            for key in [key for key, queue in pending.items() if now - queue[-1][0] > SystemConstants.PENDING_MATCH_WINDOW]:
+                self._unmatched[type] += len(pending.pop(key))
+
+    # 전투 시간 계산 (첫 타격 ~ 마지막 타격, 갱신 경로에서 유지)
     def _calculate_combat_duration(self) -> float:
         """전투 지속 시간 계산"""
-        if not self._time_data:
-            return 0.0
-        
-        # 유효한 데이터만 필터링
-        valid_data = []
-        for tid, tid_data in self._time_data.items():
-            if isinstance(tid_data, dict) and tid_data.get("start", 0) > 0 and tid_data.get("end", 0) > 0:
-                valid_data.append(tid_data)
-        
-        if not valid_data:
-            return 0.0
-        
-        # 모든 타겟의 최초 시작 시간과 최종 종료 시간 찾기
-        min_start = min(d["start"] for d in valid_data)
-        max_end = max(d["end"] for d in valid_data)
-        
-        # 음수나 비정상적인 값 방지
-        duration = max_end - min_start
-        return max(0.0, duration)
+        return max(0.0, self._combat_end - self._combat_start)
     
-    # 버프 가동률 통계 계산 (타격 횟수 기반)
+    # 버프 가동률 통계 계산 (타격 횟수 기반) - 마지막 스냅샷 이후 타격/버프가 바뀐 유저만 다시 계산
     def _calculate_buff_stats(self) -> dict:
         """버프 가동률 계산 - 참고 미터기 방식"""
-        buff_stats = {}
-        
-        # 모든 유저의 버프 데이터 처리
-        for uid, uid_data in self._buff_uptime_by_user_by_target_by_skill.items():
-            if uid not in buff_stats:
-                buff_stats[uid] = {}
+        for uid in self._buff_stats_dirty:
+            uid_data = self._buff_uptime_by_user_by_target_by_skill.get(uid)
+            if uid_data is None:
+                continue
             
-            # 일반 타격수 계산 (normal + special, 도트 제외)
-            normal_hits = 0
-            if uid in self._damage_by_user_by_target_by_skill:
-                for tid_data in self._damage_by_user_by_target_by_skill[uid].values():
-                    for skill_data in tid_data.values():
-                        normal_hits += skill_data.normal.total_count + skill_data.special.total_count
+            # 일반 타격수 (normal + special, 도트 제외) - 유저 전체 셀
+            total = self._damage_by_user_by_target_by_skill.get(uid, 0, "")
+            normal_hits = total.normal.total_count + total.special.total_count if total else 0
             
             # uid의 전체 버프 데이터 (tid=0, skill="")
-            if 0 in uid_data and "" in uid_data[0]:
-                for buff_name, buff_data in uid_data[0][""].items():
-                    if isinstance(buff_data, BuffUptimeData):
-                        # 타격 횟수 기반 가동률 계산
-                        if normal_hits > 0:
-                            uptime = (buff_data.total_count / normal_hits) * 100
-                        else:
-                            uptime = 0
-                        
-                        # 평균 스택 계산
-                        if buff_data.total_count > 0:
-                            avg_stack = buff_data.total_stack / buff_data.total_count
-                        else:
-                            avg_stack = 0
-                        
-                        buff_stats[uid][buff_name] = {
-                            "uptime": round(min(uptime, 100), 1),  # 100% 초과 방지
-                            "avg_stack": round(avg_stack, 1),
-                            "max_stack": buff_data.max_stack,
-                            "type": buff_data.type
-                        }
+            user_stats = self._buff_stats_by_user[uid] = {}
+            for buff_name, buff_data in uid_data.get(0, {}).get("", {}).items():
+                # 타격 횟수 기반 가동률 계산
+                if normal_hits > 0:
+                    uptime = (buff_data.total_count / normal_hits) * 100
+                else:
+                    uptime = 0
+                
+                # 평균 스택 계산
+                if buff_data.total_count > 0:
+                    avg_stack = buff_data.total_stack / buff_data.total_count
+                else:
+                    avg_stack = 0
+                
+                user_stats[buff_name] = {
+                    "uptime": round(min(uptime, 100), 1),  # 100% 초과 방지
+                    "avg_stack": round(avg_stack, 1),
+                    "max_stack": buff_data.max_stack,
+                    "type": buff_data.type
+                }
+        self._buff_stats_dirty.clear()
         
-        return buff_stats
+        return dict(self._buff_stats_by_user)
     
     # 적 데이터 업데이트
     @staticmethod
@@ -1453,106 +3697,70 @@ class CombatLogAnalyzer:
 
     # 타격 시간 기록
     @staticmethod
-    def _update_hit_time(cc, tid):
+    def _update_hit_time(cc, tid, t):
         td = cc.setdefault(tid, {"start":0, "end":0})
-        t = time.time()
         if td["start"] == 0: 
             td["start"] = t
         td["end"] = t
 
     # 전투 데이터 업데이트
     @staticmethod
-    def _update_combat(cc:DamageContainer, uid:int, tid:int, damage:int, flags, skill:str, utdata:UserTmpData):
+    def _update_combat(cc:DamageStore, uid:int, tid:int, damage:int, flags:int, skill:str, utdata:UserTmpData, now:float = 0.0):
         if damage <= 0: return
 
-        is_dot       = CombatLogAnalyzer._is_dot(flags)
-        is_special   = CombatLogAnalyzer._is_special(flags)
+        is_dot, is_special, _ = HIT_CLASSES[flags & HIT_CLASS_MASK]
+        crit   = (flags & CRIT_FLAG) != 0
+        addhit = (flags & ADD_HIT_FLAG) != 0
+        power  = (flags & POWER_FLAG) != 0
+        fast   = (flags & FAST_FLAG) != 0
+        bucket = damage_bucket(damage)
 
-        gc = CombatLogAnalyzer._get_damage_container
+        target_total, user_total, user_target, user_skill, user_target_skill = cc.hit_cells(uid, tid, skill, now)
 
-        for c in [gc(cc,0,tid,"")]:
-            CombatLogAnalyzer._update_damage_data(c.all, damage, flags)   
-        
-        for c in [gc(cc,uid,0,""), gc(cc,uid,tid,"")]:
-            CombatLogAnalyzer._update_damage_data(c.all, damage, flags)
+        target_total.all.add(damage, crit, addhit, power, fast, bucket)
+
+        for c in (user_total, user_target):
+            c.all.add(damage, crit, addhit, power, fast, bucket)
             if is_dot == False:
-                CombatLogAnalyzer._update_buff_impact_data(c.buff, utdata)
+                c.buff.add(utdata.atk_buff, utdata.dmg_buff)
             if is_dot:
-                CombatLogAnalyzer._update_damage_data(c.dot, damage, flags)
+                c.dot.add(damage, crit, addhit, power, fast, bucket)
             elif is_special:
-                CombatLogAnalyzer._update_damage_data(c.special, damage, flags)
+                c.special.add(damage, crit, addhit, power, fast, bucket)
             else:
-                CombatLogAnalyzer._update_damage_data(c.normal, damage, flags)
+                c.normal.add(damage, crit, addhit, power, fast, bucket)
 
-        for c in [gc(cc,uid,0,skill), gc(cc,uid,tid,skill)]:
-            CombatLogAnalyzer._update_damage_data(c.all, damage, flags)
-            CombatLogAnalyzer._update_buff_impact_data(c.buff, utdata)
+        for c in (user_skill, user_target_skill):
+            c.all.add(damage, crit, addhit, power, fast, bucket)
+            c.buff.add(utdata.atk_buff, utdata.dmg_buff)
             if is_dot:
-                CombatLogAnalyzer._update_damage_data(c.dot, damage, flags)
+                c.dot.add(damage, crit, addhit, power, fast, bucket)
             elif is_special:
-                CombatLogAnalyzer._update_damage_data(c.special, damage, flags)
+                c.special.add(damage, crit, addhit, power, fast, bucket)
             else:
-                CombatLogAnalyzer._update_damage_data(c.normal, damage, flags)
-        
-    # 데미지 컨테이너 가져오기 (없으면 생성)
-    @staticmethod
-    def _get_damage_container(container:DamageContainer, uid: int, tid: int, skill: str) -> CombatDetailData:
-        return container.setdefault(uid, {}).setdefault(tid, {}).setdefault(skill, CombatDetailData())
-    
-    # 데미지 데이터 업데이트
-    @staticmethod
-    def _update_damage_data(c:DamageData, damage, flags):
-        is_crit      = flags.get("crit_flag") == 1
-        is_addhit    = flags.get("add_hit_flag") == 1
-        is_power     = flags.get("power_flag") == 1
-        is_fast      = flags.get("fast_flag") == 1
-
-        c.total_damage  += damage
-        c.total_count   += 1
-        c.crit_count    += is_crit
-        c.addhit_count  += is_addhit
-        c.power_count   += is_power
-        c.fast_count    += is_fast
-        c.max_damage = max(c.max_damage, damage)
-        if c.min_damage <= 0:
-            c.min_damage = damage
-        else:
-            c.min_damage = min(c.min_damage, damage)
+                c.normal.add(damage, crit, addhit, power, fast, bucket)
+
+    # 유저의 버프 상태 변화를 구간 기록에 추가 (_update_user_buff 이후 유효 상태)
+    def _log_buff_change(self, uid: int, buff_name: str) -> None:
+        inst = self._user_tmp_data[uid].buff.get(buff_name)
+        buff_log = self._buff_log_by_user.setdefault(uid, BuffIntervalLog())
+        buff_log.change(buff_name, inst.buff_stack if inst else 0, inst.buff_type if inst else 0)
+        self._pending_buff_logs.add(uid)
+
+    # 유저의 버프 구간 기록을 가동률 컨테이너에 반영
+    def _fold_buff_log(self, uid: int) -> None:
+        if self._buff_log_by_user[uid].fold(self._buff_uptime_by_user_by_target_by_skill, uid, self._target_sketch):
+            self._buff_stats_dirty.add(uid)
+
+    # 대기 중인 버프 구간 기록을 모두 반영
+    def _fold_buff_logs(self) -> None:
+        for uid in self._pending_buff_logs:
+            self._fold_buff_log(uid)
+        self._pending_buff_logs.clear()
 
-    # 버프 영향 데이터 업데이트
-    @staticmethod
-    def _update_buff_impact_data(c:BuffImpactData, utd:UserTmpData):
-        c.total_count    += 1
-        # 버프 값이 이미 퍼센트이므로 그대로 누적 (나중에 평균 계산)
-        c.total_atk      += utd.atk_buff
-        c.total_dmg      += utd.dmg_buff
-
-    # 버프 지속시간 업데이트 (타격 시 호출)
-    @staticmethod
-    def _update_buff_uptime(cc:BuffUptimeContainer, uid, tid, skill, tmpdata: UserTmpData):
-        gc = CombatLogAnalyzer._get_buff_uptime_container
-        for buff_name, buff_inst in tmpdata.buff.items():
-            for c in [gc(cc,uid,0,"",buff_name), gc(cc,uid,tid,"",buff_name), gc(cc,uid,0,skill,buff_name), gc(cc,uid,tid,skill,buff_name)]:
-                CombatLogAnalyzer._update_buff_uptime_data(c, buff_inst)
-
-    # 버프 지속시간 컨테이너 가져오기
-    @staticmethod
-    def _get_buff_uptime_container(container:BuffUptimeContainer, uid: int, tid: int, skill: str, buff: str) -> BuffUptimeData:
-        return container.setdefault(uid, {}).setdefault(tid, {}).setdefault(skill, {}).setdefault(buff, BuffUptimeData())
-    
-    # 버프 지속시간 데이터 업데이트
-    @staticmethod
-    def _update_buff_uptime_data(c:BuffUptimeData, inst:BuffInstData):
-        c.max_stack = max(c.max_stack, inst.buff_stack)
-        # 실제 스택 값을 누적 (가중 평균 계산용)
-        if inst.buff_stack > 0:
-            c.total_stack += inst.buff_stack  # 실제 스택 값 누적
-            c.total_count += 1  # 활성 횟수 카운트
-        c.type = inst.buff_type
-        
     # 유저 버프 상태 업데이트
     @staticmethod
-    def _update_user_buff(cc:BuffInstContainer, utdc:UserTmpDataContainer, uid:int, tid:int, inst_key:str, buff_name:str, stack:int, buff_detail:Any):
+    def _update_user_buff(cc:BuffInstContainer, utdc:UserTmpDataContainer, uid:int, tid:int, inst_key:int, buff_name:str, stack:int, buff_detail:Any):
         data       = cc.setdefault(uid, {}).setdefault(inst_key, BuffInstData())
         prev_stack = data.buff_stack
         user_data  = utdc[uid]
@@ -1614,33 +3822,13 @@ class CombatLogAnalyzer:
 
         return user.job != ""
     
-    # 스킬 키 생성 (코드를 이름으로 변환)
+    # 스킬 키 생성 (코드를 이름으로 변환, 스킬 코드가 없으면 HIT_CLASSES 의 속성 라벨)
     @staticmethod
-    def _get_skill_key(key2name, key1:str, key2:str, is_dot:bool, flags:Dict):
-        skey = None
+    def _get_skill_key(key2name, key1:int, key2:int, element_label:str):
+        if key1 == 0:
+            return element_label
         key1 = str(key1)
-        key2 = str(key2)
-        if key1 != "0":
-            skey = key2name.get(f"{key1}_{key2}") or key2name.get(key1) or  key1
-        else:
-            keyparts = ["(도트)" if is_dot else "(특수)"]
-            for flag, label in dotFlag2Name:
-                if flags.get(flag) == 1:
-                    keyparts.append(label)
-            if len(keyparts) == 1:
-                keyparts.append("무속성")
-            skey = " ".join(keyparts)
-        return skey
-    
-    # 도트 데미지 여부 확인
-    @staticmethod
-    def _is_dot(flags):
-        return (flags.get("dot_flag") and flags.get("dot_flag2") and flags.get("dot_flag3")) or flags.get("dot_flag4")
-    
-    # 특수 공격 여부 확인
-    @staticmethod
-    def _is_special(flags):
-        return (flags.get("dot_flag") or flags.get("dot_flag2") or flags.get("dot_flag3"))
+        return key2name.get(f"{key1}_{key2}") or key2name.get(key1) or key1
 
 
 
@@ -1884,6 +4072,72 @@ async def main() -> None:
         await ws_server.wait_closed()
         await runner.cleanup()
 
+# 캡처 파일 재생 모드 - 실시간 캡처와 같은 재조립/파싱/분석 경로로 처리 후 처리량 출력
+async def replay_main(path: str, realtime: bool = False) -> None:
+    global logger
+    if logger is None:
+        logger = SimpleLogger(debug=DEBUG)
+
+    streamer = PacketStreamer(backend_name="replay", path=path, realtime=realtime)
+    backend = streamer.sniffer
+    logger.log(f"재생 시작: {path} ({'실시간' if realtime else '최대 속도'})", "IMPORTANT")
+
+    started = time.perf_counter()
+    streamer.is_running = True
+    backend.start()
+    process_task = asyncio.create_task(streamer._process())
+    try:
+        # 파일을 끝까지 읽은 뒤 남은 배치까지 모두 처리될 때까지 대기
+        await asyncio.get_running_loop().run_in_executor(None, backend.join)
+        streamer._flush_batch()
+        while (not streamer.queue.empty() or streamer._ordered) and not process_task.done():
+            await asyncio.sleep(0 if streamer.queue.qsize() else 0.001)
+    finally:
+        backend.stop()
+        process_task.cancel()
+        streamer.decoder.shutdown()
+        streamer.is_running = False
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    analyzer = streamer.analyzer
+    print("=" * 70)
+    logger.log(f"재생 완료: {elapsed:.2f}초, 프레임 {backend.frame_count:,}개", "SUCCESS")
+    print(f"  패킷:        {backend.packet_count:,}개  ({backend.packet_count / elapsed:,.0f} packets/s)")
+    print(f"  파싱 이벤트: {streamer.parsed_count:,}개  ({streamer.parsed_count / elapsed:,.0f} events/s)")
+    print(f"  구간 손실:   {sum(flow.gap_count for flow in streamer.flows)}회, "
+          f"{sum(flow.gap_bytes for flow in streamer.flows):,} bytes, "
+          f"프레임 {sum(flow.frames_lost for flow in streamer.flows)}개")
+    decoder = streamer.decoder
+    print(f"  압축 레코드: 해제 {decoder.frames_decoded:,}개, 버림 {decoder.frames_dropped:,}개, "
+          f"해제 시간 {decoder.decode_time * 1000:,.0f}ms")
+    # 분석기 시계는 패킷 캡처 시각을 따르므로 전투 시간/DPS 는 처리 시간이 아닌 캡처 구간 기준
+    span = backend.last_timestamp - backend.first_timestamp if backend.packet_count else 0.0
+    combat_duration = analyzer._calculate_combat_duration()
+    print(f"  캡처 구간:   {span:.1f}초")
+    print(f"  전투 시간:   {combat_duration:.1f}초, 보관된 전투 {len(analyzer._encounters)}개")
+    print("=" * 70)
+
+    # 최종 집계 (유저별 전체 대상 데미지)
+    rows = []
+    store = analyzer._damage_by_user_by_target_by_skill
+    for uid in store.users():
+        detail = store.get(uid, 0, "")
+        if uid == 0 or detail is None:
+            continue
+        job = analyzer._user_data[uid].job if uid in analyzer._user_data else ""
+        rows.append((detail.all.total_damage, uid, job, detail))
+    rows.sort(reverse=True)
+    total = sum(row[0] for row in rows)
+    print(f"  {'유저ID':>12} {'직업':<6} {'총 데미지':>16} {'DPS':>12} {'점유율':>7} {'타격':>8} {'치명타':>7}")
+    for damage, uid, job, detail in rows:
+        share = damage / total * 100 if total else 0
+        dps = damage / combat_duration if combat_duration else 0
+        hits = detail.normal.total_count + detail.special.total_count
+        crit = (detail.normal.crit_count + detail.special.crit_count) / hits * 100 if hits else 0
+        print(f"  {uid:>12} {job:<6} {damage:>16,} {dps:>12,.0f} {share:>6.1f}% {detail.all.total_count:>8,} {crit:>6.1f}%")
+    print(f"  {'합계':>12} {'':<6} {total:>16,} {total / combat_duration if combat_duration else 0:>12,.0f}")
+    print("=" * 70)
+
 # 자동 재시작 기능
 async def stable_main() -> None:
     """오류 발생시 자동으로 재시작하는 안정적인 메인 함수"""
@@ -1926,6 +4180,8 @@ if __name__ == '__main__':
     import sys
     import os
     import traceback
+    import multiprocessing
+    multiprocessing.freeze_support()  # exe 에서 캡처 프로세스 실행 지원
     
     # 임시 로거 객체 생성 (설정 파일 로드 전까지 사용)
     temp_logger = SimpleLogger(debug=False)
@@ -1972,6 +4228,16 @@ if __name__ == '__main__':
     # 로거 초기화
     logger = SimpleLogger(DEBUG)
     
+    # 명령행 인자 (--replay: 캡처 파일 재생 모드)
+    import argparse
+    arg_parser = argparse.ArgumentParser(description=__description__)
+    arg_parser.add_argument("--replay", metavar="FILE", help="pcap/pcapng 파일을 재생하여 파서/분석기 처리량 측정")
+    arg_parser.add_argument("--realtime", action="store_true", help="캡처 타임스탬프 간격대로 재생 (기본: 최대 속도)")
+    args = arg_parser.parse_args()
+    if args.replay:
+        asyncio.run(replay_main(args.replay, args.realtime))
+        sys.exit(0)
+    
     # 안정적인 메인 함수 실행 (자동 재시작 포함)
     try:
         asyncio.run(stable_main())
@@ -0,0 +1,432 @@
+# src/main.py 재조립/집계 자료구조 테스트
+import sys
+from collections import deque
+from pathlib import Path
+
+import pytest
+
+# main.py 는 실행 의존성을 모듈 최상단에서 가져오므로 없으면 건너뜀
+for _name in ("brotli", "websockets", "scapy", "aiohttp", "aiohttp_cors"):
+    pytest.importorskip(_name)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import main  # noqa: E402
+from main import (  # noqa: E402
+    FRAME_END, FRAME_START, RECORD_HEADER, BuffIntervalLog, BuffUptimeData, CombatLogAnalyzer,
+    DamageStore, DpsSeries, FrameScanner, SegmentStore, StreamBuffer, SystemConstants, TargetSketch,
+    TcpFlow, UserTmpData,
+)
+
+OTHER = SystemConstants.OTHER_TARGET_ID
+
+
+# 레코드 하나 (헤더 + 내용)
+def record(data_type: int, content: bytes, encode_type: int = 0) -> bytes:
+    return RECORD_HEADER.pack(data_type, len(content), encode_type) + content
+
+
+# 시작/끝 시그니처로 감싼 프레임
+def frame(*records: bytes) -> bytes:
+    return FRAME_START + b"".join(records) + FRAME_END
+
+
+# 분석기 이벤트 레코드 (지정하지 않은 필드는 0)
+def event(data_type: int, **fields):
+    cls = main.PACKET_SCHEMAS[data_type].record
+    return cls(**{name: fields.get(name, 0) for name in cls._fields})
+
+
+def hp_event(tid: int, prev_hp: int, current_hp: int):
+    return event(100178, type=3, target_id=tid, prev_hp=prev_hp, current_hp=current_hp)
+
+
+def self_damage_event(uid: int, tid: int, damage: int):
+    return event(10719, type=4, user_id=uid, target_id=tid, damage=damage)
+
+
+def attack_event(uid: int, tid: int):
+    return event(10308, type=1, user_id=uid, target_id=tid, key1=5, flags=1)
+
+
+def drained(store: SegmentStore, position: int = 0) -> tuple:
+    buffer = StreamBuffer(16)
+    end = store.drain_into(position, buffer)
+    return bytes(buffer.view()), end
+
+
+# DamageStore 보조 인덱스 불변식: touched / _hit_cells / by_target 이 같은 (유저, 타겟, 스킬) 집합을 가리킴
+def assert_index_consistent(store: DamageStore) -> None:
+    indexed = {(uid, tid, skill) for tid, members in store.by_target.items() for uid, skill in members}
+    assert set(store.touched) == indexed
+    assert set(store._hit_cells) <= indexed
+    for uid, tid, skill in store._hit_cells:
+        assert store.get(uid, tid, skill) is not None
+
+
+def hit(store: DamageStore, uid: int, tid: int, skill: str, damage: int, now: float = 0.0) -> None:
+    CombatLogAnalyzer._update_combat(store, uid, tid, damage, 1, skill, UserTmpData(), now)
+
+
+def total(store: DamageStore, uid: int, tid: int, skill: str = "") -> int:
+    cell = store.get(uid, tid, skill)
+    return cell.all.total_damage if cell else 0
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    monkeypatch.setattr(main, "settings", {"EncounterSplit": False}, raising=False)
+    return CombatLogAnalyzer()
+
+
+# ---------- SegmentStore ----------
+
+def test_segment_store_out_of_order_insertion():
+    store = SegmentStore()
+    store.insert(10, memoryview(b"KLMNO"), 0)
+    store.insert(5, memoryview(b"FGHIJ"), 0)
+    assert drained(store) == (b"", 0)  # 0 부터 이어지는 구간이 아직 없음
+
+    store.insert(0, memoryview(b"ABCDE"), 0)
+    assert drained(store) == (b"ABCDEFGHIJKLMNO", 15)
+    assert len(store) == 0
+    assert store.duplicate_bytes == 0
+
+
+def test_segment_store_trims_overlaps_and_duplicates():
+    store = SegmentStore()
+    store.insert(0, memoryview(b"abcdef"), 0)
+    store.insert(3, memoryview(b"defghi"), 0)    # 앞 구간과 3바이트 겹침
+    store.insert(2, memoryview(b"cd"), 0)        # 완전히 포함된 재전송
+    assert store.duplicate_bytes == 5
+    assert drained(store) == (b"abcdefghi", 9)
+
+
+def test_segment_store_fills_holes_around_stored_pieces():
+    store = SegmentStore()
+    store.insert(4, memoryview(b"EF"), 0)
+    store.insert(8, memoryview(b"IJ"), 0)
+    store.insert(0, memoryview(b"abcdefghijkl"), 0)  # 저장된 구간 사이의 빈 곳만 저장
+    assert store.duplicate_bytes == 4
+    assert drained(store) == (b"abcdEFghIJkl", 12)
+
+
+def test_segment_store_drops_bytes_before_base():
+    store = SegmentStore()
+    store.insert(0, memoryview(b"0123"), 6)        # 이미 소비한 위치
+    store.insert(4, memoryview(b"456789"), 6)      # 앞부분만 이미 소비
+    assert store.duplicate_bytes == 6
+    assert drained(store, 6) == (b"6789", 10)
+
+
+# ---------- FrameScanner ----------
+
+def test_frame_scanner_splits_records_across_chunks():
+    data = frame(record(10308, b"A" * 40), record(100178, b"B" * 24)) + frame(record(10719, b"C" * 8))
+    scanner = FrameScanner()
+    buffer = StreamBuffer(16)
+    records = []
+    for offset in range(0, len(data), 7):
+        buffer.append(data[offset:offset + 7])
+        records += [(data_type, bytes(content)) for data_type, _, content, _ in scanner.split(buffer)]
+    assert records == [(10308, b"A" * 40), (100178, b"B" * 24), (10719, b"C" * 8)]
+    assert len(buffer) == 0
+    assert scanner.frames_lost == 0
+
+
+def test_frame_scanner_reports_record_end_offsets():
+    first, second = record(10308, b"x" * 5), record(10719, b"y" * 3)
+    buffer = StreamBuffer(16)
+    buffer.append(frame(first, second))
+    ends = [end for _, _, _, end in FrameScanner().split(buffer)]
+    assert ends == [len(FRAME_START) + len(first), len(FRAME_START) + len(first) + len(second)]
+
+
+def test_frame_scanner_counts_frame_lost_mid_frame_once():
+    lost = frame(record(10308, b"a" * 30), record(10308, b"b" * 30))
+    kept = frame(record(10719, b"k" * 8))
+    scanner = FrameScanner()
+    buffer = StreamBuffer(16)
+    buffer.append(lost[:25])
+    assert scanner.split(buffer) == []
+
+    # 구간 손실: 진행 중이던 프레임과 구간 뒤에 오는 그 프레임의 나머지는 같은 프레임
+    buffer.clear()
+    scanner.resync()
+    buffer.append(lost[40:])
+    assert scanner.split(buffer) == []
+    buffer.append(kept)
+    records = scanner.split(buffer)
+    assert [(data_type, bytes(content)) for data_type, _, content, _ in records] == [(10719, b"k" * 8)]
+    assert scanner.frames_lost == 1
+
+
+def test_frame_scanner_gap_between_frames_loses_nothing():
+    scanner = FrameScanner()
+    buffer = StreamBuffer(16)
+    buffer.append(frame(record(10308, b"a" * 10)))
+    assert len(scanner.split(buffer)) == 1
+    scanner.resync()
+    buffer.append(frame(record(10308, b"b" * 10)))
+    assert len(scanner.split(buffer)) == 1
+    assert scanner.frames_lost == 0
+
+
+def test_tcp_flow_counts_pending_gap_loss_before_next_frame():
+    flow = TcpFlow(("a", 1, "b", 2))
+    data = frame(record(10308, b"a" * 30))
+    flow.reassemble(1000, memoryview(data[:20]), 1.0)
+    flow.split_records()
+    flow.jump_to(5000)
+    assert flow.frames_lost == 1      # 다음 시작 시그니처 전이라도 잃은 프레임은 보임
+    flow.reassemble(5000, memoryview(frame(record(10719, b"k"))), 2.0)
+    assert len(flow.split_records()) == 1
+    assert flow.frames_lost == 1      # 시그니처를 찾을 때 다시 세지 않음
+
+
+def test_tcp_flow_records_carry_completing_packet_timestamp():
+    first, second = record(10308, b"a" * 20), record(10719, b"b" * 20)
+    data = frame(first, second)
+    cut = len(FRAME_START) + len(first) + 4  # 두 번째 레코드 중간에서 패킷이 나뉨
+    flow = TcpFlow(("a", 1, "b", 2))
+    flow.reassemble(100, memoryview(data[:cut]), 10.0)
+    flow.reassemble(100 + cut, memoryview(data[cut:]), 12.5)
+    timestamps = [(rec[0], timestamp) for rec, timestamp in flow.split_records()]
+    assert timestamps == [(10308, 10.0), (10719, 12.5)]
+    assert len(flow.marks) == 0
+
+
+# ---------- DamageStore ----------
+
+def test_damage_store_fold_target_keeps_user_totals():
+    store = DamageStore()
+    hit(store, 1, 500, "s1", 100, 1.0)
+    hit(store, 1, 500, "s2", 50, 2.0)
+    hit(store, 2, 500, "s1", 30, 3.0)
+    hit(store, 1, 600, "s1", 7, 4.0)
+
+    store.fold_target(500, OTHER)
+    assert total(store, 1, OTHER) == 150
+    assert total(store, 2, OTHER) == 30
+    assert total(store, 0, OTHER) == 180
+    assert total(store, 1, 0) == 157               # 유저 전체 합계는 그대로
+    assert total(store, 1, 0, "s1") == 107         # 유저-스킬 합계도 그대로
+    assert store.get(1, 500, "") is None and store.get(0, 500, "") is None
+    assert 500 not in store.by_target
+    assert store.touched[(1, OTHER, "")] == 2.0    # 합친 묶음의 마지막 타격 시각
+    assert_index_consistent(store)
+
+
+def test_damage_store_evict_drops_empty_rollups():
+    store = DamageStore()
+    hit(store, 1, 500, "s1", 100)
+    hit(store, 1, 500, "s2", 50)
+    hit(store, 2, 500, "s1", 30)
+
+    store.evict([(1, 500, "s1")])
+    assert store.get(1, 500, "") is not None       # s2 가 남아 있음
+    store.evict([(1, 500, "s2")])
+    assert store.get(1, 500, "") is None
+    assert store.get(0, 500, "") is not None       # 유저 2 가 남아 있음
+    store.evict([(2, 500, "s1")])
+    assert store.get(0, 500, "") is None
+    assert 500 not in store.by_target
+    assert total(store, 1, 0) == 150
+    assert_index_consistent(store)
+
+
+def test_damage_store_compact_keeps_cells_and_hit_groups():
+    store = DamageStore()
+    for uid in range(1, 41):
+        hit(store, uid, 500 + uid, f"s{uid}", uid)
+    survivors = {uid: store.get(uid, 500 + uid, f"s{uid}") for uid in (3, 7)}
+    store.discard_users(set(range(1, 41)) - set(survivors))
+    before = store.interned()
+
+    assert store.compact() > 0
+    assert store.interned() < before
+    for uid, cell in survivors.items():
+        assert store.get(uid, 500 + uid, f"s{uid}") is cell
+    hit(store, 3, 503, "s3", 10)                   # 캐시된 셀 묶음이 다시 매긴 키와 같은 셀
+    assert total(store, 3, 503, "s3") == 13
+    assert_index_consistent(store)
+    assert store.compact() == 0                    # 죽은 id 가 절반 미만이면 그대로
+
+
+# ---------- DpsSeries ----------
+
+def test_dps_series_buckets_and_rolling_window():
+    series = DpsSeries(100)
+    series.add(100, 10)
+    series.add(101, 20)
+    series.add(105, 5)
+    assert series.points(0, 100, 105) == [10, 20, 0, 0, 0, 5]
+    assert series.rolling_dps(105, 5) == (35 - 10) / 5
+    assert series.cumulative(0, 99) == 0
+    assert series.cumulative(0, 105) == 35           # 열린 버킷
+
+
+def test_dps_series_rolls_up_coarser_resolutions():
+    series = DpsSeries(0)
+    for second in range(0, 12):
+        series.add(second, 10)
+    level = SystemConstants.TIMELINE_RESOLUTIONS.index(5)
+    assert series.points(level, 0, 2) == [10, 10, 4]  # 5초 버킷 DPS (마지막 버킷은 열린 상태)
+    assert series.peak_dps() == 10
+
+
+def test_dps_series_forgets_buckets_past_ring():
+    slots = SystemConstants.TIMELINE_SLOTS
+    series = DpsSeries(0)
+    series.add(0, 100)
+    series.add(1, 100)
+    series.add(slots * 3, 50)                         # 링 크기 이상 건너뜀
+    assert series.cumulative(0, 1) is None
+    assert series.cumulative(0, slots * 3 - 1) == 200
+    assert series.rolling_dps(slots * 3, 5) == 50 / 5
+
+
+# ---------- BuffIntervalLog ----------
+
+def test_buff_interval_log_applies_stacks_to_hits_in_interval():
+    log = BuffIntervalLog()
+    assert log.hit(500, "s") == 0                     # 버프가 없으면 기록하지 않음
+    log.change("A", 2, 11)
+    for _ in range(3):
+        log.hit(500, "s")
+    log.change("A", 0, 11)
+    log.hit(500, "s")                                 # 버프 종료 후 타격
+    container = {}
+    assert log.fold(container, 1)
+
+    cell = container[1][500]["s"]["A"]
+    assert (cell.total_count, cell.total_stack, cell.max_stack, cell.type) == (3, 6, 2, 11)
+    assert container[1][0][""]["A"].total_count == 3
+    assert not log.active and len(log.hit_keys) == 0 and not log._keys
+
+
+def test_buff_interval_log_folds_untracked_targets_into_other():
+    log = BuffIntervalLog()
+    log.change("A", 1, 11)
+    log.hit(500, "s")
+    log.hit(600, "s")
+    container = {}
+    log.fold(container, 1, targets={500})
+    user = container[1]
+    assert user[500][""]["A"].total_count == 1
+    assert user[OTHER][""]["A"].total_count == 1
+    assert 600 not in user and "s" not in user[OTHER]
+    assert user[0][""]["A"].total_count == 2
+    assert log.active == {"A": (1, 11)}              # 활성 버프는 다음 반영으로 이어짐
+
+
+def test_buff_uptime_merge():
+    a, b = BuffUptimeData(11, 2, 6, 3), BuffUptimeData(11, 3, 3, 1)
+    a.merge(b)
+    assert (a.max_stack, a.total_stack, a.total_count) == (3, 9, 4)
+
+
+# ---------- TargetSketch ----------
+
+def test_target_sketch_evicts_smallest_unpinned():
+    sketch = TargetSketch(capacity=6)
+    for tid, weight in ((1, 50), (2, 10), (3, 30), (4, 40), (5, 60), (6, 70)):
+        assert sketch.offer(tid, weight, ()) is None
+    assert sketch.offer(7, 5, (2,)) == 3              # 2 는 고정 -> 그다음 최소
+    assert sketch.counts[7] == 35 and sketch.errors[7] == 30
+    assert sketch.offer(7, 5, ()) is None and sketch.counts[7] == 40
+    assert len(sketch) == 6 and 3 not in sketch
+
+
+def test_target_sketch_estimate_bounds_true_weight():
+    sketch = TargetSketch(capacity=6)
+    true = {}
+    for step in range(200):
+        tid = step % 13 if step % 3 else 99
+        weight = 1 + step % 7
+        true[tid] = true.get(tid, 0) + weight
+        sketch.offer(tid, weight, ())
+    for tid, count in sketch.counts.items():
+        assert count >= true[tid]
+        assert count - sketch.errors[tid] <= true[tid]
+    assert 99 in sketch                               # 가장 무거운 타겟은 남음
+
+
+def test_focused_target_keeps_detail_before_it_is_pinned(monkeypatch):
+    # 파티가 새 몹을 큰 데미지로 계속 잡는 동안 로컬 유저가 한 타겟만 치면 그 타겟이 "딜 집중" 이 됨
+    monkeypatch.setattr(main, "settings", {"EncounterSplit": False, "TargetTopK": 8}, raising=False)
+    analyzer = CombatLogAnalyzer()
+    clock = [1000.0]
+
+    def strike(uid, tid, damage, own):
+        clock[0] += 0.01
+        analyzer.update(hp_event(tid, 10**7, 10**7 - damage), clock[0])
+        if own:
+            analyzer.update(self_damage_event(uid, tid, damage), clock[0])
+        analyzer.update(attack_event(uid, tid), clock[0])
+
+    for _ in range(50):
+        strike(100, 7, 100, True)
+    mob = 1000
+    for _ in range(60):
+        strike(100, 42, 100, True)
+        for party in range(3):
+            strike(200 + party, mob, 50000, False)
+            mob += 1
+    assert analyzer._enemy_data.most_attacked_tid == 42
+    assert total(analyzer._self_damage_by_user_by_target_by_skill, 100, 42) == 6000
+
+
+# ---------- 매칭 대기열 ----------
+
+def test_pending_take_within_window(analyzer):
+    pending = {}
+    analyzer._put_pending(pending, 5, 10.0, 300, 3)
+    assert analyzer._take_pending(pending, 5, 10.0 + SystemConstants.PENDING_MATCH_WINDOW, 3) == 300
+    assert pending == {}
+    assert analyzer._unmatched[3] == 0
+
+
+def test_pending_expires_after_window(analyzer):
+    pending = {}
+    analyzer._put_pending(pending, 5, 10.0, 300, 3)
+    analyzer._put_pending(pending, 5, 10.8, 200, 3)
+    assert analyzer._take_pending(pending, 5, 11.5, 3) == 200   # 10.0 이벤트는 먼저 버림
+    assert analyzer._unmatched[3] == 1
+    assert analyzer._take_pending(pending, 5, 11.5, 3) == 0
+    assert analyzer._take_pending({}, 5, 0.0, 3) == 0
+
+
+def test_pending_prefers_hint_then_latest(analyzer):
+    pending = {}
+    for damage in (10, 20, 30):
+        analyzer._put_pending(pending, (1, 5), 1.0, damage, 4)
+    assert analyzer._take_pending(pending, (1, 5), 1.0, 4, hint=20) == 20
+    assert analyzer._take_pending(pending, (1, 5), 1.0, 4, hint=99) == 30
+    assert list(pending[(1, 5)]) == [(1.0, 10)]
+
+
+def test_pending_overflow_and_expire_count_unmatched(analyzer):
+    pending = analyzer._pending_self
+    depth = SystemConstants.PENDING_MATCH_DEPTH
+    for index in range(depth + 3):
+        analyzer._put_pending(pending, (1, 5), 1.0, index + 1, 4)
+    assert analyzer._unmatched[4] == 3
+    assert isinstance(pending[(1, 5)], deque) and len(pending[(1, 5)]) == depth
+    analyzer._expire_pending(1.0 + SystemConstants.PENDING_MATCH_WINDOW + 0.1)
+    assert pending == {}
+    assert analyzer._unmatched[4] == depth + 3
+
+
+def test_update_matches_on_capture_time_not_dispatch_time(analyzer, monkeypatch):
+    # 처리 지연으로 벽시계가 한참 지나 있어도 캡처 시각이 가까우면 짝을 찾음
+    wall = [5000.0]
+    monkeypatch.setattr(main.time, "time", lambda: wall[0])
+    analyzer.update(hp_event(500, 1000, 700), 100.0)
+    analyzer.update(self_damage_event(1, 500, 300), 100.0)
+    wall[0] += 60.0
+    analyzer.update(attack_event(1, 500), 100.2)
+    assert total(analyzer._damage_by_user_by_target_by_skill, 1, 500) == 300
+    assert total(analyzer._self_damage_by_user_by_target_by_skill, 1, 500) == 300
+    assert analyzer._unmatched == {3: 0, 4: 0}
+    assert analyzer._calculate_combat_duration() == 0.0
+    assert analyzer.clock() == pytest.approx(100.2)   # 마지막 이벤트 이후 벽시계가 흐르지 않음
@@ -8,7 +8,7 @@ const RECONNECT_DELAY = 3000; // 3초
 let heartbeatInterval = null; // heartbeat 인터벌
 
 // 데미지 및 버프 데이터베이스
-let damageDB  = {0:{0:{"":{}}}}  // 메인 데미지 DB
+let damageDB  = {0:{0:{"":{}}}}  // 메인 데미지 DB (상세 창에서 요청한 유저 셀, 저장 시 전체)
 let damageDB2 = {0:{0:{"":{}}}}  // 싱글 모드용 데미지 DB
 let buffDB = {};                 // 버프 정보 DB
 let selfID = 0;                  // 본인 캐릭터 ID
@@ -17,6 +17,9 @@ let userData = {}                // 유저 정보
 let hitTime = {};                // 타격 시간 기록
 let userTmpData = {}             // 임시 유저 데이터
 let serverStats = {};            // 서버에서 받은 통계 데이터
+let rankingDB = {};              // 서버가 계산한 타겟별 순위 뷰 (damage/damage2 -> 타겟 -> 상위 유저 행)
+let pendingSave = false;         // 전체 셀 응답을 받으면 저장 파일 내려받기
+let pendingDetailUid = null;     // 셀을 요청한 상세 창 유저 (창을 닫으면 응답 무시)
 
 // UI 및 렌더링 관련 변수
 let bossMode = "all";            // 보스 모드 (all/single)
@@ -32,13 +35,14 @@ const selectedDetailSkillName = {};
 // 차트 관련 변수
 let dpsChart = null;             // Chart.js 인스턴스
 let dpsChartData = [];           // DPS 차트 데이터
-let maxDataPoints = 3600;        // 30분 데이터 (전체 전투시간 지원)
 let chartInitialized = false;
 let chartUpdateTimeout = null;
 let isTabActive = true;
 let lastRenderHash = null;  // 마지막 렌더링 상태 해시 - 성능 최적화
 let miniChart = null;  // 미니 차트 인스턴스
 let userDpsHistory = {};  // 각 유저의 DPS 히스토리 저장
+let dpsTimeline = {damage: {}, damage2: {}};  // 서버 DPS 타임라인 (타겟별 버킷 DPS)
+let dpsTimelineRes = 5;  // 타임라인 버킷 크기(초)
 let viewMode = localStorage.getItem('viewMode') || 'card';  // 저장된 값 또는 기본값 'card'
 
 // 자동 초기화 관련 변수
@@ -266,6 +270,10 @@ function initDPSChart() {
                         },
                         beforeLabel: function(context) {
                             return '';
+                        },
+                        afterLabel: function(context) {
+                            const peak = context && context.dataset ? context.dataset.peakDps : 0;
+                            return peak ? '최고 ' + peak.toLocaleString() + ' DPS (5초)' : '';
                         }
                     }
                 },
@@ -376,8 +384,8 @@ function initDPSChart() {
                             // 레이블이 비어있지 않은 경우만 표시
                             if (!label) return '';
                             
-                            // 30초 단위로 표시 (6개 포인트마다, 5초 간격이므로)
-                            if (index % 6 === 0) {
+                            // 30초 단위로 표시
+                            if ((index * dpsTimelineRes) % 30 === 0) {
                                 return label;
                             }
                             return '';
@@ -427,40 +435,25 @@ function initDPSChart() {
     }
 }
 
-// 사용자 DPS 히스토리 업데이트 (5초마다)
-let lastDpsUpdate = 0;
+// 현재 타겟의 서버 DPS 타임라인
+function getTimeline() {
+    const timeline = dpsTimeline[singleMode ? "damage2" : "damage"] || {};
+    return timeline[getTargetID()] || null;
+}
+
+// 초 -> m:ss
+function formatChartTime(seconds) {
+    return `${Math.floor(seconds/60)}:${(seconds%60).toString().padStart(2,'0')}`;
+}
+
+// 사용자 DPS 히스토리 업데이트 (서버 타임라인 기준)
 function updateUserDpsHistory() {
-    const now = Date.now();
-    if (now - lastDpsUpdate < 5000) return;  // 5초마다만 업데이트
-    lastDpsUpdate = now;
-    
-    const tid = getTargetID();
-    const db = singleMode ? damageDB2 : damageDB;
+    const timeline = getTimeline();
+    if (!timeline) return;
     
-    for (const uid in db) {
-        if (db[uid] && db[uid][tid]) {
-            const userStats = db[uid][tid];
-            
-            // 안전한 접근 - undefined 체크 추가
-            if (!userStats[""] || !userStats[""].all) {
-                continue;  // 데이터가 없으면 건너뜀
-            }
-            
-            const totalDamage = userStats[""].all.total_damage || 0;
-            const runtime = getRuntimeSec();
-            const currentDps = runtime > 0 ? Math.floor(totalDamage / runtime) : 0;
-            
-            if (!userDpsHistory[uid]) {
-                userDpsHistory[uid] = [];
-            }
-            
-            userDpsHistory[uid].push(currentDps);
-            
-            // 최대 360개 (30분) 데이터만 유지
-            if (userDpsHistory[uid].length > 360) {
-                userDpsHistory[uid].shift();
-            }
-        }
+    dpsTimelineRes = timeline.res;
+    for (const uid in timeline.users) {
+        userDpsHistory[uid] = timeline.users[uid].points;
     }
 }
 
@@ -490,11 +483,9 @@ function initMiniDPSChart(uid) {
     
     // 데이터가 없으면 현재 값만 표시
     if (history.length === 0) {
-        const tid = getTargetID();
-        const db = singleMode ? damageDB2 : damageDB;
-        if (db[uid] && db[uid][tid]) {
-            const userStats = db[uid][tid];
-            const totalDamage = userStats[""].all.total_damage || 0;
+        const row = calcSortedItems().find(([id]) => id === String(uid));
+        if (row) {
+            const totalDamage = row[1].total;
             const runtime = getRuntimeSec();
             const currentDps = runtime > 0 ? Math.floor(totalDamage / runtime) : 0;
             history.push(currentDps);
@@ -505,11 +496,11 @@ function initMiniDPSChart(uid) {
     const labels = [];
     const data = [...history];
     
-    // 시간 레이블 생성 (5초 간격)
+    // 시간 레이블 생성 (타임라인 버킷 간격)
     for (let i = 0; i < data.length; i++) {
-        const seconds = i * 5;
+        const seconds = i * dpsTimelineRes;
         if (seconds % 30 === 0) {
-            labels.push(`${Math.floor(seconds/60)}:${(seconds%60).toString().padStart(2,'0')}`);
+            labels.push(formatChartTime(seconds));
         } else {
             labels.push('');
         }
@@ -557,8 +548,7 @@ function initMiniDPSChart(uid) {
                             try {
                                 if (!context || !context.length || !context[0]) return '';
                                 const index = context[0].dataIndex;
-                                const seconds = index * 5;
-                                return `${Math.floor(seconds/60)}:${(seconds%60).toString().padStart(2,'0')}`;
+                                return formatChartTime(index * dpsTimelineRes);
                             } catch (e) {
                                 return '';
                             }
@@ -608,9 +598,9 @@ function initMiniDPSChart(uid) {
                         },
                         maxTicksLimit: 6,
                         callback: function(value, index) {
-                            const seconds = index * 5;
+                            const seconds = index * dpsTimelineRes;
                             if (seconds % 30 === 0) {
-                                return `${Math.floor(seconds/60)}:${(seconds%60).toString().padStart(2,'0')}`;
+                                return formatChartTime(seconds);
                             }
                             return '';
                         }
@@ -704,17 +694,14 @@ function updateDPSChart() {
         setTimeout(() => updateDPSChart(), 100);
         return;
     }
-    // 전투 시간 계산 (5초마다 업데이트)
-    const combatSeconds = dpsChart.data.labels.length * 5;
-    const minutes = Math.floor(combatSeconds / 60);
-    const seconds = combatSeconds % 60;
-    const combatTime = `${minutes}:${seconds.toString().padStart(2, '0')}`;
-    
-    // 새로운 레이블 추가
-    if (dpsChart.data.labels.length >= maxDataPoints) {
-        dpsChart.data.labels.shift();
-    }
-    dpsChart.data.labels.push(combatTime);
+    // 서버 타임라인으로 시간축 구성 (모든 유저가 같은 구간으로 정렬되어 옴)
+    const timeline = getTimeline();
+    if (!timeline) return;
+    dpsTimelineRes = timeline.res;
+    const firstHit = hitTime[getTargetID()] ? Math.floor(hitTime[getTargetID()].start) : timeline.start;
+    const pointCount = Object.values(timeline.users).reduce((n, u) => Math.max(n, u.points.length), 0);
+    dpsChart.data.labels = Array.from({length: pointCount},
+        (_, i) => formatChartTime(Math.max(0, timeline.start + i * timeline.res - firstHit)));
     
     // 데이터셋 업데이트 또는 생성 - 확장된 색상 팔레트 (12개)
     const colors = [
@@ -732,11 +719,10 @@ function updateDPSChart() {
     let totalCount = 0;
     
     // 기존 데이터셋 업데이트
-    const newDatasets = topUsers.map(([user_id, item], idx) => {
-        const total = item[""].all.total_damage || 0;
-        // 첫 데이터일 때는 0으로 처리하여 이상값 방지
+    const newDatasets = topUsers.map(([user_id, row], idx) => {
+        const total = row.total;
         const runtime = getRuntimeSec();
-        const dps = (runtime > 0 && dpsChart.data.labels.length > 1) ? Math.floor(total / runtime) : 0;
+        const dps = runtime > 0 ? Math.floor(total / runtime) : 0;
         const jobName = userData[user_id] ? userData[user_id].job : user_id;
         const isSelf = selfID == user_id;
         
@@ -748,7 +734,7 @@ function updateDPSChart() {
         if (!dataset) {
             dataset = {
                 label: jobName,
-                data: new Array(dpsChart.data.labels.length - 1).fill(0),
+                data: [],
                 borderColor: isSelf ? '#00ff88' : colors[idx % colors.length],
                 backgroundColor: isSelf ? 'rgba(0, 255, 136, 0.1)' : `rgba(${parseInt(colors[idx % colors.length].slice(1,3),16)}, ${parseInt(colors[idx % colors.length].slice(3,5),16)}, ${parseInt(colors[idx % colors.length].slice(5,7),16)}, 0.1)`,
                 borderWidth: isSelf ? 3 : 2,
@@ -761,11 +747,10 @@ function updateDPSChart() {
             };
         }
         
-        // 데이터 배열 길이 조정
-        if (dataset.data.length >= maxDataPoints) {
-            dataset.data.shift();
-        }
-        dataset.data.push(dps);
+        // 버킷별 DPS (타임라인이 없는 유저는 0)
+        const series = timeline.users[user_id];
+        dataset.data = series ? series.points : new Array(pointCount).fill(0);
+        dataset.peakDps = series ? series.peak : 0;
         
         return dataset;
     });
@@ -1037,7 +1022,7 @@ function getTotalDamage(isSingle){
     if (sorted.length === 0) {
         return 0;
     }
-    const totalSum = sorted.reduce((sum, [uid,stat]) => sum + (stat[""].all.total_damage || 0), 0);
+    const totalSum = sorted.reduce((sum, [uid,row]) => sum + row.total, 0);
     return totalSum;
 }
 // 추가타 확률 계산
@@ -1067,6 +1052,7 @@ function calcPercent(numerator, denominator){
 // 플레이어 상세 정보 모달 표시
 // 모달 닫기 함수
 function closeDetailModal() {
+    pendingDetailUid = null;
     const detailModal = document.getElementById('detailModal');
     if (detailModal) {
         detailModal.classList.remove('open');
@@ -1094,7 +1080,17 @@ function closeDetailModal() {
     }
 }
 
+// 상세 창 열기 - 서버에 유저 셀을 요청하고 응답이 오면 그리기 (연결이 없으면 가진 셀로 바로)
 function showDetailModal(uid) {
+    pendingDetailUid = String(uid);
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(`detail:${uid}${singleMode ? ':single' : ''}`);
+    } else {
+        renderDetailModal(uid);
+    }
+}
+
+function renderDetailModal(uid) {
     const modal = document.getElementById('detailModal');
     const modalBody = document.getElementById('modalBody');
     const modalTitle = document.getElementById('modalTitle');
@@ -1116,7 +1112,7 @@ function showDetailModal(uid) {
     
     // 순위 계산
     const sorted = calcSortedItems();
-    const rank = sorted.findIndex(([id, item]) => id === uid) + 1;
+    const rank = sorted.findIndex(([id, row]) => id === String(uid)) + 1;
     
     // 모달 헤더를 더 보기 좋게 표시
     modalTitle.innerHTML = `
@@ -1230,7 +1226,7 @@ function renderDetailStats(uid, container) {
     
     // 전체 대미지 중 비율 계산
     const sorted = calcSortedItems();
-    const totalSum = sorted.reduce((sum, [uid,stat]) => sum + (stat[""].all.total_damage || 0), 0);
+    const totalSum = sorted.reduce((sum, [uid,row]) => sum + row.total, 0);
     const damageRate = totalSum > 0 ? ((totalDamage / totalSum) * 100).toFixed(1) : 0;
     
     // 타격 횟수 계산 - 스킬별 데이터 사용
@@ -1468,18 +1464,16 @@ function renderDetailTitle(uid){
     while (detailDiv.firstChild) detailDiv.removeChild(detailDiv.firstChild);
 
     const sorted = calcSortedItems()
-    const totalSum = sorted.reduce((sum, [uid,stat]) => sum + (stat[""].all.total_damage || 0), 0);
+    const totalSum = sorted.reduce((sum, [uid,row]) => sum + row.total, 0);
 
-    sorted.forEach(([user_id, item], idx) => {
+    sorted.forEach(([user_id, row], idx) => {
             if(user_id != uid) return;
 
-            const stat = item[""];
-
-            const total = stat.all.total_damage || 0;
-            const critRate   = calcCritHitPercent(stat);
-            const addhitRate = calcAddHitPercent(stat);
-            const atkbuff    = stat.buff.total_count > 0 ? (stat.buff.total_atk / stat.buff.total_count).toFixed(1) : 0;
-            const dmgbuff    = stat.buff.total_count > 0 ? (stat.buff.total_dmg / stat.buff.total_count).toFixed(1) : 0;
+            const total = row.total;
+            const critRate   = row.crit;
+            const addhitRate = row.addhit;
+            const atkbuff    = row.atk_buff;
+            const dmgbuff    = row.dmg_buff;
             const dps        = getRuntimeSec() > 0 ? Math.floor(total / getRuntimeSec()) : 0;
             const totalRate = sorted.length === 1 ? 1 : totalSum > 0 ? total / totalSum : 0
             const jobName =  userData[user_id] ? userData[user_id].job : user_id;
@@ -1494,7 +1488,7 @@ function renderDetail(uid) {
     const skill = selectedDetailSkillName[uid] ?? "";
     const db = singleMode ? damageDB2[uid][tid][skill] : damageDB[uid][tid][skill]; 
     
-    const rank = calcSortedItems().findIndex(([id, item]) => id === uid);
+    const rank = calcSortedItems().findIndex(([id, row]) => id === String(uid));
     const critRate  = calcCritHitPercent(db);
     const addhitRate = calcAddHitPercent(db);
     const atkbuff = db.buff.total_count > 0 ? (db.buff.total_atk / db.buff.total_count).toFixed(1) : 0;
@@ -1635,6 +1629,7 @@ function renderSkillDetail(uid, container) {
                 <div><span>평균</span><span>${row.normal.total_count > 0 ? Math.floor(row.normal.total_damage / row.normal.total_count).toLocaleString() : '0'}</span></div>
                 <div><span>최대</span><span>${row.normal.max_damage.toLocaleString()}</span></div>
                 <div><span>최소</span><span>${row.normal.min_damage.toLocaleString()}</span></div>
+                <div><span>p50/p90/p99</span><span>${formatPercentiles(row.normal)}</span></div>
                 <div><span>강타율</span><span>${calcPercent(row.normal.power_count, row.normal.total_count)}%</span></div>
                 <div><span>연타율</span><span>${calcPercent(row.normal.fast_count, row.normal.total_count)}%</span></div>
                 <div><span>치명타율</span><span>${calcPercent(row.normal.crit_count, row.normal.total_count)}%</span></div>
@@ -1646,6 +1641,7 @@ function renderSkillDetail(uid, container) {
                 <div><span>평균</span><span>${row.dot.total_count > 0 ? Math.floor(row.dot.total_damage / row.dot.total_count).toLocaleString() : '0'}</span></div>
                 <div><span>최대</span><span>${row.dot.max_damage.toLocaleString()}</span></div>
                 <div><span>최소</span><span>${row.dot.min_damage.toLocaleString()}</span></div>
+                <div><span>p50/p90/p99</span><span>${formatPercentiles(row.dot)}</span></div>
                 <div><span>강타율</span><span>${calcPercent(row.dot.power_count, row.dot.total_count)}%</span></div>
                 <div><span>연타율</span><span>${calcPercent(row.dot.fast_count, row.dot.total_count)}%</span></div>
                 <div><span>치명타</span><span>${row.dot.crit_count.toLocaleString()}</span></div>
@@ -1657,6 +1653,7 @@ function renderSkillDetail(uid, container) {
                 <div><span>평균</span><span>${row.special.total_count > 0 ? Math.floor(row.special.total_damage / row.special.total_count).toLocaleString() : '0'}</span></div>
                 <div><span>최대</span><span>${row.special.max_damage.toLocaleString()}</span></div>
                 <div><span>최소</span><span>${row.special.min_damage.toLocaleString()}</span></div>
+                <div><span>p50/p90/p99</span><span>${formatPercentiles(row.special)}</span></div>
                 <div><span>강타율</span><span>${calcPercent(row.special.power_count,row.special.total_count)}%</span></div>
                 <div><span>연타율</span><span>${calcPercent(row.special.fast_count,row.special.total_count)}%</span></div>
                 <div><span>치명타율</span><span>${calcPercent(row.special.crit_count,row.special.total_count)}%</span></div>
@@ -1688,6 +1685,12 @@ function renderSkillDetail(uid, container) {
     }
 }
 
+// 타격 데미지 분위수 표시 (서버 히스토그램 기준, 이전 저장 데이터는 값 없음)
+function formatPercentiles(stat) {
+    if (!stat || !stat.total_count || stat.p50 === undefined) return '-';
+    return [stat.p50, stat.p90, stat.p99].map(v => v.toLocaleString()).join(' / ');
+}
+
 // 상세 정보 초기화
 function clearDetails() {
     selectedDetailUserId = null;
@@ -1774,10 +1777,10 @@ function renderDamageRanks() {
     const sorted = calcSortedItems()
     
     // 데이터 해시 생성 - 성능 최적화
-    const currentHash = JSON.stringify(sorted.map(([uid, stat]) => ({
+    const currentHash = JSON.stringify(sorted.map(([uid, row]) => ({
         uid,
-        damage: Math.floor(stat[""].all.total_damage / 100) * 100, // 100 단위로 반올림
-        dps: Math.floor(stat[""].all.dps / 10) * 10 // 10 단위로 반올림
+        damage: Math.floor(row.total / 100) * 100, // 100 단위로 반올림
+        dps: Math.floor((row.dps || 0) / 10) * 10 // 10 단위로 반올림
     })));
     
     // 데이터가 크게 변하지 않았으면 렌더링 건너뛰기 - 성능 최적화
@@ -1799,7 +1802,7 @@ function renderDamageRanks() {
         return;
     }
     
-    const totalSum = sorted.reduce((sum, [uid,stat]) => sum + (stat[""].all.total_damage || 0), 0);
+    const totalSum = sorted.reduce((sum, [uid,row]) => sum + row.total, 0);
     
     // 뷰 모드에 따라 다른 클래스 적용
     if (viewMode === 'list') {
@@ -1824,11 +1827,10 @@ function renderCardView(sorted, totalSum) {
     const top3Container = document.createElement('div');
     top3Container.style.cssText = 'display: grid !important; grid-template-columns: repeat(3, 1fr) !important; gap: 20px !important; width: 100% !important;';
     
-    sorted.slice(0, 3).forEach(([user_id, item], idx) => {
-        const stat = item[""];
-        const total = stat.all.total_damage || 0;
-        const critRate = calcCritHitPercent(stat);
-        const addhitRate = calcAddHitPercent(stat);
+    sorted.slice(0, 3).forEach(([user_id, row], idx) => {
+        const total = row.total;
+        const critRate = row.crit;
+        const addhitRate = row.addhit;
         const dps = getRuntimeSec() > 0 ? Math.floor(total / getRuntimeSec()) : 0;
         
         // 새로운 통계 데이터 가져오기
@@ -1917,14 +1919,13 @@ function renderCardView(sorted, totalSum) {
         listContainer.appendChild(header);
         
         // 4등부터 리스트 아이템 추가
-        sorted.slice(3).forEach(([user_id, item], originalIdx) => {
+        sorted.slice(3).forEach(([user_id, row], originalIdx) => {
             const idx = originalIdx + 3; // 실제 순위
-            const stat = item[""];
-            const total = stat.all.total_damage || 0;
-            const critRate = calcCritHitPercent(stat);
-            const addhitRate = calcAddHitPercent(stat);
-            const atkbuff = stat.buff.total_count > 0 ? (stat.buff.total_atk / stat.buff.total_count).toFixed(1) : 0;
-            const dmgbuff = stat.buff.total_count > 0 ? (stat.buff.total_dmg / stat.buff.total_count).toFixed(1) : 0;
+            const total = row.total;
+            const critRate = row.crit;
+            const addhitRate = row.addhit;
+            const atkbuff = row.atk_buff;
+            const dmgbuff = row.dmg_buff;
             const dps = getRuntimeSec() > 0 ? Math.floor(total / getRuntimeSec()) : 0;
             
             // 새로운 통계 데이터는 참고만
@@ -1989,13 +1990,12 @@ function renderListView(sorted, totalSum) {
     `;
     statsList.appendChild(header);
     
-    sorted.forEach(([user_id, item], idx) => {
-        const stat = item[""];
-        const total = stat.all.total_damage || 0;
-        const critRate = calcCritHitPercent(stat);
-        const addhitRate = calcAddHitPercent(stat);
-        const atkbuff = stat.buff.total_count > 0 ? (stat.buff.total_atk / stat.buff.total_count).toFixed(1) : 0;
-        const dmgbuff = stat.buff.total_count > 0 ? (stat.buff.total_dmg / stat.buff.total_count).toFixed(1) : 0;
+    sorted.forEach(([user_id, row], idx) => {
+        const total = row.total;
+        const critRate = row.crit;
+        const addhitRate = row.addhit;
+        const atkbuff = row.atk_buff;
+        const dmgbuff = row.dmg_buff;
         const dps = getRuntimeSec() > 0 ? Math.floor(total / getRuntimeSec()) : 0;
         
         // 새로운 통계 데이터는 참고만
@@ -2049,9 +2049,29 @@ function renderListView(sorted, totalSum) {
     });
 }
 
-// 데미지 순위 정렬 계산
+// 셀 -> 순위 행 (서버 순위 뷰의 행과 같은 모양)
+function cellToRow(uid, cell) {
+    return {
+        id: Number(uid),
+        total: cell.all.total_damage || 0,
+        crit: Number(calcCritHitPercent(cell)),
+        addhit: Number(calcAddHitPercent(cell)),
+        atk_buff: cell.buff.total_count > 0 ? Number((cell.buff.total_atk / cell.buff.total_count).toFixed(1)) : 0,
+        dmg_buff: cell.buff.total_count > 0 ? Number((cell.buff.total_dmg / cell.buff.total_count).toFixed(1)) : 0,
+    };
+}
+
+// 데미지 순위 정렬 계산 - [유저 id, 순위 행] 목록
 function calcSortedItems(){
     const tid = getTargetID();
+    
+    // 서버 순위 뷰의 행 그대로 사용 (필터/정렬/상위 12명은 서버에서 처리)
+    const view = rankingDB[singleMode ? "damage2" : "damage"]?.[tid];
+    if (view) {
+        return view.rows.map(row => [String(row.id), row]);
+    }
+    
+    // 순위 뷰 없이 셀만 있는 경우 (이전 형식 저장 파일) 셀에서 직접 계산
     const statsSource = singleMode ? damageDB2 : damageDB;
     
     // 데이터 소스가 없거나 비어있으면 빈 배열 반환
@@ -2078,8 +2098,8 @@ function calcSortedItems(){
             const bDamage = (b[1][tid] && b[1][tid][""] && b[1][tid][""].all) ? b[1][tid][""].all.total_damage : 0;
             return bDamage - aDamage;
         })
-        .map(([key, item]) => [key, item[tid]])
-        .slice(0, 12);
+        .slice(0, 12)
+        .map(([key, item]) => [key, cellToRow(key, item[tid][""])]);
 
     return sorted;
 }
@@ -2096,6 +2116,7 @@ function clearDB () {
     hitTime = {};
     userTmpData = null;
     serverStats = {};
+    rankingDB = {};
     
     // 차트 데이터 초기화
     dpsChartData = [];
@@ -2134,7 +2155,7 @@ function clearDB () {
     }
     // DPS 히스토리 초기화
     userDpsHistory = {};
-    lastDpsUpdate = 0;
+    dpsTimeline = {damage: {}, damage2: {}};
     
     // 모든 UI 초기화
     document.getElementById('runtime-text').textContent = '0.00초';
@@ -2346,7 +2367,19 @@ function setupSaveButton() {
     const saveAllBtn = document.getElementById('saveAllBtn');
     if (saveAllBtn) {
         saveAllBtn.onclick = () => {
-    // WebSocket 연결은 유지
+            // 주기 전송에는 셀 전체가 없으므로 서버에 요청하고 응답이 오면 저장
+            if (ws && ws.readyState === WebSocket.OPEN) {
+                pendingSave = true;
+                ws.send('cube');
+            } else {
+                downloadSaveData();
+            }
+        };
+    }
+}
+
+// 현재 데이터를 저장 파일로 내려받기
+function downloadSaveData() {
     function getKoreaTime(){
         const now = new Date();
         const kst = new Date(now.toLocaleString('en-US', { timeZone: 'Asia/Seoul' }));
@@ -2361,6 +2394,7 @@ function setupSaveButton() {
     const data = {
         damageDB,
         damageDB2,
+        rankingDB,
         buffDB,
         selfID,
         enemyData,
@@ -2374,6 +2408,8 @@ function setupSaveButton() {
             datasets: dpsChart.data.datasets
         } : null,
         userDpsHistory,   // 추가 - 유저별 DPS 히스토리
+        dpsTimeline,      // 서버 DPS 타임라인
+        dpsTimelineRes,
         savedRuntime: getRuntimeSec(),  // 저장 시점의 런타임 고정
         savedTime: Date.now()  // 저장 시점 타임스탬프
     };
@@ -2387,9 +2423,7 @@ function setupSaveButton() {
     setTimeout(() => {
         document.body.removeChild(a);
         URL.revokeObjectURL(url);
-        }, 100);
-        };
-    }
+    }, 100);
 }
 
 // 불러오기 버튼 이벤트 설정 함수
@@ -2419,6 +2453,7 @@ function setupLoadButton() {
             // === 불러온 데이터 적용 ===
             Object.assign(damageDB, data.damageDB || {});
             Object.assign(damageDB2, data.damageDB2 || {});
+            rankingDB = data.rankingDB || {};
             Object.assign(buffDB, data.buffDB || {});
             Object.assign(enemyData, data.enemyData || {});
             Object.assign(userData, data.userData || {});
@@ -2432,6 +2467,8 @@ function setupLoadButton() {
                 window.globalStats = data.globalStats;
             }
             userDpsHistory = data.userDpsHistory || {};
+            dpsTimeline = data.dpsTimeline || {damage: {}, damage2: {}};
+            dpsTimelineRes = data.dpsTimelineRes || 5;
             
             // 런타임 보정 - 저장 시점의 런타임 사용
             const savedRuntime = data.savedRuntime || 0;
@@ -3339,12 +3376,30 @@ function onConnectionChanged(connected) {
                         // 서버에서 clear 확인 메시지
                         // 서버 데이터 초기화 완료
                         break;
-                    case "damage":
+                    case "detail":
+                        // 상세 창용 유저 셀 (요청한 유저만)
+                        Object.assign(obj.single ? damageDB2 : damageDB, obj.data);
+                        if (obj.single === singleMode && String(obj.uid) === pendingDetailUid) {
+                            renderDetailModal(String(obj.uid));
+                        }
+                        break;
+                    case "cube":
+                        // 전체 셀 (저장용)
                         damageDB   = obj.data.damage;
                         damageDB2  = obj.data.damage2;
+                        if (pendingSave) {
+                            pendingSave = false;
+                            downloadSaveData();
+                        }
+                        break;
+                    case "damage":
                         selfID    = obj.data.self_id;
                         enemyData  = obj.data.enemy;
                         hitTime    = obj.data.hit_time;
+                        rankingDB  = obj.data.ranking || {};
+                        if (obj.data.timeline) {
+                            dpsTimeline = obj.data.timeline;
+                        }
                         buffDB = obj.data.buff;
                         if (obj.data.user) {
                             userData = obj.data.user;